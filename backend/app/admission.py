@@ -0,0 +1,179 @@
+# app/admission.py
+"""
+Admission control for the chat endpoints.
+
+Each streamed answer holds an Azure completion open for seconds. Without a
+limit, a traffic spike turns into hundreds of simultaneous completions, hits
+the deployment's rate limit and fails every request at once. The
+AdmissionController lets at most max_concurrent answers generate at a time;
+further requests wait in a bounded FIFO queue for up to queue_timeout
+seconds. When the queue is full (or the wait times out) the request is
+rejected straight away with Overloaded, which the endpoints turn into
+HTTP 429 with a Retry-After hint. Admitted requests keep a predictable
+latency; excess load is shed instead of slowing everyone down.
+
+Background LLM calls (rolling history summaries) take slots too, at low
+priority: they are never shed, but only get a slot no chat request is
+waiting for.
+
+The limit is per process: with several uvicorn workers the effective limit
+is workers * max_concurrent.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional
+
+from app import metrics
+
+# Weight of the newest hold time in the moving average used for Retry-After
+_EWMA_ALPHA = 0.2
+
+
+class Overloaded(Exception):
+    """Raised by acquire() when a request is shed; retry_after is in seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"LLM capacity exhausted ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Permit:
+    """One admitted request. release() is idempotent, so every exit path may call it."""
+
+    __slots__ = ("_controller", "_start")
+
+    def __init__(self, controller: Optional["AdmissionController"]):
+        self._controller = controller
+        self._start = time.perf_counter()
+
+    def release(self) -> None:
+        controller, self._controller = self._controller, None
+        if controller is not None:
+            controller._release(time.perf_counter() - self._start)
+
+
+# Waits for an LLM slot; the caller releases the returned permit
+Admit = Callable[[], Awaitable[Permit]]
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded, time-limited wait queue."""
+
+    def __init__(self, max_concurrent: int, max_queue: int, queue_timeout: float):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"queue_full": 0, "queue_timeout": 0}
+        self._hold_seconds = 0.0  # moving average of how long a permit is held
+        self._free = max(0, max_concurrent)
+        # Futures resolved by _grant() when a slot is handed over, FIFO
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._background: Deque[asyncio.Future] = deque()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrent > 0
+
+    def _retry_after(self) -> int:
+        # Roughly how long until the queue ahead of a new request drains
+        batches = (self.waiting + 1) / max(1, self.max_concurrent)
+        return max(1, math.ceil(batches * self._hold_seconds))
+
+    def _reject(self, reason: str) -> Overloaded:
+        self.rejected[reason] += 1
+        metrics.ADMISSION_REJECTED.labels(reason).inc()
+        return Overloaded(reason, self._retry_after())
+
+    def _publish(self) -> None:
+        metrics.LLM_ACTIVE.set(self.active)
+        metrics.LLM_QUEUE_DEPTH.set(self.waiting)
+
+    def _grant(self) -> None:
+        """Hand free slots to waiters, chat requests before background calls."""
+        while self._free > 0:
+            queue = self._waiters or self._background
+            if not queue:
+                return
+            waiter = queue.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._free -= 1
+
+    def _admit(self) -> Permit:
+        self.active += 1
+        self.admitted += 1
+        self._publish()
+        return Permit(self)
+
+    async def acquire(self, background: bool = False) -> Permit:
+        """
+        Wait for a free slot; raise Overloaded if the queue is full or the wait
+        times out. A background acquire is never shed and waits behind every
+        queued chat request.
+        """
+        if not self.enabled:
+            return Permit(None)
+        if self._free > 0 and not self._waiters and not (background and self._background):
+            self._free -= 1
+            return self._admit()
+        if not background and len(self._waiters) >= self.max_queue:
+            raise self._reject("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue = self._background if background else self._waiters
+        queue.append(waiter)
+        start = time.perf_counter()
+        if not background:
+            self.waiting += 1
+            self._publish()
+        try:
+            # asyncio.wait leaves the future alone on timeout, so a slot granted
+            # just as the wait ends is seen below instead of being lost
+            timeout = None if background else (self.queue_timeout or None)
+            await asyncio.wait((waiter,), timeout=timeout)
+        except asyncio.CancelledError:
+            self._abandon(queue, waiter)
+            raise
+        finally:
+            if not background:
+                self.waiting -= 1
+                self._publish()
+        if not waiter.done():
+            self._abandon(queue, waiter)
+            raise self._reject("queue_timeout")
+        if not background:
+            metrics.observe(metrics.QUEUE_WAIT_SECONDS, time.perf_counter() - start)
+        return self._admit()
+
+    def _abandon(self, queue: Deque[asyncio.Future], waiter: asyncio.Future) -> None:
+        """Withdraw a waiter, passing on the slot if it was granted meanwhile."""
+        if waiter.done():
+            self._free += 1
+            self._grant()
+        else:
+            waiter.cancel()
+            queue.remove(waiter)
+
+    def _release(self, held: float) -> None:
+        self._hold_seconds += _EWMA_ALPHA * (held - self._hold_seconds)
+        self.active -= 1
+        self._free += 1
+        self._grant()
+        self._publish()
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
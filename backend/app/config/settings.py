@@ -2,14 +2,27 @@
 Configuration settings for the Tourism Chatbot.
 """
 import os
+from pathlib import Path
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
 # Qdrant Configuration
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "tourism_docs")
+# Collection storage/search profile: "default", "scalar" (int8 quantization,
+# originals on disk) or "binary" (1-bit quantization), optionally with field
+# overrides, e.g. "scalar:hnsw_m=32,hnsw_ef=128,on_disk_payload=true"
+# (fields: see CollectionProfile in app/qdrant/backends.py)
+QDRANT_PROFILE = os.getenv("QDRANT_PROFILE", "default")
+
+# Vector backend: "qdrant" (server at QDRANT_URL) or "local" (embedded NumPy
+# index under LOCAL_INDEX_DIR, no Qdrant service needed)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant").lower()
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", str(BACKEND_DIR / ".cache" / "local_index"))
 
 # Azure OpenAI Configuration
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
@@ -17,8 +30,124 @@ AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-02-15-preview")
 AZURE_OPENAI_CHAT_DEPLOYMENT = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT", "gpt-4o")
 AZURE_OPENAI_EMBEDDING_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-3-small")
+# Embedding size used end to end (requests, collection, cache keys).
+# text-embedding-3 models return shortened vectors of any size up to their
+# native one (1536 small, 3072 large); 256-1024 cut storage and search cost
+# (see benchmarks/dimensions.py). ada-002 only supports 1536.
+EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "1536"))
 
 # RAG Configuration
 RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+
+# Ingestion Configuration
+# Per-file content hashes and chunk IDs, so restarts only embed what changed
+INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", str(BACKEND_DIR / ".cache" / "ingest_manifest.json"))
+# Ingest DATA_DIR in the background when the API starts
+AUTO_INGEST = os.getenv("AUTO_INGEST", "true").lower() in ("1", "true", "yes")
+# Streaming ingestion: max items buffered between pipeline stages, and the
+# read block size for large files (bounds peak memory regardless of corpus size)
+INGEST_QUEUE_DEPTH = int(os.getenv("INGEST_QUEUE_DEPTH", "64"))
+INGEST_READ_BLOCK_CHARS = int(os.getenv("INGEST_READ_BLOCK_CHARS", "1000000"))
+
+# Embedding Cache Configuration
+# SQLite file for the persistent tier (empty string keeps the cache memory-only)
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", str(BACKEND_DIR / ".cache" / "embeddings.sqlite"))
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "4096"))
+
+# Semantic Answer Cache Configuration (first-turn questions only)
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512"))
+
+# Identical history-free questions in flight at the same time (same
+# normalized text and language) share one retrieval and completion
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Ingestion Embedding Executor Configuration
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", "4"))
+# Azure deployment quota in tokens per minute (0 disables client-side budgeting)
+EMBED_TOKENS_PER_MINUTE = int(os.getenv("EMBED_TOKENS_PER_MINUTE", "0"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+
+# Retrieval Configuration
+# "dense" (Qdrant only), "sparse" (in-process BM25 only) or "hybrid" (both, fused with RRF)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+# Candidates fetched from each retriever before fusion, and the RRF rank constant
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Metadata filters inferred from the question when the caller passes none:
+# "off", "destination" (places named in the question) or "all" (destination
+# and topic). If a filtered search finds fewer than top_k chunks, the rest
+# comes from an unfiltered search
+RETRIEVAL_INFER_FILTERS = os.getenv("RETRIEVAL_INFER_FILTERS", "off").lower()
+# Diversity re-ranking (app/qdrant/diversity.py): "off", "mmr" (maximal
+# marginal relevance over the candidates' stored vectors) or "source_cap" (at
+# most MAX_CHUNKS_PER_SOURCE chunks per file). top_k is picked from a pool of
+# DIVERSITY_CANDIDATES hits; MMR_LAMBDA trades relevance (1) for diversity (0)
+DIVERSITY_MODE = os.getenv("DIVERSITY_MODE", "off").lower()
+DIVERSITY_CANDIDATES = int(os.getenv("DIVERSITY_CANDIDATES", "20"))
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+MAX_CHUNKS_PER_SOURCE = int(os.getenv("MAX_CHUNKS_PER_SOURCE", "1"))
+# Multi-query retrieval (app/qdrant/query_variants.py): search with the raw
+# question, a history-aware rewrite and its entities, embedded in one call and
+# searched in one Qdrant batch request, then merged with RRF
+MULTI_QUERY_ENABLED = os.getenv("MULTI_QUERY_ENABLED", "true").lower() in ("1", "true", "yes")
+MULTI_QUERY_MAX_VARIANTS = int(os.getenv("MULTI_QUERY_MAX_VARIANTS", "3"))
+
+# Chat sessions: at most SESSION_MAX_SESSIONS histories, dropped after
+# SESSION_TTL_SECONDS idle; each keeps its newest SESSION_MAX_MESSAGES
+# messages within SESSION_MAX_BYTES of text
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", "40"))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", "64000"))
+
+# Session backend: "memory" (per process), "sqlite" (shared WAL file; needed
+# for several uvicorn workers on one host) or "redis" (shared across hosts)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory").lower()
+SESSION_SQLITE_PATH = os.getenv("SESSION_SQLITE_PATH", str(BACKEND_DIR / ".cache" / "sessions.sqlite"))
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+
+# Chat history sent to the LLM: at most HISTORY_KEEP_TURNS recent turns
+# verbatim within HISTORY_TOKEN_BUDGET tokens (summary included); older
+# turns are folded into a rolling summary in the background
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "6"))
+HISTORY_SUMMARY_ENABLED = os.getenv("HISTORY_SUMMARY_ENABLED", "true").lower() in ("1", "true", "yes")
+HISTORY_SUMMARY_MAX_WORDS = int(os.getenv("HISTORY_SUMMARY_MAX_WORDS", "150"))
+# Rendered histories cached per worker (0 disables the cache)
+HISTORY_CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", "1024"))
+
+# Retrieved context is merged, de-duplicated and trimmed to this many tokens
+# before it goes into the prompt (0 = no limit)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+
+# SSE streaming: after the first token (sent at once), deltas are batched for
+# up to SSE_COALESCE_MS or SSE_COALESCE_BYTES; a keep-alive comment is sent
+# after SSE_KEEPALIVE_SECONDS of silence (0 disables it)
+SSE_COALESCE_MS = float(os.getenv("SSE_COALESCE_MS", "30"))
+SSE_COALESCE_BYTES = int(os.getenv("SSE_COALESCE_BYTES", "512"))
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+# A stream whose client has gone away is cancelled (model call included)
+# within SSE_DISCONNECT_POLL_SECONDS (0 disables polling); the partial answer
+# is kept in the session history unless SAVE_PARTIAL_ANSWERS is false
+SSE_DISCONNECT_POLL_SECONDS = float(os.getenv("SSE_DISCONNECT_POLL_SECONDS", "0.5"))
+SAVE_PARTIAL_ANSWERS = os.getenv("SAVE_PARTIAL_ANSWERS", "true").lower() in ("1", "true", "yes")
+
+# Admission control (per process): at most LLM_MAX_CONCURRENCY LLM calls
+# (answers and history summaries) run at once (0 disables the limit); up to
+# LLM_MAX_QUEUE more answers wait for at most LLM_QUEUE_TIMEOUT_SECONDS,
+# anything beyond gets HTTP 429. Summaries wait behind queued answers. Answer-
+# cache hits and requests joining an identical in-flight question take no slot
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "64"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10"))
+
+# Logging: LOG_LEVEL threshold and LOG_FORMAT "text" (terminal) or "json"
+# (one object per line, for log pipelines)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
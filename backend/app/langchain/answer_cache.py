@@ -0,0 +1,93 @@
+# app/langchain/answer_cache.py
+"""
+Semantic answer cache for first-turn questions.
+
+A new question is answered from the cache when its embedding is at least
+`threshold` cosine-similar to a cached question in the same scope. The scope
+is (language, current date, retrieved chunk IDs): chunk IDs are content
+hashes, so any corpus change that affects the retrieved context also changes
+the scope and old answers simply stop matching.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+Scope = Tuple[str, str, FrozenSet[str]]
+
+
+class _Entry:
+    __slots__ = ("vector", "scope", "tokens", "created")
+
+    def __init__(self, vector: np.ndarray, scope: Scope, tokens: Tuple[str, ...], created: float):
+        self.vector = vector
+        self.scope = scope
+        self.tokens = tokens
+        self.created = created
+
+
+def _normalized(vector: List[float]) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm else v
+
+
+class SemanticAnswerCache:
+    """Size-bounded LRU of streamed answers with TTL and similarity lookup."""
+
+    def __init__(self, threshold: float = 0.95, ttl_seconds: float = 86400, max_entries: int = 512):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._by_scope: Dict[Hashable, List[int]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _drop(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        ids = self._by_scope[entry.scope]
+        ids.remove(entry_id)
+        if not ids:
+            del self._by_scope[entry.scope]
+
+    def lookup(self, vector: List[float], scope: Scope) -> Optional[Tuple[str, ...]]:
+        """Return the cached tokens of the most similar live answer, if any."""
+        query = _normalized(vector)
+        now = time.monotonic()
+        with self._lock:
+            ids = [
+                i for i in self._by_scope.get(scope, [])
+                if now - self._entries[i].created <= self.ttl_seconds
+            ]
+            for i in list(self._by_scope.get(scope, [])):
+                if i not in ids:
+                    self._drop(i)
+
+            if ids:
+                matrix = np.stack([self._entries[i].vector for i in ids])
+                scores = matrix @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self._entries.move_to_end(ids[best])
+                    self.hits += 1
+                    return self._entries[ids[best]].tokens
+            self.misses += 1
+            return None
+
+    def store(self, vector: List[float], scope: Scope, tokens: List[str]) -> None:
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(_normalized(vector), scope, tuple(tokens), time.monotonic())
+            self._by_scope.setdefault(scope, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
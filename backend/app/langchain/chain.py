@@ -1,33 +1,96 @@
 # backend/app/langchain/chain.py
+import logging
 import os
+import threading
+from typing import Optional
 from dotenv import load_dotenv
 from langchain_openai import AzureChatOpenAI
-from app.langchain.prompts import prompt
+from app.config.settings import HISTORY_SUMMARY_MAX_WORDS
+from app import metrics
+from app.langchain.prompts import prompt, summary_prompt
+from app.qdrant.embedding_executor import count_tokens
 
 # Load .env
 load_dotenv()
 
-# Initialize Azure Chat LLM
-api_key = os.getenv("AZURE_OPENAI_API_KEY")
-endpoint = os.getenv("AZURE_OPENAI_ENDPOINT_CHAT")
-deployment = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT")
-api_version = os.getenv("AZURE_OPENAI_CHAT_API_VERSION")
+logger = logging.getLogger(__name__)
 
-print(f"DEBUG: Using endpoint: {endpoint}")
-print(f"DEBUG: Using deployment: {deployment}")
-print(f"DEBUG: API key set: {bool(api_key)}")
+# The Azure client is built on first use (or by the app's startup warm-up),
+# never at import time, so importing this module is instant.
+_llm = None
+_chain = None
+_summary_chain = None
+_chain_lock = threading.RLock()
 
-llm = AzureChatOpenAI(
-    azure_deployment=deployment,  
-    temperature=0.3,
-    streaming=True,
-    openai_api_version=api_version,
-    azure_endpoint=endpoint,
-    api_key=api_key,
-)
 
-# Create chain
-chain = prompt | llm
+def get_llm():
+    """Build the Azure chat client once and return it."""
+    global _llm
+    if _llm is not None:
+        return _llm
+    with _chain_lock:
+        if _llm is None:
+            # Initialize Azure Chat LLM
+            api_key = os.getenv("AZURE_OPENAI_API_KEY")
+            endpoint = os.getenv("AZURE_OPENAI_ENDPOINT_CHAT")
+            deployment = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT")
+            api_version = os.getenv("AZURE_OPENAI_CHAT_API_VERSION")
+
+            logger.debug("Chat client: endpoint=%s deployment=%s api_key_set=%s",
+                         endpoint, deployment, bool(api_key))
+
+            _llm = AzureChatOpenAI(
+                azure_deployment=deployment,
+                temperature=0.3,
+                streaming=True,
+                openai_api_version=api_version,
+                azure_endpoint=endpoint,
+                api_key=api_key,
+            )
+    return _llm
+
+
+def get_chain():
+    """Build the prompt | llm chain once and return it."""
+    global _chain
+    if _chain is not None:
+        return _chain
+    with _chain_lock:
+        if _chain is None:
+            # Create chain
+            _chain = prompt | get_llm()
+    return _chain
+
+
+def get_summary_chain():
+    """Build the summary_prompt | llm chain used to fold old turns."""
+    global _summary_chain
+    if _summary_chain is not None:
+        return _summary_chain
+    with _chain_lock:
+        if _summary_chain is None:
+            _summary_chain = summary_prompt | get_llm()
+    return _summary_chain
+
+
+def count_prompt_tokens(**input_data) -> int:
+    """Tokens of the fully rendered answer prompt (tiktoken estimate)."""
+    messages = prompt.format_messages(**input_data)
+    return sum(count_tokens(m.content) + 4 for m in messages)  # + per-message overhead
+
+
+class StreamStatus:
+    """Filled in by stream_answer/astream_answer: completed is True only after a clean finish."""
+
+    __slots__ = ("completed",)
+
+    def __init__(self):
+        self.completed = False
+
+
+def is_ready() -> bool:
+    """True once the chat client has been constructed."""
+    return _chain is not None
 
 
 def stream_answer(
@@ -35,10 +98,13 @@ def stream_answer(
     context: str,
     chat_history: str,
     current_date: str,
-    language: str = "en"
+    language: str = "en",
+    status: Optional[StreamStatus] = None,
 ):
     """
     Render the prompt with the input variables and stream the LLM response.
+    Errors end the stream quietly; pass a StreamStatus to tell a complete
+    answer from a truncated one.
     """
     try:
         # Use the chain to process the input and stream the output
@@ -49,11 +115,64 @@ def stream_answer(
             "current_date": current_date,
             "language": language
         }
-        
+
         # Stream output from the chain
-        for chunk in chain.stream(input_data):
+        for chunk in get_chain().stream(input_data):
             if hasattr(chunk, 'content') and chunk.content:
                 yield chunk.content
+        if status is not None:
+            status.completed = True
     except Exception as e:
-        print(f"Error in stream_answer: {str(e)}")
+        logger.error("Error in stream_answer: %s", e)
+        metrics.count_error("llm")
         yield ""
+
+
+async def astream_answer(
+    question: str,
+    context: str,
+    chat_history: str,
+    current_date: str,
+    language: str = "en",
+    status: Optional[StreamStatus] = None,
+):
+    """
+    Async stream_answer: tokens arrive via chain.astream, so a streaming
+    response holds no threadpool thread while the model generates.
+    """
+    try:
+        input_data = {
+            "question": question,
+            "context": context,
+            "chat_history": chat_history,
+            "current_date": current_date,
+            "language": language
+        }
+
+        async for chunk in get_chain().astream(input_data):
+            if hasattr(chunk, 'content') and chunk.content:
+                yield chunk.content
+        if status is not None:
+            status.completed = True
+    except Exception as e:
+        logger.error("Error in astream_answer: %s", e)
+        metrics.count_error("llm")
+        yield ""
+
+
+async def asummarize(summary: str, transcript: str) -> str:
+    """
+    Fold new conversation turns into the running summary.
+    Returns "" on failure so the caller keeps the previous summary.
+    """
+    try:
+        result = await get_summary_chain().ainvoke({
+            "summary": summary or "(none)",
+            "transcript": transcript,
+            "max_words": HISTORY_SUMMARY_MAX_WORDS,
+        })
+        return (getattr(result, "content", "") or "").strip()
+    except Exception as e:
+        logger.warning("Error in asummarize: %s", e)
+        metrics.count_error("summary")
+        return ""
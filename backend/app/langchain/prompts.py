@@ -31,3 +31,31 @@ User question:
 """
     )
 ])
+
+
+# Folds conversation turns that no longer fit the history budget into a
+# running summary (see app/sessions/history.py)
+summary_prompt = ChatPromptTemplate.from_messages([
+    (
+        "system",
+        """
+You maintain a running summary of a conversation between a traveller and a tourism assistant.
+
+Merge the new conversation turns into the current summary.
+Keep the traveller's destinations, dates, budget, preferences and open questions, and any recommendations already given.
+Drop greetings and small talk.
+Write at most {max_words} words, in the language of the conversation.
+Reply with the updated summary only.
+"""
+    ),
+    (
+        "human",
+        """
+Current summary:
+{summary}
+
+New conversation turns:
+{transcript}
+"""
+    )
+])
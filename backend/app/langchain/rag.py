@@ -1,24 +1,159 @@
 # app/langchain/rag.py
+import logging
 from datetime import date
-from app.langchain.chain import stream_answer
-from app.qdrant.retrieval import retrieve_context
+from typing import Optional
+from app.config.settings import (
+    ANSWER_CACHE_ENABLED,
+    ANSWER_CACHE_SIMILARITY,
+    ANSWER_CACHE_TTL_SECONDS,
+    ANSWER_CACHE_MAX_ENTRIES,
+    SINGLE_FLIGHT_ENABLED,
+)
+from app import metrics
+from app.admission import Admit, Overloaded
+from app.langchain.answer_cache import SemanticAnswerCache
+from app.langchain.chain import StreamStatus, astream_answer, count_prompt_tokens, stream_answer
+from app.langchain.single_flight import SingleFlight, question_key
+from app.qdrant.retrieval import asearch_documents, pack_documents, search_documents
+
+logger = logging.getLogger(__name__)
+
+# Answers to history-free questions, replayed for semantically similar repeats
+answer_cache = SemanticAnswerCache(
+    threshold=ANSWER_CACHE_SIMILARITY,
+    ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+    max_entries=ANSWER_CACHE_MAX_ENTRIES,
+) if ANSWER_CACHE_ENABLED else None
+
+# Identical history-free questions asked at the same time share one generation
+single_flight = SingleFlight() if SINGLE_FLIGHT_ENABLED else None
+
+
+def _source_ids(docs) -> frozenset:
+    """Content-addressed point IDs of the retrieved chunks (see app/qdrant/ingest.py)."""
+    return frozenset(str(d.metadata.get("_id", d.metadata.get("path", ""))) for d in docs)
+
+
+def _log_prompt_size(question: str, context: str, chat_history: str, current_date: str,
+                     language: str, packed: dict) -> None:
+    tokens = count_prompt_tokens(
+        question=question, context=context, chat_history=chat_history,
+        current_date=current_date, language=language,
+    )
+    metrics.observe(metrics.PROMPT_TOKENS, tokens)
+    logger.info(
+        "Prompt assembled",
+        extra={"prompt_tokens": tokens, "context_tokens": packed["tokens"],
+               "passages": packed["passages"], "chunks": packed["chunks"]},
+    )
+
 
 def ask_tourism_bot(question: str, chat_history: str = "", language: str = "en"):
     """Retrieve context from Qdrant and stream an LLM response."""
     try:
         # Retrieve context from vector DB
-        context = retrieve_context(question)
-        print(f"Retrieved {len(context)} chars of context")
+        query_vector, docs = search_documents(question, chat_history=chat_history)
+        context, packed = pack_documents(docs)
+
+        current_date = str(date.today())
+        scope = (language, current_date, _source_ids(docs))
+        cacheable = answer_cache is not None and not chat_history.strip()
+        if cacheable:
+            cached = answer_cache.lookup(query_vector, scope)
+            if cached is not None:
+                logger.info("Replaying cached answer")
+                yield from cached
+                return
+
+        _log_prompt_size(question, context, chat_history, current_date, language, packed)
 
         # Stream answer from LangChain
+        tokens = []
+        status = StreamStatus()
         for token in stream_answer(
             question=question,
             context=context,
             chat_history=chat_history,
-            current_date=str(date.today()),
-            language=language
+            current_date=current_date,
+            language=language,
+            status=status,
         ):
+            tokens.append(token)
             yield token
+
+        # Only complete, non-empty answers are cached: a model error ends the
+        # stream early without raising, and an aborted stream never gets here
+        if cacheable and status.completed and "".join(tokens).strip():
+            answer_cache.store(query_vector, scope, tokens)
+    except Exception as e:
+        logger.exception("Error in ask_tourism_bot: %s", e)
+        metrics.count_error("rag")
+        yield ""
+
+
+async def aask_tourism_bot(question: str, chat_history: str = "", language: str = "en",
+                           admit: Optional[Admit] = None):
+    """
+    Async ask_tourism_bot: retrieval and generation never block the event loop.
+    admit() is awaited for an LLM slot only when a completion is actually
+    started, so cache hits and requests joining an identical in-flight
+    question never take one; it may raise Overloaded.
+    """
+    if single_flight is None or chat_history.strip():
+        async for token in _agenerate(question, chat_history, language, admit):
+            yield token
+        return
+
+    async for token in single_flight.stream(
+        question_key(question, language), lambda: _agenerate(question, "", language, admit)
+    ):
+        yield token
+
+
+async def _agenerate(question: str, chat_history: str, language: str, admit: Optional[Admit] = None):
+    """Retrieve, then stream the answer (or replay it from the answer cache)."""
+    try:
+        # Retrieve context from vector DB
+        query_vector, docs = await asearch_documents(question, chat_history=chat_history)
+        context, packed = pack_documents(docs)
+
+        current_date = str(date.today())
+        scope = (language, current_date, _source_ids(docs))
+        cacheable = answer_cache is not None and not chat_history.strip()
+        if cacheable:
+            cached = answer_cache.lookup(query_vector, scope)
+            if cached is not None:
+                logger.info("Replaying cached answer")
+                for token in cached:
+                    yield token
+                return
+
+        _log_prompt_size(question, context, chat_history, current_date, language, packed)
+
+        # Stream answer from LangChain, holding an LLM slot for its duration
+        permit = await admit() if admit is not None else None
+        tokens = []
+        status = StreamStatus()
+        try:
+            async for token in astream_answer(
+                question=question,
+                context=context,
+                chat_history=chat_history,
+                current_date=current_date,
+                language=language,
+                status=status,
+            ):
+                tokens.append(token)
+                yield token
+        finally:
+            if permit is not None:
+                permit.release()
+
+        if cacheable and status.completed and "".join(tokens).strip():
+            answer_cache.store(query_vector, scope, tokens)
+    except Overloaded:
+        raise
     except Exception as e:
-        print(f"Error in ask_tourism_bot: {str(e)}")
+        logger.exception("Error in aask_tourism_bot: %s", e)
+        metrics.count_error("rag")
         yield ""
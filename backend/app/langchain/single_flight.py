@@ -0,0 +1,126 @@
+# app/langchain/single_flight.py
+"""
+Single-flight coalescing of identical concurrent questions.
+
+When a tour group or a campaign sends the same opening question at once,
+every request would run its own retrieval and completion. SingleFlight runs
+one generation per key and fans its tokens out to every request that asks
+while it is in flight. A request that joins late first receives the tokens
+already produced, then the live ones. The generation runs in its own task,
+so it survives the request that started it and is cancelled only when every
+subscriber has gone away.
+
+Only history-free turns are coalesced (the key is the normalized question
+and the language); once a generation finishes, repeats are served by the
+semantic answer cache instead.
+"""
+import asyncio
+import re
+from typing import AsyncIterator, Callable, Dict, Hashable, List, Optional
+
+from app import metrics
+
+_SPACES = re.compile(r"\s+")
+
+
+def question_key(question: str, language: str) -> Hashable:
+    """Case-, whitespace- and end-punctuation-insensitive key for a first-turn question."""
+    text = _SPACES.sub(" ", question).strip().strip("?!.。؟ ").casefold()
+    return (text, language)
+
+
+class _Flight:
+    """Token log of one generation plus the subscribers reading it."""
+
+    __slots__ = ("tokens", "done", "error", "subscribers", "task", "_changed")
+
+    def __init__(self):
+        self.tokens: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def _wake(self) -> None:
+        # Each change sets the current event and installs a fresh one
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def publish(self, token: str) -> None:
+        self.tokens.append(token)
+        self._wake()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.done = True
+        self.error = error
+        self._wake()
+
+    async def replay(self) -> AsyncIterator[str]:
+        """Tokens produced so far, then live ones until the generation ends."""
+        i = 0
+        while True:
+            changed = self._changed
+            while i < len(self.tokens):
+                yield self.tokens[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+
+class SingleFlight:
+    """At most one in-flight generation per key, shared by all concurrent callers."""
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.started = 0
+        self.joined = 0
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def stream(self, key: Hashable, produce: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        Stream the tokens of the generation for key, starting one with
+        produce() if none is running.
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.get_running_loop().create_task(self._run(key, flight, produce()))
+            self.started += 1
+        else:
+            self.joined += 1
+            metrics.count_coalesced()
+        flight.subscribers += 1
+        try:
+            async for token in flight.replay():
+                yield token
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Nobody is listening any more: stop paying for the completion.
+                # Unregister first, so a caller arriving while the task unwinds
+                # starts a fresh flight instead of joining this dying one.
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    async def _run(self, key: Hashable, flight: _Flight, tokens: AsyncIterator[str]) -> None:
+        error = None
+        try:
+            async for token in tokens:
+                flight.publish(token)
+        except asyncio.CancelledError:
+            error = asyncio.CancelledError()
+        except Exception as e:
+            error = e
+        finally:
+            # New callers start a fresh generation (or hit the answer cache)
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.finish(error)
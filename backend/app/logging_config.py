@@ -0,0 +1,59 @@
+# app/logging_config.py
+"""
+Logging setup for the API and the ingestion scripts.
+
+LOG_FORMAT=json writes one JSON object per line (timestamp, level, logger,
+message and any `extra` fields), ready for a log pipeline; the default "text"
+format is meant for a terminal. LOG_LEVEL sets the threshold.
+"""
+import logging
+import sys
+
+import orjson
+
+from app.config.settings import LOG_FORMAT, LOG_LEVEL
+
+# Attributes every LogRecord has; anything else came from `extra=`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update((k, v) for k, v in vars(record).items() if k not in _STANDARD_ATTRS)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
+class TextFormatter(logging.Formatter):
+    """`LEVEL logger: message key=value ...`"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"{record.levelname:<7} {record.name}: {record.getMessage()}"
+        extra = " ".join(f"{k}={v}" for k, v in vars(record).items() if k not in _STANDARD_ATTRS)
+        if extra:
+            line = f"{line} {extra}"
+        if record.exc_info:
+            line = f"{line}\n{self.formatException(record.exc_info)}"
+        return line
+
+
+def configure_logging() -> None:
+    """Install the configured handler on the root logger (idempotent)."""
+    root = logging.getLogger()
+    if any(getattr(h, "_tourism", False) for h in root.handlers):
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    handler._tourism = True
+    root.addHandler(handler)
+    root.setLevel(LOG_LEVEL)
+    # Per-request HTTP client chatter drowns out the app's own records
+    for noisy in ("httpx", "httpcore", "openai"):
+        logging.getLogger(noisy).setLevel(max(logging.WARNING, root.level))
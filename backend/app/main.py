@@ -1,44 +1,240 @@
-from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse
+from contextlib import asynccontextmanager
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, List
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
 from pydantic import BaseModel
-import json
+import asyncio
+import logging
 import os
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Import RAG system
-from app.langchain.rag import ask_tourism_bot
-
-# Initialize FastAPI application with a title
-app = FastAPI(title="Tourism Chatbot API")
-
-# Add CORS middleware to allow frontend to connect
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        "http://localhost:3000",
-        "http://localhost:8000",
-        "http://127.0.0.1:3000",
-        "http://127.0.0.1:8000",
-    ],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+from app import metrics
+from app.admission import AdmissionController, Overloaded
+from app.logging_config import configure_logging
+
+# Import RAG system (cheap: clients are created lazily, see lifespan below)
+from app.langchain import chain as llm_chain
+from app.langchain.rag import aask_tourism_bot
+from app.qdrant import retrieval
+from app.config.settings import (
+    HISTORY_TOKEN_BUDGET,
+    HISTORY_KEEP_TURNS,
+    HISTORY_SUMMARY_ENABLED,
+    HISTORY_CACHE_SIZE,
+    SSE_COALESCE_MS,
+    SSE_COALESCE_BYTES,
+    SSE_KEEPALIVE_SECONDS,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_QUEUE,
+    LLM_QUEUE_TIMEOUT_SECONDS,
+    SSE_DISCONNECT_POLL_SECONDS,
+    SAVE_PARTIAL_ANSWERS,
 )
+from app.sessions.history import HistoryManager
+from app.sessions.store import Message, store_from_settings
+from app.qdrant.embedding_executor import count_tokens
+from app.sse import ClientDisconnected, coalesce_frames, sse_event, until_disconnected
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Background warm-up failures by component, reported by /health/ready
+startup_errors: Dict[str, str] = {}
+
+
+async def _warm_up(name: str, init) -> None:
+    """Run a blocking initializer off the event loop and record any failure."""
+    try:
+        await asyncio.to_thread(init)
+        logger.info("%s ready", name)
+    except Exception as e:
+        startup_errors[name] = str(e)
+        logger.error("%s warm-up failed: %s", name, e)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start serving immediately; clients and ingestion warm up in the background."""
+    startup_errors.clear()
+    warm_ups = [
+        asyncio.create_task(_warm_up("llm", llm_chain.get_chain)),
+        asyncio.create_task(_warm_up("retrieval", retrieval.init_retrieval)),
+    ]
+    yield
+    for task in warm_ups:
+        task.cancel()
+    metrics.worker_exited()
+
+
+def create_app() -> FastAPI:
+    """Application factory used by uvicorn (`app.main:app`)."""
+    configure_logging()
+
+    # Initialize FastAPI application with a title
+    application = FastAPI(title="Tourism Chatbot API", lifespan=lifespan)
+
+    # Add CORS middleware to allow frontend to connect
+    application.add_middleware(
+        CORSMiddleware,
+        allow_origins=[
+            "http://localhost:3000",
+            "http://localhost:8000",
+            "http://127.0.0.1:3000",
+            "http://127.0.0.1:8000",
+        ],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    application.include_router(router)
+    return application
+
+
+# Session storage selected by SESSION_BACKEND and bounded by the SESSION_*
+# settings (see app/sessions/). Calls go through a worker thread since the
+# sqlite/redis backends do blocking I/O.
+sessions = store_from_settings()
+metrics.register_session_stats(sessions.stats)
+
+
+# Token frames are batched per SSE_COALESCE_MS window / SSE_COALESCE_BYTES
+SSE_OPTIONS = dict(
+    window=SSE_COALESCE_MS / 1000.0,
+    max_bytes=SSE_COALESCE_BYTES,
+    keepalive=SSE_KEEPALIVE_SECONDS or None,
+)
+
+
+# Bounds concurrent LLM generations; excess requests queue briefly, then get 429
+admission = AdmissionController(LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_QUEUE_TIMEOUT_SECONDS)
+
+# What the prompt sees of a session: recent turns within a token budget plus
+# a rolling summary of older ones, folded in the background after each answer;
+# summary calls take LLM slots behind queued chat requests
+history = HistoryManager(
+    sessions,
+    summarize=llm_chain.asummarize if HISTORY_SUMMARY_ENABLED else None,
+    token_budget=HISTORY_TOKEN_BUDGET,
+    keep_turns=HISTORY_KEEP_TURNS,
+    cache_size=HISTORY_CACHE_SIZE,
+    admit=lambda: admission.acquire(background=True),
+)
+
+
+def _shed(e: Overloaded) -> JSONResponse:
+    logger.warning("Request shed: %s", e, extra={"reason": e.reason, "retry_after": e.retry_after})
+    return JSONResponse(
+        {"detail": "The assistant is busy, please retry shortly.", "reason": e.reason},
+        status_code=429,
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+class _StartedAnswer:
+    """An answer whose first token is pending (or ready) in a task, then the rest of its tokens."""
+
+    def __init__(self, first: asyncio.Task, tokens: AsyncIterator[str]):
+        self._first = first
+        self._tokens = tokens
+        self._iterating = False
+
+    async def __aiter__(self):
+        self._iterating = True
+        try:
+            try:
+                yield await self._first
+            except StopAsyncIteration:
+                return
+            async for token in self._tokens:
+                yield token
+        finally:
+            await self._close()
+
+    async def aclose(self) -> None:
+        """
+        Stop the answer when the response never started streaming it. Once it
+        has, the iteration above closes it: the token stream may still be
+        unwinding a cancelled read, and closing it from here would fail.
+        """
+        if not self._iterating:
+            await self._close()
+
+    async def _close(self) -> None:
+        if not self._first.done():
+            self._first.cancel()
+            await asyncio.gather(self._first, return_exceptions=True)
+        await self._tokens.aclose()
+
+
+async def _start_answer(question: str, chat_history: str,
+                        language: str) -> Tuple[Optional[_StartedAnswer], Optional[JSONResponse]]:
+    """
+    Start answering and wait until the request either holds an LLM slot or
+    turns out not to need one (its first token is ready: an answer-cache hit
+    or a joined identical question). Returns the answer, or the 429 response
+    to send instead when admission sheds it; either way before any header is
+    sent.
+    """
+    loop = asyncio.get_running_loop()
+    admitted = loop.create_future()
+
+    async def admit():
+        permit = await admission.acquire()
+        if not admitted.done():
+            admitted.set_result(None)
+        return permit
+
+    tokens = aask_tourism_bot(question, chat_history, language, admit=admit)
+    first = loop.create_task(tokens.__anext__())
+    try:
+        await asyncio.wait((first, admitted), return_when=asyncio.FIRST_COMPLETED)
+    except BaseException:
+        first.cancel()
+        raise
+    if first.done() and not first.cancelled() and isinstance(first.exception(), Overloaded):
+        return None, _shed(first.exception())
+    return _StartedAnswer(first, tokens), None
+
+
+async def _save_turn(session_id: str, question: str, answer: str) -> None:
+    """Append a question/answer pair to the session and fold old turns later."""
+    await asyncio.to_thread(
+        sessions.extend, session_id, [Message("user", question), Message("assistant", answer)]
+    )
+    history.fold_in_background(session_id)
+
+
+# Saves of interrupted answers, referenced until done
+_pending_saves: Set[asyncio.Task] = set()
+
+
+def _abandoned(session_id: Optional[str], question: str, answer_tokens) -> None:
+    """
+    Account for an answer cut short by a client disconnect. Never awaits, since
+    the caller may be unwinding a cancellation; the partial answer is saved in
+    a separate task.
+    """
+    metrics.count_aborted()
+    partial = "".join(answer_tokens)
+    logger.info("Client disconnected, generation aborted", extra={"partial_chars": len(partial)})
+    if not (session_id and SAVE_PARTIAL_ANSWERS and partial.strip()):
+        return
+    task = asyncio.get_running_loop().create_task(_save_turn(session_id, question, partial))
+    _pending_saves.add(task)
+    task.add_done_callback(_pending_saves.discard)
+
+
+def _raw_frame(text: str) -> bytes:
+    """Legacy /chat framing: unencoded text in a data line."""
+    return f"data: {text}\n\n".encode("utf-8")
 
-# In-memory session storage for the lifetime of the app
-# Structure:
-# {
-#   session_id: [
-#       { "role": "user"|"assistant", "content": str },
-#       ...
-#   ]
-# }
-sessions: Dict[str, List[Dict[str, str]]] = {}
 
 # Conversations storage
 conversations: Dict[str, Dict] = {}
@@ -50,14 +246,45 @@ class ChatRequest(BaseModel):
     language: str = "en"
 
 
-@app.get("/health")
-def health_check():
+@router.get("/health")
+async def health_check():
     """Health check endpoint for frontend to verify backend is running."""
-    return {"status": "healthy", "service": "Tourism Chatbot API", "rag_enabled": True}
+    return {
+        "status": "healthy",
+        "service": "Tourism Chatbot API",
+        "rag_enabled": True,
+        # Session counts are on /metrics: on Redis they need a keyspace scan
+        "admission": admission.stats(),
+    }
+
+
+@router.get("/health/live")
+def liveness():
+    """Liveness probe: answers as soon as the process can serve HTTP."""
+    return {"status": "alive"}
+
 
+@router.get("/health/ready")
+def readiness():
+    """Readiness probe: 200 once retrieval and the LLM are usable, 503 before."""
+    checks = {"retrieval": retrieval.is_ready(), "llm": llm_chain.is_ready()}
+    ready = all(checks.values())
+    body = {"status": "ready" if ready else "starting", **checks}
+    if startup_errors:
+        body["status"] = "error"
+        body["errors"] = dict(startup_errors)
+    return JSONResponse(body, status_code=200 if ready else 503)
 
-@app.post("/chat/stream")
-async def chat_stream(request: ChatRequest):
+
+@router.get("/metrics")
+def prometheus_metrics():
+    """Prometheus exposition of the per-stage latency and token histograms."""
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
     """
     POST endpoint for streaming chat interaction.
     Accepts:
@@ -65,109 +292,161 @@ async def chat_stream(request: ChatRequest):
         - session_id: Unique session identifier
         - language: Desired response language (default: 'en')
     Streams the assistant's response using Server-Sent Events (SSE) with 'event: token' format.
+    Generation is cancelled if the client disconnects.
     """
     
+    timer = metrics.StreamTimer()
     session_id = request.session_id
     question = request.message
     language = request.language or "en"
 
-    # Retrieve existing chat history for this session
-    history = sessions.get(session_id, [])
+    # Recent turns (within the token budget) plus a summary of older ones
+    chat_history = await asyncio.to_thread(history.render, session_id)
+
+    # Retrieve and, on an answer-cache miss, wait for an LLM slot; a shed
+    # request gets 429 before streaming starts
+    metrics.set_request_labels("/chat/stream", language)
+    started, rejected = await _start_answer(question, chat_history, language)
+    if rejected is not None:
+        return rejected
 
-    # Convert history into a text format for context
-    chat_history = "\n".join([f"{m['role']}: {m['content']}" for m in history])
+    # Define an async generator to stream tokens as they are produced;
+    # one event loop can hold many open streams without tying up threads
+    answer_tokens = []
 
-    # Define a generator function to stream tokens as they are produced
-    def event_stream():
-        answer_tokens = []
-        
+    async def answer():
+        # Pass on each non-empty token of the tourism bot's answer
+        async for token in started:
+            if token:
+                timer.token()
+                answer_tokens.append(token)
+                yield token
+
+    async def event_stream():
+        metrics.set_request_labels("/chat/stream", language)
+        finished = False
         try:
-            print(f"🔍 Processing question: {question}")
-            # Call the tourism bot RAG system and stream each token
-            token_count = 0
-            for token in ask_tourism_bot(question, chat_history, language):
-                token_count += 1
-                if token:  # Only process non-empty tokens
-                    answer_tokens.append(token)
-                    # SSE format with JSON-encoded token to handle newlines safely
-                    # Debug: show what we're sending
-                    if token_count <= 3 or token_count % 50 == 0:
-                        print(f"Token {token_count}: {repr(token)}")
-                    yield f"event: token\ndata: {json.dumps(token)}\n\n"
-            
-            print(f"✅ Streamed {token_count} tokens for question: {question}")
+            logger.info("Processing question", extra={"endpoint": "/chat/stream", "language": language})
+            # Tokens are coalesced into SSE frames (JSON-encoded data); the
+            # first one is flushed immediately. A disconnect cancels the model
+            # stream behind them
+            frames = coalesce_frames(answer(), **SSE_OPTIONS)
+            async for frame in until_disconnected(frames, http_request.is_disconnected, SSE_DISCONNECT_POLL_SECONDS):
+                yield frame
+            finished = True
 
             # Combine all tokens into the full answer
             full_answer = "".join(answer_tokens)
+            timer.finish(count_tokens(full_answer))
 
             # Update session history with user question and assistant response
-            history.append({"role": "user", "content": question})
-            history.append({"role": "assistant", "content": full_answer})
-            sessions[session_id] = history
+            await _save_turn(session_id, question, full_answer)
             
             # Send completion event with metadata
             completion_data = {
                 "topic": "Italy Tourism",
                 "message": "Response completed using trained RAG system"
             }
-            yield f"event: meta\ndata: {json.dumps(completion_data)}\n\n"
+            yield sse_event("meta", completion_data)
             
+        except ClientDisconnected:
+            _abandoned(session_id, question, answer_tokens)
+        except (asyncio.CancelledError, GeneratorExit):
+            # The server noticed the disconnect first (failed write or cancelled task)
+            if not finished:
+                _abandoned(session_id, question, answer_tokens)
+            raise
         except Exception as e:
+            metrics.count_error("stream")
+            logger.exception("Streaming failed: %s", e)
             # Send error response
             error_message = f"Error processing request: {str(e)}"
             yield f"event: error\ndata: {error_message}\n\n"
 
-    # Return a streaming response so the client receives tokens progressively
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
+    # Return a streaming response so the client receives tokens progressively;
+    # the background task stops the answer (and frees its LLM slot) even if
+    # the stream never started
+    return StreamingResponse(
+        event_stream(), media_type="text/event-stream", background=BackgroundTask(started.aclose)
+    )
 
 
-@app.delete("/conversations/{conversation_id}")
+@router.delete("/conversations/{conversation_id}")
 async def delete_conversation(conversation_id: str):
     """
-    DELETE endpoint to remove a conversation.
+    DELETE endpoint to remove a conversation and any chat history stored under its ID.
     """
     try:
         if conversation_id in conversations:
             del conversations[conversation_id]
+        await asyncio.to_thread(sessions.delete, conversation_id)
         return {"success": True, "message": f"Conversation {conversation_id} deleted"}
     except Exception as e:
         return {"success": False, "message": str(e)}
 
 
-@app.get("/chat")
-def chat(question: str, language: str = "en"):
+@router.get("/chat")
+async def chat(request: Request, question: str, language: str = "en", session_id: Optional[str] = None):
     """
     GET endpoint for chatbot interaction (legacy endpoint).
     Accepts:
         - question: User's input text
         - language: Desired response language (default: 'en')
+        - session_id: Optional session identifier; without one the turn is
+          answered without history and nothing is stored
     Streams the assistant's response token-by-token using Server-Sent Events (SSE).
     """
 
-    # Retrieve existing chat history for the global session
-    GLOBAL_SESSION_ID = "app_session"
-    history = sessions.get(GLOBAL_SESSION_ID, [])
+    timer = metrics.StreamTimer()
+
+    # Recent turns (within the token budget) plus a summary of older ones
+    chat_history = await asyncio.to_thread(history.render, session_id) if session_id else ""
 
-    # Convert history into a text format for context
-    chat_history = "\n".join([f"{m['role']}: {m['content']}" for m in history])
+    metrics.set_request_labels("/chat", language)
+    started, rejected = await _start_answer(question, chat_history, language)
+    if rejected is not None:
+        return rejected
 
-    # Define a generator function to stream tokens as they are produced
-    def event_stream():
-        answer_tokens = []
+    # Define an async generator to stream tokens as they are produced
+    answer_tokens = []
 
-        # Call the tourism bot and stream each token
-        for token in ask_tourism_bot(question, chat_history, language):
+    async def answer():
+        async for token in started:
+            if token:
+                timer.token()
             answer_tokens.append(token)
-            # SSE format: "data: <token>\n\n"
-            yield f"data: {token}\n\n"
+            yield token
+
+    async def event_stream():
+        metrics.set_request_labels("/chat", language)
+        # Call the tourism bot and stream tokens, coalesced, as raw
+        # SSE format: "data: <text>\n\n"
+        try:
+            frames = coalesce_frames(answer(), encode=_raw_frame, **SSE_OPTIONS)
+            async for frame in until_disconnected(frames, request.is_disconnected, SSE_DISCONNECT_POLL_SECONDS):
+                yield frame
+        except ClientDisconnected:
+            _abandoned(session_id, question, answer_tokens)
+            return
+        except (asyncio.CancelledError, GeneratorExit):
+            _abandoned(session_id, question, answer_tokens)
+            raise
+        except Exception:
+            metrics.count_error("stream")
+            raise
 
         # Combine all tokens into the full answer
         full_answer = "".join(answer_tokens)
+        timer.finish(count_tokens(full_answer))
 
         # Update session history with user question and assistant response
-        history.append({"role": "user", "content": question})
-        history.append({"role": "assistant", "content": full_answer})
-        sessions[GLOBAL_SESSION_ID] = history
+        if session_id:
+            await _save_turn(session_id, question, full_answer)
 
     # Return a streaming response so the client receives tokens progressively
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
\ No newline at end of file
+    return StreamingResponse(
+        event_stream(), media_type="text/event-stream", background=BackgroundTask(started.aclose)
+    )
+
+
+app = create_app()
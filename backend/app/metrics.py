@@ -0,0 +1,203 @@
+# app/metrics.py
+"""
+Prometheus metrics for the chat request path, served on GET /metrics.
+
+Every series is labeled by endpoint and language. The labels for the current
+request live in a context variable set once by the endpoint
+(request_labels), so retrieval and the chain can record timings without
+having the labels passed through every call.
+
+prometheus_client keeps its values per process, so with several uvicorn
+workers a scrape would only see the worker that happened to answer it. When
+PROMETHEUS_MULTIPROC_DIR is set (the Docker image sets it), every worker
+writes its values to files there and /metrics aggregates all of them; gauges
+declare how they combine across workers.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+LABELS = ("endpoint", "language")
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+_TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+QUERY_EMBEDDING_SECONDS = Histogram(
+    "tourism_query_embedding_seconds", "Query embedding latency (cache hits included)",
+    LABELS, buckets=_LATENCY_BUCKETS,
+)
+VECTOR_SEARCH_SECONDS = Histogram(
+    "tourism_vector_search_seconds", "Vector search latency (Qdrant or local index)",
+    LABELS, buckets=_LATENCY_BUCKETS,
+)
+PROMPT_TOKENS = Histogram(
+    "tourism_prompt_tokens", "Tokens in the rendered answer prompt",
+    LABELS, buckets=_TOKEN_BUCKETS,
+)
+COMPLETION_TOKENS = Histogram(
+    "tourism_completion_tokens", "Tokens in the streamed answer",
+    LABELS, buckets=_TOKEN_BUCKETS,
+)
+TIME_TO_FIRST_TOKEN_SECONDS = Histogram(
+    "tourism_time_to_first_token_seconds", "Request start to first streamed token",
+    LABELS, buckets=_LATENCY_BUCKETS + (20.0, 30.0),
+)
+TOKENS_PER_SECOND = Histogram(
+    "tourism_tokens_per_second", "Completion tokens per second after the first token",
+    LABELS, buckets=(5, 10, 20, 40, 60, 80, 120, 160, 240, 400),
+)
+STREAM_SECONDS = Histogram(
+    "tourism_stream_seconds", "Total duration of a streamed answer",
+    LABELS, buckets=_LATENCY_BUCKETS + (20.0, 30.0, 60.0, 120.0),
+)
+ERRORS = Counter(
+    "tourism_errors_total", "Failures on the chat path, by stage",
+    LABELS + ("stage",),
+)
+ABORTED_GENERATIONS = Counter(
+    "tourism_aborted_generations_total", "Answers cancelled because the client disconnected",
+    LABELS,
+)
+COALESCED_REQUESTS = Counter(
+    "tourism_coalesced_requests_total", "Requests that joined an identical in-flight generation",
+    LABELS,
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "tourism_llm_queue_wait_seconds", "Time an admitted request waited for an LLM slot",
+    LABELS, buckets=_LATENCY_BUCKETS,
+)
+# Summed over live workers; the admission limit itself is per worker
+LLM_ACTIVE = Gauge(
+    "tourism_llm_active", "Answers currently generating (admitted requests)", multiprocess_mode="livesum",
+)
+LLM_QUEUE_DEPTH = Gauge(
+    "tourism_llm_queue_depth", "Requests waiting for an LLM slot", multiprocess_mode="livesum",
+)
+ADMISSION_REJECTED = Counter(
+    "tourism_admission_rejected_total", "Requests shed with HTTP 429, by reason",
+    ("reason",),
+)
+
+# (endpoint, language) of the request being served
+request_labels: ContextVar[Tuple[str, str]] = ContextVar("request_labels", default=("none", "none"))
+
+
+def set_request_labels(endpoint: str, language: str) -> None:
+    request_labels.set((endpoint, language or "none"))
+
+
+def observe(histogram: Histogram, value: float) -> None:
+    histogram.labels(*request_labels.get()).observe(value)
+
+
+def count_error(stage: str) -> None:
+    ERRORS.labels(*request_labels.get(), stage).inc()
+
+
+def count_aborted() -> None:
+    ABORTED_GENERATIONS.labels(*request_labels.get()).inc()
+
+
+def count_coalesced() -> None:
+    COALESCED_REQUESTS.labels(*request_labels.get()).inc()
+
+
+@contextmanager
+def timed(histogram: Histogram):
+    """Observe the duration of the with-block in histogram."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(histogram, time.perf_counter() - start)
+
+
+class StreamTimer:
+    """Time-to-first-token, throughput and duration of one streamed answer."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token: Optional[float] = None
+
+    def token(self) -> None:
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+            observe(TIME_TO_FIRST_TOKEN_SECONDS, self.first_token - self.start)
+
+    def finish(self, completion_tokens: int) -> None:
+        end = time.perf_counter()
+        observe(STREAM_SECONDS, end - self.start)
+        observe(COMPLETION_TOKENS, completion_tokens)
+        if self.first_token is not None and completion_tokens > 1 and end > self.first_token:
+            observe(TOKENS_PER_SECOND, (completion_tokens - 1) / (end - self.first_token))
+
+
+# Session counts come from the (possibly shared) store at scrape time, cached
+# because on Redis they cost a keyspace SCAN
+_SESSION_STATS_TTL = 30.0
+_SESSION_GAUGES = {
+    "sessions": ("tourism_sessions", "Chat sessions held by the session store"),
+    "messages": ("tourism_session_messages", "Messages kept across all sessions"),
+    "bytes": ("tourism_session_bytes", "UTF-8 bytes of kept messages and summaries"),
+    "evicted": ("tourism_sessions_evicted", "Sessions evicted (idle or over the cap) by this process"),
+}
+
+
+class _SessionCollector:
+    """tourism_sessions_* gauges from a session store's stats()."""
+
+    def __init__(self, stats: Callable[[], Dict[str, int]]):
+        self._stats = stats
+        self._cached: Tuple[float, Dict[str, int]] = (float("-inf"), {})
+
+    def collect(self):
+        taken, stats = self._cached
+        now = time.monotonic()
+        if now - taken >= _SESSION_STATS_TTL:
+            stats = self._stats()
+            self._cached = (now, stats)
+        for key, (name, documentation) in _SESSION_GAUGES.items():
+            if key in stats:
+                yield GaugeMetricFamily(name, documentation, value=stats[key])
+
+
+_extra = CollectorRegistry(auto_describe=False)
+
+
+def register_session_stats(stats: Callable[[], Dict[str, int]]) -> None:
+    """Report a session store's stats() on /metrics."""
+    _extra.register(_SessionCollector(stats))
+
+
+def _multiprocess() -> bool:
+    return bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def render() -> Tuple[bytes, str]:
+    """Exposition body and content type for GET /metrics (all workers in multiprocess mode)."""
+    if _multiprocess():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry) + generate_latest(_extra), CONTENT_TYPE_LATEST
+
+
+def worker_exited() -> None:
+    """Drop this worker's live gauges from the aggregate on shutdown (multiprocess mode)."""
+    if _multiprocess():
+        multiprocess.mark_process_dead(os.getpid())
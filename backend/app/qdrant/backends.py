@@ -0,0 +1,635 @@
+# app/qdrant/backends.py
+"""
+Vector-store backends used by ingestion and retrieval.
+
+- QdrantBackend: a collection on a Qdrant server (the default), created and
+  searched according to a CollectionProfile (quantization, HNSW and on-disk
+  storage settings), with keyword payload indexes on the filterable
+  metadata fields.
+- LocalBackend: an embedded index for small deployments and tests. Unit-length
+  vectors live in a memory-mapped float32 .npy matrix next to a JSON payload
+  table, and search is one vectorized dot product, with no network hop.
+
+Both store payloads in QdrantVectorStore's layout (page_content + metadata)
+and return LangChain Documents with metadata["_id"] set to the point ID.
+"""
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+from dataclasses import dataclass, fields, replace
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from qdrant_client import AsyncQdrantClient, QdrantClient
+from qdrant_client.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    CollectionParamsDiff,
+    Disabled,
+    Distance,
+    FieldCondition,
+    Filter,
+    FilterSelector,
+    HnswConfigDiff,
+    MatchAny,
+    PayloadSchemaType,
+    PointIdsList,
+    PointStruct,
+    QuantizationSearchParams,
+    QueryRequest,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    VectorParams,
+    VectorParamsDiff,
+)
+from langchain_core.documents import Document
+
+from app.qdrant.metadata import FILTER_FIELDS, matches
+
+logger = logging.getLogger(__name__)
+
+# Points per Qdrant upsert/delete request
+UPSERT_BATCH_SIZE = 256
+
+
+def _to_document(point_id, payload: Optional[Dict], collection: str) -> Document:
+    payload = payload or {}
+    metadata = dict(payload.get("metadata") or {})
+    metadata["_id"] = point_id
+    metadata["_collection_name"] = collection
+    return Document(page_content=payload.get("page_content", ""), metadata=metadata)
+
+
+def _payload(doc: Document) -> Dict:
+    return {"page_content": doc.page_content, "metadata": doc.metadata}
+
+
+# ---- Qdrant collection profiles ----
+_TRUE = ("1", "true", "yes")
+
+
+@dataclass(frozen=True)
+class CollectionProfile:
+    """
+    How a Qdrant collection is stored and searched.
+
+    quantization: "none", "scalar" (int8, 4x smaller) or "binary" (1 bit per
+    dimension, 32x smaller). Quantized vectors stay in RAM and the originals
+    are used to rescore `oversampling` x k candidates; with on_disk_vectors
+    the originals live on disk, which is where the memory saving comes from.
+    hnsw_m / hnsw_ef_construct: graph degree and build beam (None keeps the
+    server default). hnsw_ef / exact: per-query defaults, overridable per call.
+    """
+
+    quantization: str = "none"
+    hnsw_m: Optional[int] = None
+    hnsw_ef_construct: Optional[int] = None
+    on_disk_vectors: bool = False
+    on_disk_payload: bool = False
+    hnsw_ef: Optional[int] = None
+    exact: bool = False
+    rescore: bool = True
+    oversampling: Optional[float] = None
+
+    @classmethod
+    def parse(cls, spec: str) -> "CollectionProfile":
+        """
+        "<preset>[:field=value,...]", e.g. "scalar" or "binary:hnsw_ef=128,oversampling=4".
+        """
+        name, _, overrides = spec.strip().partition(":")
+        name = name.strip().lower() or "default"
+        if name not in PROFILES:
+            raise ValueError(f"Unknown Qdrant profile '{name}' (expected one of {', '.join(PROFILES)})")
+        return PROFILES[name].with_overrides(overrides)
+
+    def with_overrides(self, overrides: str) -> "CollectionProfile":
+        """Apply comma-separated field=value pairs ("" or "none" clears an optional field)."""
+        types = {f.name: f.default for f in fields(self)}
+        changes = {}
+        for pair in overrides.split(","):
+            if not pair.strip():
+                continue
+            key, _, value = pair.partition("=")
+            key, value = key.strip(), value.strip()
+            if key not in types:
+                raise ValueError(f"Unknown Qdrant profile field '{key}'")
+            if key == "quantization":
+                changes[key] = value.lower()
+            elif isinstance(types[key], bool):
+                changes[key] = value.lower() in _TRUE
+            elif value.lower() in ("", "none"):
+                changes[key] = None
+            else:
+                changes[key] = float(value) if key == "oversampling" else int(value)
+        profile = replace(self, **changes)
+        if profile.quantization not in ("none", "scalar", "binary"):
+            raise ValueError(f"Unknown quantization '{profile.quantization}'")
+        return profile
+
+    def hnsw_config(self) -> Optional[HnswConfigDiff]:
+        if self.hnsw_m is None and self.hnsw_ef_construct is None:
+            return None
+        return HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct)
+
+    def quantization_config(self):
+        if self.quantization == "scalar":
+            return ScalarQuantization(
+                scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+        if self.quantization == "binary":
+            return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+        return None
+
+    def search_params(self, hnsw_ef: Optional[int] = None, exact: Optional[bool] = None) -> Optional[SearchParams]:
+        """Per-query parameters; arguments override the profile defaults."""
+        ef = self.hnsw_ef if hnsw_ef is None else hnsw_ef
+        exact = self.exact if exact is None else exact
+        quantization = None
+        if self.quantization != "none":
+            # Exact search bypasses the quantized vectors altogether
+            quantization = QuantizationSearchParams(
+                ignore=exact, rescore=self.rescore, oversampling=self.oversampling
+            )
+        if ef is None and not exact and quantization is None:
+            return None
+        return SearchParams(hnsw_ef=ef, exact=exact, quantization=quantization)
+
+    def estimated_ram_bytes(self, points: int, size: int) -> Dict[str, int]:
+        """Rough resident memory of vectors, quantized vectors and the HNSW graph."""
+        m = self.hnsw_m or 16
+        quantized = {"scalar": size, "binary": (size + 7) // 8}.get(self.quantization, 0)
+        return {
+            "vectors": 0 if self.on_disk_vectors else points * size * 4,
+            "quantized": points * quantized,
+            # level 0 holds 2*m links per point, upper levels add a few percent
+            "hnsw": int(points * 2 * m * 4 * 1.1),
+        }
+
+
+PROFILES: Dict[str, CollectionProfile] = {
+    # Full-precision vectors in RAM (Qdrant's defaults)
+    "default": CollectionProfile(),
+    # int8 vectors in RAM, float32 originals on disk for rescoring
+    "scalar": CollectionProfile(quantization="scalar", on_disk_vectors=True, oversampling=2.0),
+    # 1-bit vectors in RAM; needs more oversampling to keep recall up
+    "binary": CollectionProfile(quantization="binary", on_disk_vectors=True, oversampling=3.0),
+}
+
+
+# ---- Qdrant server ----
+def qdrant_filter(filters: Optional[Dict[str, List[str]]]) -> Optional[Filter]:
+    """Normalized metadata filters (see app/qdrant/metadata.py) as a Qdrant Filter."""
+    if not filters:
+        return None
+    return Filter(must=[
+        FieldCondition(key=f"metadata.{field}", match=MatchAny(any=values))
+        for field, values in filters.items()
+    ])
+
+
+def ensure_payload_indexes(client: QdrantClient, name: str) -> None:
+    """Keyword indexes on the filterable metadata fields (a no-op when present)."""
+    existing = set((client.get_collection(name).payload_schema or {}).keys())
+    for field in FILTER_FIELDS:
+        key = f"metadata.{field}"
+        if key not in existing:
+            client.create_payload_index(
+                collection_name=name, field_name=key, field_schema=PayloadSchemaType.KEYWORD,
+            )
+
+
+def _current_quantization(info) -> str:
+    config = info.config.quantization_config
+    if config is None:
+        return "none"
+    if getattr(config, "scalar", None) is not None:
+        return "scalar"
+    if getattr(config, "binary", None) is not None:
+        return "binary"
+    return "other"
+
+
+def _apply_profile(client: QdrantClient, name: str, info, profile: CollectionProfile) -> None:
+    """Bring an existing collection's storage settings in line with the profile (no re-ingest)."""
+    hnsw = info.config.hnsw_config
+    vectors = info.config.params.vectors
+    changes = {}
+    if _current_quantization(info) != profile.quantization:
+        changes["quantization_config"] = profile.quantization_config() or Disabled.DISABLED
+    if ((profile.hnsw_m is not None and hnsw.m != profile.hnsw_m)
+            or (profile.hnsw_ef_construct is not None and hnsw.ef_construct != profile.hnsw_ef_construct)):
+        changes["hnsw_config"] = profile.hnsw_config()
+    if bool(getattr(vectors, "on_disk", False)) != profile.on_disk_vectors:
+        changes["vectors_config"] = {"": VectorParamsDiff(on_disk=profile.on_disk_vectors)}
+    if bool(info.config.params.on_disk_payload) != profile.on_disk_payload:
+        changes["collection_params"] = CollectionParamsDiff(on_disk_payload=profile.on_disk_payload)
+    if not changes:
+        return
+    logger.info("Updating collection '%s' to match profile: %s", name, ", ".join(sorted(changes)))
+    try:
+        client.update_collection(collection_name=name, **changes)
+    except Exception as e:
+        logger.warning("Could not update collection '%s' to the configured profile: %s", name, e)
+
+
+def ensure_collection(client: QdrantClient, name: str, size: int,
+                      profile: Optional[CollectionProfile] = None, recreate: bool = False) -> None:
+    """
+    Create the collection with the profile's storage settings if it doesn't
+    exist, has a different vector size, or recreate is set; otherwise update
+    it to match the profile. Payload indexes are created either way.
+    """
+    profile = profile or PROFILES["default"]
+    try:
+        info = client.get_collection(name)
+    except Exception:
+        info = None
+    if info is not None and not recreate:
+        existing = getattr(info.config.params.vectors, "size", size)
+        if existing != size:
+            # Same policy as LocalBackend: vectors of another size are useless,
+            # and the ingest manifest (keyed on the dimension) re-embeds everything
+            logger.warning("Collection '%s' holds %d-dimensional vectors, expected %d; recreating it",
+                           name, existing, size)
+            recreate = True
+    if info is not None and recreate:
+        client.delete_collection(name)
+        info = None
+    if info is not None:
+        _apply_profile(client, name, info, profile)
+    else:
+        logger.info("Creating collection '%s' (size=%d, distance=COSINE, %s)", name, size, profile)
+        client.create_collection(
+            collection_name=name,
+            vectors_config=VectorParams(size=size, distance=Distance.COSINE, on_disk=profile.on_disk_vectors),
+            hnsw_config=profile.hnsw_config(),
+            quantization_config=profile.quantization_config(),
+            on_disk_payload=profile.on_disk_payload,
+        )
+    ensure_payload_indexes(client, name)
+
+
+class QdrantBackend:
+    """A Qdrant collection, with an optional async client for the request path."""
+
+    def __init__(self, client: QdrantClient, collection: str,
+                 async_client: Optional[AsyncQdrantClient] = None,
+                 profile: Optional[CollectionProfile] = None):
+        self.client = client
+        self.collection = collection
+        self.async_client = async_client
+        self.profile = profile or PROFILES["default"]
+        self.name = collection
+
+    def ensure(self, size: int) -> None:
+        ensure_collection(self.client, self.collection, size, self.profile)
+
+    def count(self) -> int:
+        return self.client.count(collection_name=self.collection, exact=True).count
+
+    def clear(self) -> None:
+        self.client.delete(
+            collection_name=self.collection,
+            points_selector=FilterSelector(filter=Filter()),
+        )
+
+    def delete(self, ids: List[str]) -> None:
+        for i in range(0, len(ids), UPSERT_BATCH_SIZE):
+            self.client.delete(
+                collection_name=self.collection,
+                points_selector=PointIdsList(points=ids[i:i + UPSERT_BATCH_SIZE]),
+            )
+
+    def upsert(self, docs: List[Document], ids: List[str], vectors: List[List[float]]) -> None:
+        for i in range(0, len(docs), UPSERT_BATCH_SIZE):
+            self.client.upsert(
+                collection_name=self.collection,
+                points=[
+                    PointStruct(id=point_id, vector=vector, payload=_payload(doc))
+                    for doc, point_id, vector in zip(
+                        docs[i:i + UPSERT_BATCH_SIZE],
+                        ids[i:i + UPSERT_BATCH_SIZE],
+                        vectors[i:i + UPSERT_BATCH_SIZE],
+                    )
+                ],
+            )
+
+    def flush(self) -> None:
+        """Qdrant persists on every request; nothing to do."""
+
+    def iter_documents(self) -> Iterator[Tuple[str, Document]]:
+        """Scroll every stored chunk (payload only, no vectors)."""
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection,
+                limit=512,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+            for point in points:
+                yield str(point.id), _to_document(point.id, point.payload, self.collection)
+            if offset is None:
+                return
+
+    def _query(self, vector: List[float], k: int, hnsw_ef: Optional[int], exact: Optional[bool],
+               filters: Optional[Dict[str, List[str]]], with_vectors: bool = False) -> Dict:
+        return dict(
+            collection_name=self.collection,
+            query=vector,
+            query_filter=qdrant_filter(filters),
+            limit=k,
+            search_params=self.profile.search_params(hnsw_ef, exact),
+            with_payload=True,
+            with_vectors=with_vectors,
+        )
+
+    def _documents(self, points) -> List[Document]:
+        return [_to_document(p.id, p.payload, self.collection) for p in points]
+
+    def search(self, vector: List[float], k: int, hnsw_ef: Optional[int] = None,
+               exact: Optional[bool] = None, filters: Optional[Dict[str, List[str]]] = None) -> List[Document]:
+        response = self.client.query_points(**self._query(vector, k, hnsw_ef, exact, filters))
+        return self._documents(response.points)
+
+    async def asearch(self, vector: List[float], k: int, hnsw_ef: Optional[int] = None,
+                      exact: Optional[bool] = None, filters: Optional[Dict[str, List[str]]] = None) -> List[Document]:
+        # An in-process Qdrant (":memory:"/path) cannot be shared with an async
+        # client, so fall back to a worker thread there.
+        if self.async_client is None:
+            return await asyncio.to_thread(self.search, vector, k, hnsw_ef, exact, filters)
+        response = await self.async_client.query_points(**self._query(vector, k, hnsw_ef, exact, filters))
+        return self._documents(response.points)
+
+    def search_candidates(self, vector: List[float], k: int, hnsw_ef: Optional[int] = None,
+                          exact: Optional[bool] = None, filters: Optional[Dict[str, List[str]]] = None
+                          ) -> Tuple[List[Document], np.ndarray]:
+        """search() plus the stored vectors of the hits, row-aligned, for local re-ranking."""
+        response = self.client.query_points(**self._query(vector, k, hnsw_ef, exact, filters, True))
+        return self._documents(response.points), _matrix(response.points)
+
+    async def asearch_candidates(self, vector: List[float], k: int, hnsw_ef: Optional[int] = None,
+                                 exact: Optional[bool] = None, filters: Optional[Dict[str, List[str]]] = None
+                                 ) -> Tuple[List[Document], np.ndarray]:
+        if self.async_client is None:
+            return await asyncio.to_thread(self.search_candidates, vector, k, hnsw_ef, exact, filters)
+        response = await self.async_client.query_points(**self._query(vector, k, hnsw_ef, exact, filters, True))
+        return self._documents(response.points), _matrix(response.points)
+
+    def _batch(self, vectors: List[List[float]], k: int, hnsw_ef: Optional[int], exact: Optional[bool],
+               filters: Optional[Dict[str, List[str]]], with_vectors: bool) -> List[QueryRequest]:
+        query_filter = qdrant_filter(filters)
+        params = self.profile.search_params(hnsw_ef, exact)
+        return [
+            QueryRequest(query=vector, filter=query_filter, limit=k, params=params,
+                         with_payload=True, with_vector=with_vectors)
+            for vector in vectors
+        ]
+
+    def _batch_results(self, responses, with_vectors: bool) -> List[Tuple[List[Document], Optional[np.ndarray]]]:
+        return [
+            (self._documents(r.points), _matrix(r.points) if with_vectors else None)
+            for r in responses
+        ]
+
+    def search_batch(self, vectors: List[List[float]], k: int, hnsw_ef: Optional[int] = None,
+                     exact: Optional[bool] = None, filters: Optional[Dict[str, List[str]]] = None,
+                     with_vectors: bool = False) -> List[Tuple[List[Document], Optional[np.ndarray]]]:
+        """
+        One search per query vector in a single request (query_batch_points);
+        per query the hits and, with with_vectors, their stored vectors.
+        """
+        responses = self.client.query_batch_points(
+            collection_name=self.collection,
+            requests=self._batch(vectors, k, hnsw_ef, exact, filters, with_vectors),
+        )
+        return self._batch_results(responses, with_vectors)
+
+    async def asearch_batch(self, vectors: List[List[float]], k: int, hnsw_ef: Optional[int] = None,
+                            exact: Optional[bool] = None, filters: Optional[Dict[str, List[str]]] = None,
+                            with_vectors: bool = False) -> List[Tuple[List[Document], Optional[np.ndarray]]]:
+        if self.async_client is None:
+            return await asyncio.to_thread(self.search_batch, vectors, k, hnsw_ef, exact, filters, with_vectors)
+        responses = await self.async_client.query_batch_points(
+            collection_name=self.collection,
+            requests=self._batch(vectors, k, hnsw_ef, exact, filters, with_vectors),
+        )
+        return self._batch_results(responses, with_vectors)
+
+    def fetch_vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """Stored vectors of the given points (e.g. BM25-only hits), by point ID."""
+        points = self.client.retrieve(
+            collection_name=self.collection, ids=ids, with_payload=False, with_vectors=True,
+        )
+        return {str(p.id): row for p, row in zip(points, _matrix(points))}
+
+    async def afetch_vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        if self.async_client is None:
+            return await asyncio.to_thread(self.fetch_vectors, ids)
+        points = await self.async_client.retrieve(
+            collection_name=self.collection, ids=ids, with_payload=False, with_vectors=True,
+        )
+        return {str(p.id): row for p, row in zip(points, _matrix(points))}
+
+
+def _matrix(points) -> np.ndarray:
+    """float32 matrix of the points' (unnamed) vectors."""
+    return np.asarray([p.vector for p in points], dtype=np.float32).reshape(len(points), -1)
+
+
+# ---- Embedded NumPy index ----
+class LocalBackend:
+    """
+    Embedded exact-search index persisted as <dir>/vectors.npy (float32, one
+    unit-length row per chunk, opened with mmap) and <dir>/payloads.json
+    (row-aligned point IDs and payloads). Writes are buffered in memory and
+    written atomically by flush().
+    """
+
+    def __init__(self, directory: str, collection: str):
+        self.directory = Path(directory)
+        self.collection = collection
+        self.name = f"local:{collection}"
+        self.size = 0
+        self._ids: List[str] = []
+        self._payloads: List[Dict] = []
+        self._rows: Dict[str, int] = {}
+        self._vectors: Optional[np.ndarray] = None
+        self._dirty = False
+        self._load()
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.directory / "vectors.npy"
+
+    @property
+    def _payloads_path(self) -> Path:
+        return self.directory / "payloads.json"
+
+    def _load(self) -> None:
+        try:
+            with open(self._payloads_path, "r", encoding="utf-8") as f:
+                table = json.load(f)
+            vectors = np.load(self._vectors_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return
+        if len(table.get("ids", [])) != vectors.shape[0]:
+            logger.warning("Local index in %s is inconsistent; starting empty", self.directory)
+            return
+        self._ids = table["ids"]
+        self._payloads = table["payloads"]
+        self._rows = {point_id: row for row, point_id in enumerate(self._ids)}
+        self._vectors = vectors
+        self.size = vectors.shape[1]
+
+    def ensure(self, size: int) -> None:
+        if self._vectors is not None and self.size != size:
+            logger.info("Local index dimension %d != %d; starting empty", self.size, size)
+            self.clear()
+        self.size = size
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def clear(self) -> None:
+        self._ids, self._payloads, self._rows = [], [], {}
+        self._vectors = None
+        self._dirty = True
+
+    def _writable(self) -> np.ndarray:
+        # Copy the read-only mmap into memory before the first modification
+        if self._vectors is None:
+            self._vectors = np.empty((0, self.size), dtype=np.float32)
+        elif not self._vectors.flags.writeable:
+            self._vectors = np.array(self._vectors)
+        return self._vectors
+
+    def delete(self, ids: List[str]) -> None:
+        drop = {self._rows[i] for i in ids if i in self._rows}
+        if not drop:
+            return
+        keep = [row for row in range(len(self._ids)) if row not in drop]
+        self._vectors = self._writable()[keep]
+        self._ids = [self._ids[row] for row in keep]
+        self._payloads = [self._payloads[row] for row in keep]
+        self._rows = {point_id: row for row, point_id in enumerate(self._ids)}
+        self._dirty = True
+
+    def upsert(self, docs: List[Document], ids: List[str], vectors: List[List[float]]) -> None:
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+
+        current = self._writable()
+        appended = []
+        for doc, point_id, row_vector in zip(docs, ids, matrix):
+            row = self._rows.get(point_id)
+            if row is None:
+                self._rows[point_id] = len(self._ids)
+                self._ids.append(point_id)
+                self._payloads.append(_payload(doc))
+                appended.append(row_vector)
+            else:
+                current[row] = row_vector
+                self._payloads[row] = _payload(doc)
+        if appended:
+            self._vectors = np.vstack([current, np.stack(appended)])
+        self._dirty = True
+
+    def flush(self) -> None:
+        """Atomically persist vectors and payloads, then reopen the matrix as mmap."""
+        if not self._dirty:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        vectors = self._writable()
+        tmp_vectors = self.directory / "vectors.tmp.npy"
+        tmp_payloads = self.directory / "payloads.json.tmp"
+        np.save(tmp_vectors, vectors)
+        with open(tmp_payloads, "w", encoding="utf-8") as f:
+            json.dump({"ids": self._ids, "payloads": self._payloads}, f)
+        os.replace(tmp_vectors, self._vectors_path)
+        os.replace(tmp_payloads, self._payloads_path)
+        self._vectors = np.load(self._vectors_path, mmap_mode="r")
+        self._dirty = False
+
+    def iter_documents(self) -> Iterator[Tuple[str, Document]]:
+        for point_id, payload in zip(self._ids, self._payloads):
+            yield point_id, _to_document(point_id, payload, self.collection)
+
+    def _top_rows(self, vector: List[float], k: int, filters: Optional[Dict[str, List[str]]]) -> np.ndarray:
+        """Row numbers of the k best matches, best first (always exact)."""
+        if self._vectors is None or not self._ids or k <= 0:
+            return np.empty(0, dtype=np.int64)
+        query = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(query))
+        query = query / norm if norm else query
+        if filters:
+            rows = np.fromiter(
+                (row for row, payload in enumerate(self._payloads)
+                 if matches(payload.get("metadata") or {}, filters)),
+                dtype=np.int64,
+            )
+            if not len(rows):
+                return rows
+            scores = self._vectors[rows] @ query
+        else:
+            rows = None
+            scores = self._vectors @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return top if rows is None else rows[top]
+
+    def _documents(self, rows: np.ndarray) -> List[Document]:
+        return [_to_document(self._ids[row], self._payloads[row], self.collection) for row in rows]
+
+    def search(self, vector: List[float], k: int, hnsw_ef: Optional[int] = None,
+               exact: Optional[bool] = None, filters: Optional[Dict[str, List[str]]] = None) -> List[Document]:
+        # Always exact; hnsw_ef/exact are accepted for interface parity
+        return self._documents(self._top_rows(vector, k, filters))
+
+    async def asearch(self, vector: List[float], k: int, hnsw_ef: Optional[int] = None,
+                      exact: Optional[bool] = None, filters: Optional[Dict[str, List[str]]] = None) -> List[Document]:
+        # A dot product over a small matrix is cheaper than a thread hop
+        return self.search(vector, k, filters=filters)
+
+    def search_candidates(self, vector: List[float], k: int, hnsw_ef: Optional[int] = None,
+                          exact: Optional[bool] = None, filters: Optional[Dict[str, List[str]]] = None
+                          ) -> Tuple[List[Document], np.ndarray]:
+        rows = self._top_rows(vector, k, filters)
+        if not len(rows):
+            return [], np.empty((0, self.size), dtype=np.float32)
+        return self._documents(rows), np.asarray(self._vectors[rows])
+
+    async def asearch_candidates(self, vector: List[float], k: int, hnsw_ef: Optional[int] = None,
+                                 exact: Optional[bool] = None, filters: Optional[Dict[str, List[str]]] = None
+                                 ) -> Tuple[List[Document], np.ndarray]:
+        return self.search_candidates(vector, k, filters=filters)
+
+    def search_batch(self, vectors: List[List[float]], k: int, hnsw_ef: Optional[int] = None,
+                     exact: Optional[bool] = None, filters: Optional[Dict[str, List[str]]] = None,
+                     with_vectors: bool = False) -> List[Tuple[List[Document], Optional[np.ndarray]]]:
+        results = []
+        for vector in vectors:
+            rows = self._top_rows(vector, k, filters)
+            matrix = None
+            if with_vectors:
+                matrix = np.asarray(self._vectors[rows]) if len(rows) else np.empty((0, self.size), dtype=np.float32)
+            results.append((self._documents(rows), matrix))
+        return results
+
+    async def asearch_batch(self, vectors: List[List[float]], k: int, hnsw_ef: Optional[int] = None,
+                            exact: Optional[bool] = None, filters: Optional[Dict[str, List[str]]] = None,
+                            with_vectors: bool = False) -> List[Tuple[List[Document], Optional[np.ndarray]]]:
+        return self.search_batch(vectors, k, filters=filters, with_vectors=with_vectors)
+
+    def fetch_vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        return {i: np.asarray(self._vectors[self._rows[i]]) for i in ids if i in self._rows}
+
+    async def afetch_vectors(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        return self.fetch_vectors(ids)
@@ -0,0 +1,99 @@
+# app/qdrant/bm25.py
+"""
+In-process BM25 index over the ingested chunks, plus reciprocal rank fusion.
+
+Dense search is good at paraphrases but often misses exact names (festivals,
+towns, train operators). A BM25 lookup catches those in microseconds without
+an embedding call; the two rankings are merged with reciprocal rank fusion.
+"""
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, strip accents and split on word characters."""
+    folded = unicodedata.normalize("NFKD", text.lower())
+    folded = "".join(ch for ch in folded if not unicodedata.combining(ch))
+    return _TOKEN_RE.findall(folded)
+
+
+class BM25Index:
+    """Okapi BM25 over Documents keyed by their Qdrant point ID."""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.ids: List[Hashable] = []
+        self.docs: List[Document] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.total_length = 0
+        self.avg_length = 0.0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, point_id: Hashable, doc: Document) -> None:
+        index = len(self.ids)
+        terms = Counter(tokenize(doc.page_content))
+        self.ids.append(point_id)
+        self.docs.append(doc)
+        self.lengths.append(sum(terms.values()))
+        for term, tf in terms.items():
+            self.postings[term][index] = tf
+        self.total_length += self.lengths[-1]
+        self.avg_length = self.total_length / len(self.lengths)
+
+    @classmethod
+    def from_documents(cls, items: Iterable[Tuple[Hashable, Document]]) -> "BM25Index":
+        index = cls()
+        for point_id, doc in items:
+            index.add(point_id, doc)
+        return index
+
+    def search(self, query: str, k: int,
+               where: Optional[Callable[[Document], bool]] = None) -> List[Tuple[Document, float]]:
+        """
+        Top-k (document, score) pairs; documents sharing no term, or rejected
+        by `where`, are skipped.
+        """
+        if not self.ids:
+            return []
+        n = len(self.ids)
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for index, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[index] / self.avg_length)
+                scores[index] += idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        if where is not None:
+            ranked = (item for item in ranked if where(self.docs[item[0]]))
+        best = []
+        for i, score in ranked:
+            if len(best) >= k:
+                break
+            best.append((self.docs[i], score))
+        return best
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int = 60) -> List[Hashable]:
+    """
+    Merge several rankings of IDs: score(id) = sum(1 / (k + rank)).
+    Items found by more than one retriever rise to the top.
+    """
+    scores: Dict[Hashable, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] += 1.0 / (k + rank)
+    return sorted(scores, key=lambda item: scores[item], reverse=True)
@@ -0,0 +1,119 @@
+# app/qdrant/context.py
+"""
+Context assembly between retrieval and the LLM.
+
+Retrieved chunks overlap (CHUNK_OVERLAP characters) and neighbouring hits from
+the same file repeat that text in the prompt. pack_context():
+1. merges chunks that are adjacent by metadata["chunk"] in the same file,
+   removing the overlapping text,
+2. drops near-duplicate passages (e.g. the same paragraph in two files),
+3. orders passages by relevance (best retrieval rank of their chunks),
+4. stops, or truncates the last passage, at the token budget.
+"""
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from langchain_core.documents import Document
+
+from app.qdrant.bm25 import tokenize
+from app.qdrant.embedding_executor import count_tokens, truncate_tokens
+
+# Shingle size and Jaccard similarity above which a passage counts as a duplicate
+_SHINGLE = 3
+_DUPLICATE_SIMILARITY = 0.8
+# A truncated passage shorter than this is not worth including
+_MIN_PASSAGE_TOKENS = 40
+
+
+class _Passage:
+    __slots__ = ("source", "first", "last", "text", "rank")
+
+    def __init__(self, source: str, chunk: Optional[int], text: str, rank: int):
+        self.source = source
+        self.first = self.last = chunk
+        self.text = text
+        self.rank = rank
+
+
+def _join_overlapping(left: str, right: str, max_overlap: int) -> str:
+    """Concatenate two consecutive chunks, keeping their shared text once."""
+    for size in range(min(len(left), len(right), max_overlap), 0, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return f"{left}\n{right}"
+
+
+def _merge_adjacent(docs: Sequence[Document], max_overlap: int) -> List[_Passage]:
+    """Group hits per source and merge runs of consecutive chunk indexes."""
+    by_source: Dict[str, List[_Passage]] = {}
+    for rank, doc in enumerate(docs):
+        source = doc.metadata.get("path") or doc.metadata.get("source") or "unknown"
+        chunk = doc.metadata.get("chunk")
+        by_source.setdefault(source, []).append(
+            _Passage(source, chunk if isinstance(chunk, int) else None, doc.page_content, rank)
+        )
+
+    passages: List[_Passage] = []
+    for group in by_source.values():
+        indexed = sorted((p for p in group if p.first is not None), key=lambda p: p.first)
+        passages.extend(p for p in group if p.first is None)
+        current: Optional[_Passage] = None
+        for passage in indexed:
+            if current is not None and passage.first <= current.last + 1:
+                if passage.first == current.last + 1:
+                    current.text = _join_overlapping(current.text, passage.text, max_overlap)
+                current.last = max(current.last, passage.last)
+                current.rank = min(current.rank, passage.rank)
+            else:
+                current = passage
+                passages.append(current)
+    return passages
+
+
+def _shingles(text: str) -> Set[Tuple[str, ...]]:
+    words = tokenize(text)
+    if len(words) < _SHINGLE:
+        return {tuple(words)}
+    return {tuple(words[i:i + _SHINGLE]) for i in range(len(words) - _SHINGLE + 1)}
+
+
+def _drop_near_duplicates(passages: List[_Passage]) -> List[_Passage]:
+    """Keep the best-ranked passage of each near-duplicate group (passages sorted by rank)."""
+    kept: List[_Passage] = []
+    kept_shingles: List[Set[Tuple[str, ...]]] = []
+    for passage in passages:
+        shingles = _shingles(passage.text)
+        duplicate = any(
+            len(shingles & other) / max(1, len(shingles | other)) >= _DUPLICATE_SIMILARITY
+            for other in kept_shingles
+        )
+        if not duplicate:
+            kept.append(passage)
+            kept_shingles.append(shingles)
+    return kept
+
+
+def pack_context(docs: Sequence[Document], token_budget: int = 0,
+                 max_overlap: int = 300) -> Tuple[str, Dict[str, int]]:
+    """
+    Turn retrieved docs (best first) into the context string for the prompt.
+    token_budget <= 0 disables trimming. Returns (context, stats) where stats
+    counts chunks in, passages out and context tokens.
+    """
+    passages = sorted(_merge_adjacent(docs, max_overlap), key=lambda p: p.rank)
+    passages = _drop_near_duplicates(passages)
+
+    parts: List[str] = []
+    used = 0
+    for passage in passages:
+        block = f"[Source: {passage.source}]\n{passage.text}"
+        tokens = count_tokens(block)
+        if token_budget > 0 and used + tokens > token_budget:
+            remaining = token_budget - used
+            if remaining >= _MIN_PASSAGE_TOKENS:
+                parts.append(truncate_tokens(block, remaining))
+                used = token_budget
+            break
+        parts.append(block)
+        used += tokens
+
+    return "\n".join(parts), {"chunks": len(docs), "passages": len(parts), "tokens": used}
@@ -0,0 +1,75 @@
+# app/qdrant/diversity.py
+"""
+Diversity re-ranking of retrieved chunks.
+
+Overlapping chunks of the same itinerary file score almost identically, so a
+plain top_k often spends the whole context window on one passage. Retrieval
+can instead over-fetch a candidate pool and pick top_k from it here:
+
+  mmr         maximal marginal relevance: repeatedly take the candidate that
+              maximizes  lambda * sim(query, c) - (1 - lambda) * max sim(c, picked).
+              Works on the candidates' stored vectors (returned by the vector
+              search), so nothing is embedded again.
+  source_cap  keep the pool's order but take at most max_per_source chunks
+              per file, filling up from the skipped ones if the pool runs out.
+"""
+from typing import List, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+DIVERSITY_MODES = ("off", "mmr", "source_cap")
+
+
+def source_of(doc: Document) -> str:
+    """The file a chunk came from (the same key pack_context groups by)."""
+    return doc.metadata.get("path") or doc.metadata.get("source") or "unknown"
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def mmr(query_vector: Sequence[float], candidates: np.ndarray, k: int,
+        lambda_mult: float = 0.7) -> List[int]:
+    """
+    Indexes of k candidate rows in maximal-marginal-relevance order.
+    lambda_mult = 1 is plain similarity ranking, 0 maximal diversity.
+    """
+    if k <= 0 or not len(candidates):
+        return []
+    rows = _unit_rows(candidates)
+    relevance = rows @ _unit_rows(np.asarray(query_vector))
+    k = min(k, len(rows))
+    picked = [int(np.argmax(relevance))]
+    # Highest similarity of every candidate to anything picked so far
+    redundancy = rows @ rows[picked[0]]
+    available = np.ones(len(rows), dtype=bool)
+    available[picked[0]] = False
+    while len(picked) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        np.maximum(redundancy, rows @ rows[best], out=redundancy)
+    return picked
+
+
+def cap_per_source(docs: Sequence[Document], k: int, max_per_source: int = 1) -> List[Document]:
+    """The first k docs taking at most max_per_source per file, then the skipped ones in order."""
+    kept: List[Document] = []
+    skipped: List[Document] = []
+    per_source = {}
+    for doc in docs:
+        source = source_of(doc)
+        if per_source.get(source, 0) < max_per_source:
+            per_source[source] = per_source.get(source, 0) + 1
+            kept.append(doc)
+            if len(kept) == k:
+                return kept
+        else:
+            skipped.append(doc)
+    return kept + skipped[:k - len(kept)]
@@ -0,0 +1,230 @@
+# app/qdrant/embedding_cache.py
+"""
+Two-tier cache in front of an embedding model.
+
+Vectors are keyed by (deployment, dimension, normalized text hash). Lookups go
+to a bounded in-memory LRU first, then to an on-disk SQLite store, and only
+the remaining misses are sent to the wrapped model in a single batch. Vectors
+from the model are checked against the configured dimension before they are
+cached, so a mismatched deployment fails loudly instead of poisoning the cache.
+The async methods read and write the SQLite tier on a worker thread; only the
+memory LRU is touched on the event loop.
+"""
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+# SQLite caps the number of bound parameters per statement
+_SQLITE_BATCH = 500
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalize and collapse whitespace so trivial variants share a key."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper with a memory LRU and a persistent SQLite tier."""
+
+    def __init__(
+        self,
+        inner: Embeddings,
+        deployment: Optional[str],
+        dimension: int,
+        path: Optional[str] = None,
+        max_memory_items: int = 4096,
+    ):
+        self.inner = inner
+        self.dimension = dimension
+        self.namespace = f"{deployment or ''}:{dimension}"
+        self.max_memory_items = max_memory_items
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()  # memory tier and counters
+        self._db_lock = threading.Lock()  # SQLite tier, used from worker threads
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._db.commit()
+
+    # ---- Keys & tiers ----
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+        return f"{self.namespace}:{digest}"
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _from_memory(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                    self.hits_memory += 1
+        return found
+
+    def _from_disk(self, keys: List[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        if self._db is None or not keys:
+            return found
+        with self._db_lock:
+            for i in range(0, len(keys), _SQLITE_BATCH):
+                batch = keys[i:i + _SQLITE_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+        with self._lock:
+            for key, vector in found.items():
+                self._remember(key, vector)
+            self.hits_disk += len(found)
+        return found
+
+    def _checked(self, vectors: List[List[float]]) -> List[List[float]]:
+        for vector in vectors:
+            if len(vector) != self.dimension:
+                raise ValueError(
+                    f"Embedding model returned {len(vector)}-dimensional vectors, "
+                    f"expected {self.dimension} (EMBEDDING_DIMENSION)"
+                )
+        return vectors
+
+    def _store(self, items: Dict[str, List[float]]) -> None:
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+
+    def _persist(self, items: Dict[str, List[float]]) -> None:
+        if self._db is None or not items:
+            return
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(k, array("f", v).tobytes()) for k, v in items.items()],
+            )
+            self._db.commit()
+
+    # ---- Embeddings interface ----
+    def _missing(self, keys: List[str], texts: List[str], found: Dict[str, List[float]]) -> Dict[str, str]:
+        """Distinct missing key -> text, counted as misses."""
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            with self._lock:
+                self.misses += len(missing)
+        return missing
+
+    def _split_misses(self, texts: List[str]):
+        """Return (keys, vectors found so far, distinct missing key -> text)."""
+        keys = [self._key(t) for t in texts]
+        distinct = list(dict.fromkeys(keys))
+        found = self._from_memory(distinct)
+        found.update(self._from_disk([k for k in distinct if k not in found]))
+        return keys, found, self._missing(keys, texts, found)
+
+    async def _asplit_misses(self, texts: List[str]):
+        """_split_misses with the SQLite tier read off the event loop."""
+        keys = [self._key(t) for t in texts]
+        distinct = list(dict.fromkeys(keys))
+        found = self._from_memory(distinct)
+        pending = [k for k in distinct if k not in found]
+        if self._db is not None and pending:
+            found.update(await asyncio.to_thread(self._from_disk, pending))
+        return keys, found, self._missing(keys, texts, found)
+
+    def lookup(self, texts: List[str]) -> Tuple[List[str], Dict[str, List[float]], Dict[str, str]]:
+        """
+        Keys of texts, the vectors already cached and the distinct missing
+        key -> text, for callers that embed the misses themselves (see add()).
+        """
+        return self._split_misses(texts)
+
+    def add(self, items: Dict[str, List[float]]) -> None:
+        """Cache vectors for keys returned by lookup()."""
+        self._checked(list(items.values()))
+        self._store(items)
+        self._persist(items)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = self._split_misses(texts)
+        # Embed each distinct missing text once, in one upstream batch
+        if missing:
+            vectors = self._checked(self.inner.embed_documents(list(missing.values())))
+            fresh = dict(zip(missing.keys(), vectors))
+            self._store(fresh)
+            self._persist(fresh)
+            found.update(fresh)
+        return [found[k] for k in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        keys, found, missing = self._split_misses([text])
+        if missing:
+            found[keys[0]] = self._checked([self.inner.embed_query(text)])[0]
+            self._store({keys[0]: found[keys[0]]})
+            self._persist({keys[0]: found[keys[0]]})
+        return found[keys[0]]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, found, missing = await self._asplit_misses(texts)
+        if missing:
+            vectors = self._checked(await self.inner.aembed_documents(list(missing.values())))
+            fresh = dict(zip(missing.keys(), vectors))
+            self._store(fresh)
+            if self._db is not None:
+                await asyncio.to_thread(self._persist, fresh)
+            found.update(fresh)
+        return [found[k] for k in keys]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        keys, found, missing = await self._asplit_misses([text])
+        if missing:
+            found[keys[0]] = self._checked([await self.inner.aembed_query(text)])[0]
+            fresh = {keys[0]: found[keys[0]]}
+            self._store(fresh)
+            if self._db is not None:
+                await asyncio.to_thread(self._persist, fresh)
+        return found[keys[0]]
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and tier sizes, for logs and monitoring."""
+        disk_items = 0
+        if self._db is not None:
+            with self._db_lock:
+                disk_items = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        with self._lock:
+            return {
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "memory_items": len(self._memory),
+                "disk_items": disk_items,
+            }
@@ -0,0 +1,227 @@
+# app/qdrant/embedding_executor.py
+"""
+Parallel, rate-limit-aware batch embedding for ingestion.
+
+Texts are split into fixed-size batches that run on a bounded thread pool.
+Each batch first reserves its tiktoken count from a tokens-per-minute bucket,
+and 429 / transient failures are retried with exponential backoff that
+honours the server's Retry-After header. When the embeddings are a
+CachedEmbeddings, cache hits are resolved first and only the misses are
+batched, sent to the wrapped model and charged to the bucket.
+"""
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from app.qdrant.embedding_cache import CachedEmbeddings
+
+from app.config.settings import (
+    EMBED_BATCH_SIZE,
+    EMBED_MAX_IN_FLIGHT,
+    EMBED_TOKENS_PER_MINUTE,
+    EMBED_MAX_RETRIES,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    # Loaded on first use: tiktoken may fetch the BPE file, which must not
+    # happen at import time.
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")  # text-embedding-3-* / ada-002
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """tiktoken count, or a ~4 chars/token estimate if the encoding is unavailable."""
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """The longest prefix of text within max_tokens tokens."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    return text[:max_tokens * 4]
+
+
+class TokenBucket:
+    """Token-per-minute budget shared by all in-flight batches."""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> None:
+        # A single batch larger than the whole budget waits for a full bucket
+        tokens = min(float(tokens), self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.available >= tokens:
+                    self.available -= tokens
+                    return
+                wait = (tokens - self.available) / self.rate
+            time.sleep(wait)
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """Read Retry-After / retry-after-ms from an OpenAI-style error, if present."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def _is_retryable(error: Exception) -> bool:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    # Connection resets and timeouts carry no status code
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError", "RateLimitError")
+
+
+class EmbeddingExecutor:
+    """Embed many texts with bounded concurrency, TPM budgeting and backoff."""
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = 64,
+        max_in_flight: int = 4,
+        tokens_per_minute: int = 0,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        report_every: float = 5.0,
+    ):
+        self.embeddings = embeddings
+        self.batch_size = max(1, batch_size)
+        self.max_in_flight = max(1, max_in_flight)
+        self.bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.report_every = report_every
+
+        self._progress_lock = threading.Lock()
+        self._done_chunks = 0
+        self._done_tokens = 0
+        self._total_chunks = 0
+        self._started = 0.0
+        self._last_report = 0.0
+
+    def _embed_batch(self, model: Embeddings, texts: List[str]) -> List[List[float]]:
+        tokens = sum(count_tokens(t) for t in texts)
+        # Charged once: a rejected request did not use up the budget again, and
+        # the backoff below already waits for the server to recover
+        if self.bucket is not None:
+            self.bucket.acquire(tokens)
+        for attempt in range(self.max_retries + 1):
+            try:
+                vectors = model.embed_documents(texts)
+                break
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    raise
+                delay = _retry_after_seconds(e)
+                if delay is None:
+                    delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+                    delay *= 0.5 + random.random() / 2  # jitter so batches don't retry in lockstep
+                logger.warning("Embedding batch failed (%s); retry %d in %.1fs", type(e).__name__, attempt + 1, delay)
+                time.sleep(delay)
+
+        self._record(len(texts), tokens)
+        return vectors
+
+    def _record(self, chunks: int, tokens: int) -> None:
+        with self._progress_lock:
+            self._done_chunks += chunks
+            self._done_tokens += tokens
+            now = time.monotonic()
+            if now - self._last_report >= self.report_every or self._done_chunks == self._total_chunks:
+                self._last_report = now
+                logger.info("Embedding progress: %s", self.progress_line())
+
+    def progress_line(self) -> str:
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+        return (
+            f"{self._done_chunks}/{self._total_chunks} chunks, "
+            f"{self._done_chunks / elapsed:.1f} chunks/s, {self._done_tokens / elapsed:.0f} tokens/s"
+        )
+
+    def reset_progress(self) -> None:
+        """Start a new throughput measurement; later embed() calls accumulate."""
+        with self._progress_lock:
+            self._done_chunks = 0
+            self._done_tokens = 0
+            self._total_chunks = 0
+            self._started = self._last_report = time.monotonic()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts in order; batches run concurrently up to max_in_flight."""
+        if not texts:
+            return []
+        with self._progress_lock:
+            if not self._started:
+                self._started = self._last_report = time.monotonic()
+            self._total_chunks += len(texts)
+
+        cache = self.embeddings if isinstance(self.embeddings, CachedEmbeddings) else None
+        if cache is None:
+            return self._embed_all(self.embeddings, texts)
+
+        # Only cache misses reach the model, so only they use up the TPM budget
+        keys, found, missing = cache.lookup(texts)
+        self._record(len(texts) - len(missing), 0)
+        if missing:
+            fresh = dict(zip(missing.keys(), self._embed_all(cache.inner, list(missing.values()))))
+            cache.add(fresh)
+            found.update(fresh)
+        return [found[k] for k in keys]
+
+    def _embed_all(self, model: Embeddings, texts: List[str]) -> List[List[float]]:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=min(self.max_in_flight, len(batches))) as pool:
+            results = list(pool.map(lambda batch: self._embed_batch(model, batch), batches))
+        return [vector for batch in results for vector in batch]
+
+
+def executor_from_settings(embeddings: Embeddings) -> EmbeddingExecutor:
+    """EmbeddingExecutor configured from EMBED_* settings."""
+    return EmbeddingExecutor(
+        embeddings,
+        batch_size=EMBED_BATCH_SIZE,
+        max_in_flight=EMBED_MAX_IN_FLIGHT,
+        tokens_per_minute=EMBED_TOKENS_PER_MINUTE,
+        max_retries=EMBED_MAX_RETRIES,
+    )
@@ -0,0 +1,403 @@
+# app/qdrant/ingest.py
+"""
+Incremental ingestion of the .txt corpus into the vector backend.
+
+A JSON manifest remembers, per file, the content hash and the IDs of the
+chunks that were upserted for it, together with a hash of the chunker and
+embedding configuration. On each run only new or changed chunks are embedded
+and upserted, and chunks belonging to deleted or edited files are removed.
+"""
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_core.documents import Document
+
+from app.config.settings import CHUNK_OVERLAP, CHUNK_SIZE
+from app.qdrant.embedding_executor import EmbeddingExecutor
+from app.qdrant.metadata import chunk_metadata, file_topic
+
+logger = logging.getLogger(__name__)
+
+# ---- Config ----
+# CHUNK_SIZE / CHUNK_OVERLAP come from settings and are part of
+# chunker_config_hash(), so changing either re-ingests everything.
+# Bump whenever the payload written for a chunk changes shape, so existing
+# collections are rebuilt instead of silently mixing old and new payloads.
+# 2: metadata["chunk"] = position within the file
+# 3: metadata destination / topic / language (see app/qdrant/metadata.py)
+INGEST_SCHEMA_VERSION = 3
+
+# Namespace for deterministic chunk IDs (Qdrant accepts UUIDs or integers only)
+_CHUNK_ID_NAMESPACE = uuid.UUID("6f0c1d3e-4b8a-5e21-9c7d-2a1f3b4c5d6e")
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunker_config_hash(embedding_model: Optional[str], dimension: int) -> str:
+    """
+    Hash of everything that affects the stored vectors and payloads.
+    A change here invalidates the whole manifest and forces a full re-ingest.
+    """
+    config = {
+        "schema": INGEST_SCHEMA_VERSION,
+        "splitter": "RecursiveCharacterTextSplitter",
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "embedding_model": embedding_model or "",
+        "dimension": dimension,
+    }
+    return _sha256(json.dumps(config, sort_keys=True))
+
+
+# ---- Manifest ----
+class IngestManifest:
+    """
+    Persistent record of what has been ingested into a collection.
+    Structure:
+    {
+      "collection": str,
+      "config_hash": str,
+      "files": { relative_path: { "sha256": str, "chunks": [point_id, ...] } }
+    }
+    """
+
+    def __init__(self, path: str, collection: str, config_hash: str,
+                 files: Optional[Dict[str, Dict]] = None):
+        self.path = path
+        self.collection = collection
+        self.config_hash = config_hash
+        self.files: Dict[str, Dict] = files or {}
+
+    @classmethod
+    def load(cls, path: str, collection: str, config_hash: str) -> "IngestManifest":
+        """Load the manifest, or return an empty one if missing or stale."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls(path, collection, config_hash)
+
+        if data.get("collection") != collection or data.get("config_hash") != config_hash:
+            logger.info("Ingest manifest is for a different collection or chunker config; rebuilding")
+            return cls(path, collection, config_hash)
+        return cls(path, collection, config_hash, data.get("files", {}))
+
+    def chunk_count(self) -> int:
+        return sum(len(entry.get("chunks", [])) for entry in self.files.values())
+
+    def save(self) -> None:
+        """Write atomically so a crash mid-ingest never leaves a truncated manifest."""
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"collection": self.collection, "config_hash": self.config_hash, "files": self.files},
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+        os.replace(tmp_path, self.path)
+
+
+@contextmanager
+def ingest_lock(path: str):
+    """
+    Exclusive lock so several worker processes starting together ingest one
+    at a time; the later ones then find the manifest up to date. POSIX
+    advisory lock, a no-op where fcntl is unavailable.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# ---- Discovery, reading & chunking (streaming) ----
+def _iter_txt_files(root: str) -> Iterator[Tuple[Path, str]]:
+    """
+    Yield (path, relative_posix_path) for .txt files under root in a stable
+    order, walking one directory at a time instead of listing the whole tree.
+    """
+    root_path = Path(root)
+    for dirpath, dirnames, filenames in os.walk(root_path):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.endswith(".txt"):
+                path = Path(dirpath) / name
+                yield path, path.relative_to(root_path).as_posix()
+
+
+def _file_sha256(path: Path, block_chars: int) -> str:
+    """Content hash computed block by block, in constant memory."""
+    digest = hashlib.sha256()
+    for segment in _iter_segments(path, block_chars):
+        digest.update(segment.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _iter_segments(path: Path, block_chars: int) -> Iterator[str]:
+    """
+    Read a file in blocks of about block_chars, cutting at the last paragraph
+    (or line) break so the splitter rarely sees a block boundary mid-sentence.
+    Files smaller than a block come back as a single segment.
+    """
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        carry = ""
+        while True:
+            block = f.read(block_chars)
+            text = carry + block
+            if len(block) < block_chars:
+                # End of file: whatever is left is the final segment
+                if text:
+                    yield text
+                return
+            cut = text.rfind("\n\n")
+            if cut <= 0:
+                cut = text.rfind("\n")
+            if cut <= 0:
+                yield text
+                carry = ""
+            else:
+                yield text[:cut]
+                carry = text[cut:]
+
+
+def _splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+
+def _make_id(rel: str, text: str, occurrences: Dict[str, int]) -> str:
+    """
+    Stable, content-addressed ID so re-ingestion upserts rather than duplicates.
+    Derived from "<relative_path>:<chunk_sha256>:<occurrence>", so a chunk keeps
+    its ID when unrelated edits shift its position within the file.
+    """
+    digest = _sha256(text)
+    n = occurrences.get(digest, 0)
+    occurrences[digest] = n + 1
+    return str(uuid.uuid5(_CHUNK_ID_NAMESPACE, f"{rel}:{digest}:{n}"))
+
+
+# ---- Upsert ----
+def upsert_chunks(
+    backend,
+    chunks: List[Document],
+    ids: List[str],
+    executor: EmbeddingExecutor,
+) -> None:
+    """
+    Embed chunks through the executor and upsert them into a vector backend
+    (see app/qdrant/backends.py), then persist.
+    """
+    vectors = executor.embed([c.page_content for c in chunks])
+    backend.upsert(chunks, ids, vectors)
+    backend.flush()
+
+
+# ---- Pipeline plumbing ----
+_DONE = object()
+
+
+class _Aborted(Exception):
+    """Raised inside a stage when another stage has failed."""
+
+
+class _Pipeline:
+    """Bounded queues between stage threads, with failure propagation."""
+
+    def __init__(self, depth: int):
+        self.depth = max(1, depth)
+        self.stop = threading.Event()
+        self.error: Optional[BaseException] = None
+        self.threads: List[threading.Thread] = []
+
+    def queue(self) -> "queue.Queue":
+        return queue.Queue(maxsize=self.depth)
+
+    def put(self, q: "queue.Queue", item) -> None:
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise _Aborted()
+
+    def get(self, q: "queue.Queue"):
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        raise _Aborted()
+
+    def start(self, name: str, target, *args) -> None:
+        def run():
+            try:
+                target(*args)
+            except _Aborted:
+                pass
+            except BaseException as e:
+                if self.error is None:
+                    self.error = e
+                self.stop.set()
+
+        thread = threading.Thread(target=run, name=f"ingest-{name}", daemon=True)
+        self.threads.append(thread)
+        thread.start()
+
+    def join(self) -> None:
+        for thread in self.threads:
+            thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+# ---- Incremental ingest ----
+def ingest_directory(
+    backend,
+    executor: EmbeddingExecutor,
+    root: str,
+    manifest_path: str,
+    config_hash: str,
+    queue_depth: int = 64,
+    read_block_chars: int = 1_000_000,
+) -> Dict[str, int]:
+    """
+    Bring the backend (Qdrant collection or local index) in line with the
+    .txt files under root.
+
+    Runs as a streaming pipeline, discover/read -> split -> embed -> upsert,
+    with one thread per stage and queues of at most queue_depth items between
+    them. Peak memory therefore depends on queue_depth, the embedding window
+    and read_block_chars, not on corpus size, and file I/O, splitting and
+    embedding requests overlap.
+    Returns counts of files scanned/changed/removed and chunks added/deleted.
+    """
+    collection = backend.name
+    manifest = IngestManifest.load(manifest_path, collection, config_hash)
+
+    # If the backend does not hold exactly what the manifest says (fresh Qdrant
+    # volume, legacy random-ID duplicates, config or backend change), start over.
+    stored = backend.count()
+    if stored != manifest.chunk_count() or not manifest.files:
+        if stored:
+            logger.info("'%s' holds %d points, manifest expects %d; clearing for a full re-ingest",
+                        collection, stored, manifest.chunk_count())
+            backend.clear()
+        manifest.files = {}
+
+    stats = {"files": 0, "changed": 0, "removed": 0, "added": 0, "deleted": 0}
+    seen = set()
+    stale_ids: List[str] = []
+    # Manifest entries are only applied once every stage has finished cleanly
+    updates: Dict[str, Dict] = {}
+    window = executor.batch_size * executor.max_in_flight
+
+    pipeline = _Pipeline(queue_depth)
+    files_q, chunks_q, points_q = pipeline.queue(), pipeline.queue(), pipeline.queue()
+    executor.reset_progress()
+
+    def discover():
+        for path, rel in _iter_txt_files(root):
+            stats["files"] += 1
+            seen.add(rel)
+            digest = _file_sha256(path, read_block_chars)
+            entry = manifest.files.get(rel)
+            if entry and entry.get("sha256") == digest:
+                continue
+            stats["changed"] += 1
+            pipeline.put(files_q, (path, rel, digest))
+        pipeline.put(files_q, _DONE)
+
+    def split():
+        splitter = _splitter()
+        while (item := pipeline.get(files_q)) is not _DONE:
+            path, rel, digest = item
+            entry = manifest.files.get(rel)
+            # Previous position of each chunk; a chunk that moved is upserted
+            # again so its "chunk" index stays right (its vector is cached)
+            old_positions = {point_id: i for i, point_id in enumerate(entry["chunks"])} if entry else {}
+            ids: List[str] = []
+            occurrences: Dict[str, int] = {}
+            topic = None
+            for n, segment in enumerate(_iter_segments(path, read_block_chars)):
+                if n == 0:
+                    # File topic from its name and title line, shared by all its chunks
+                    topic = file_topic(rel, segment.lstrip().split("\n", 1)[0][:200])
+                for text in splitter.split_text(segment):
+                    point_id = _make_id(rel, text, occurrences)
+                    index = len(ids)
+                    ids.append(point_id)
+                    if old_positions.get(point_id) != index:
+                        metadata = {"path": rel, "chunk": index, **chunk_metadata(rel, text, topic)}
+                        doc = Document(page_content=text, metadata=metadata)
+                        pipeline.put(chunks_q, (doc, point_id))
+            keep = set(ids)
+            old_ids = set(old_positions)
+            stale_ids.extend(i for i in old_ids if i not in keep)
+            updates[rel] = {"sha256": digest, "chunks": ids}
+        pipeline.put(chunks_q, _DONE)
+
+    def embed():
+        batch: List[Tuple[Document, str]] = []
+        while True:
+            item = pipeline.get(chunks_q)
+            if item is not _DONE:
+                batch.append(item)
+            if batch and (len(batch) >= window or item is _DONE):
+                vectors = executor.embed([doc.page_content for doc, _ in batch])
+                pipeline.put(points_q, (batch, vectors))
+                batch = []
+            if item is _DONE:
+                break
+        pipeline.put(points_q, _DONE)
+
+    def upsert():
+        while (item := pipeline.get(points_q)) is not _DONE:
+            batch, vectors = item
+            backend.upsert([d for d, _ in batch], [i for _, i in batch], vectors)
+            stats["added"] += len(batch)
+
+    for name, stage in (("discover", discover), ("split", split), ("embed", embed), ("upsert", upsert)):
+        pipeline.start(name, stage)
+    pipeline.join()
+
+    manifest.files.update(updates)
+    for rel in [r for r in manifest.files if r not in seen]:
+        stats["removed"] += 1
+        stale_ids.extend(manifest.files.pop(rel)["chunks"])
+
+    if stale_ids:
+        backend.delete(stale_ids)
+    stats["deleted"] = len(stale_ids)
+
+    backend.flush()
+    manifest.save()
+
+    logger.info("Scanned %d documents in %s", stats["files"], root)
+    if stats["added"] or stats["deleted"]:
+        logger.info("Ingested %d chunks and removed %d from '%s' (%d changed, %d deleted files)",
+                    stats["added"], stats["deleted"], collection, stats["changed"], stats["removed"])
+    else:
+        logger.info("'%s' is up to date (%d chunks); nothing to embed", collection, manifest.chunk_count())
+    return stats
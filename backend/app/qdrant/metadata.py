@@ -0,0 +1,166 @@
+# app/qdrant/metadata.py
+"""
+Chunk metadata for filtered retrieval.
+
+At ingest every chunk gets, next to its source path:
+  destination  places it is about (gazetteer matches in the chunk, plus any
+               named in the file name), e.g. ["rome", "florence"]
+  topic        one category per file, from the file name and title, falling
+               back to the chunk's own wording (itinerary, transport, ...)
+  language     "en", "it" or "ar", from the script and common stop words
+
+Qdrant keeps keyword payload indexes on these fields (see
+app/qdrant/backends.py), so a filtered search only walks matching points.
+infer_filters() is the query-side counterpart: a cheap lookup of the same
+gazetteer and topic keywords in the question.
+
+Filters are plain dicts, {field: value or [values]}: a chunk matches when,
+for every field, its value (or one of its values) is among the given ones.
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Union
+
+from app.qdrant.bm25 import tokenize
+
+FILTER_FIELDS = ("destination", "topic", "language", "path")
+
+Filters = Dict[str, Union[str, List[str]]]
+
+# Canonical destination -> spellings (accent-folded, lowercase, as tokenize() yields)
+DESTINATIONS: Dict[str, Iterable[str]] = {
+    "rome": ("rome", "roma", "vatican"),
+    "milan": ("milan", "milano"),
+    "venice": ("venice", "venezia"),
+    "florence": ("florence", "firenze"),
+    "naples": ("naples", "napoli"),
+    "turin": ("turin", "torino"),
+    "bologna": ("bologna",),
+    "verona": ("verona",),
+    "pisa": ("pisa",),
+    "siena": ("siena",),
+    "genoa": ("genoa", "genova"),
+    "palermo": ("palermo",),
+    "pompeii": ("pompeii", "pompei"),
+    "capri": ("capri",),
+    "positano": ("positano",),
+    "sorrento": ("sorrento",),
+    "amalfi coast": ("amalfi",),
+    "cinque terre": ("cinque terre",),
+    "lake como": ("lake como", "como"),
+    "lake garda": ("lake garda", "garda"),
+    "dolomites": ("dolomites", "dolomiti"),
+    "tuscany": ("tuscany", "toscana"),
+    "sicily": ("sicily", "sicilia"),
+    "sardinia": ("sardinia", "sardegna"),
+    "puglia": ("puglia", "apulia"),
+}
+
+# Topic -> indicative words and phrases; matched as whole words (plurals
+# included), or as prefixes when they end in "*"
+TOPICS: Dict[str, Iterable[str]] = {
+    "itinerary": ("itinerar*", "day trip", "days in", "weeks in", "plan*"),
+    "transport": ("transport*", "train", "bus", "ferry", "ferries", "metro", "car rental", "flight",
+                  "getting around", "get around"),
+    "festivals": ("festival", "celebration", "carnival", "carnevale", "feast"),
+    "shopping": ("shopping", "shop", "boutique", "market", "outlet"),
+    "etiquette": ("etiquette", "rule", "behavior", "behaviour", "custom", "tipping", "dress code"),
+    "food": ("food", "restaurant", "cuisine", "dish", "dishes", "wine", "pizza", "pasta", "gelato", "trattoria"),
+    "sights": ("places to visit", "attraction", "museum", "sights", "landmark", "beautiful places"),
+}
+GENERAL_TOPIC = "general"
+
+_ARABIC = re.compile(r"[؀-ۿ]")
+_ITALIAN_WORDS = frozenset(("il", "della", "che", "per", "gli", "di", "una", "sono", "nel", "delle"))
+_ENGLISH_WORDS = frozenset(("the", "and", "of", "to", "is", "in", "for", "with", "you", "are"))
+
+
+def _folded(text: str) -> str:
+    """Accent-folded, lowercase words separated by single spaces (padded for phrase matching)."""
+    return " " + " ".join(tokenize(text)) + " "
+
+
+def destinations_in(text: str) -> List[str]:
+    folded = _folded(text)
+    return sorted(
+        name for name, spellings in DESTINATIONS.items()
+        if any(f" {spelling} " in folded for spelling in spellings)
+    )
+
+
+def _topic_scores(text: str) -> Dict[str, int]:
+    folded = _folded(text)
+    scores = {}
+    for topic, words in TOPICS.items():
+        score = sum(
+            folded.count(f" {word[:-1]}") if word.endswith("*")
+            else folded.count(f" {word} ") + folded.count(f" {word}s ")
+            for word in words
+        )
+        if score:
+            scores[topic] = score
+    return scores
+
+
+def topic_of(text: str) -> Optional[str]:
+    """Most indicated topic, or None when no topic word appears."""
+    scores = _topic_scores(text)
+    return max(scores, key=scores.get) if scores else None
+
+
+def language_of(text: str) -> str:
+    if len(_ARABIC.findall(text)) > 0.3 * max(1, len(text.strip())):
+        return "ar"
+    words = tokenize(text)
+    italian = sum(1 for w in words if w in _ITALIAN_WORDS)
+    english = sum(1 for w in words if w in _ENGLISH_WORDS)
+    return "it" if italian > english else "en"
+
+
+def file_topic(rel_path: str, title: str = "") -> Optional[str]:
+    """Topic named by a file's name or title line, if any."""
+    stem = rel_path.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+    return topic_of(f"{stem} {title}")
+
+
+def chunk_metadata(rel_path: str, text: str, topic: Optional[str] = None) -> Dict:
+    """Filterable fields for one chunk; topic is the file's topic when known."""
+    stem = rel_path.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+    return {
+        "destination": sorted(set(destinations_in(text)) | set(destinations_in(stem))),
+        "topic": topic or topic_of(text) or GENERAL_TOPIC,
+        "language": language_of(text),
+    }
+
+
+def infer_filters(query: str) -> Filters:
+    """Destination and topic filters suggested by the words of a question."""
+    filters: Filters = {}
+    destinations = destinations_in(query)
+    if destinations:
+        filters["destination"] = destinations
+    topic = topic_of(query)
+    if topic:
+        filters["topic"] = [topic]
+    return filters
+
+
+def normalize_filters(filters: Optional[Filters]) -> Dict[str, List[str]]:
+    """{field: [values]} with unknown fields rejected and empty fields dropped."""
+    normalized = {}
+    for field, values in (filters or {}).items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Unknown filter field '{field}' (expected one of {', '.join(FILTER_FIELDS)})")
+        values = [values] if isinstance(values, str) else [str(v) for v in values]
+        if values:
+            normalized[field] = values
+    return normalized
+
+
+def matches(metadata: Dict, filters: Dict[str, List[str]]) -> bool:
+    """Whether chunk metadata satisfies normalized filters (used off-Qdrant)."""
+    for field, values in filters.items():
+        value = metadata.get(field)
+        have = value if isinstance(value, list) else [value]
+        if not any(v in values for v in have):
+            return False
+    return True
@@ -0,0 +1,69 @@
+# app/qdrant/query_variants.py
+"""
+Query variants for multi-query retrieval.
+
+A follow-up such as "and what about trains there?" says nothing about where
+"there" is, so searching with the raw question alone retrieves poorly.
+Retrieval therefore searches with a few variants of the question at once:
+
+  raw       the question as asked
+  rewrite   the latest earlier user turn followed by the question, so the
+            references of a follow-up are spelled out (skipped when the
+            question names a destination itself)
+  entities  the destinations (from the question, else from the most recent
+            turn naming one) and the topic of the question, e.g. "rome transport"
+
+The rewrite is a deterministic condensation of the history, not an LLM call:
+a completion round-trip before retrieval would cost more latency than the
+whole multi-query search. All variants are embedded in one call and searched
+in one batch (see app/qdrant/retrieval.py).
+"""
+from typing import List
+
+from app.qdrant.metadata import destinations_in, topic_of
+
+_SUMMARY_PREFIX = "summary of earlier conversation:"
+
+
+def _user_turns(chat_history: str) -> List[str]:
+    """User messages of a rendered history ("role: content" per line), oldest first."""
+    return [
+        line[len("user:"):].strip()
+        for line in chat_history.splitlines()
+        if line.startswith("user:") and line[len("user:"):].strip()
+    ]
+
+
+def _destinations(question: str, chat_history: str, turns: List[str]) -> List[str]:
+    found = destinations_in(question)
+    if found:
+        return found
+    for turn in reversed(turns):
+        found = destinations_in(turn)
+        if found:
+            return found
+    summary = next((line for line in chat_history.splitlines() if line.startswith(_SUMMARY_PREFIX)), "")
+    return destinations_in(summary)
+
+
+def query_variants(question: str, chat_history: str = "", max_variants: int = 3) -> List[str]:
+    """The raw question first, then the history-aware rewrite and the entity query, deduplicated."""
+    question = question.strip()
+    turns = _user_turns(chat_history)
+    candidates = [question]
+    # A question naming its own destination stands alone; only rewrite the others
+    if turns and not destinations_in(question):
+        candidates.append(f"{turns[-1]} {question}")
+    topic = topic_of(question)
+    entities = _destinations(question, chat_history, turns) + ([topic] if topic else [])
+    if entities:
+        candidates.append(" ".join(entities))
+
+    variants: List[str] = []
+    seen = set()
+    for text in candidates:
+        key = text.casefold()
+        if text and key not in seen:
+            seen.add(key)
+            variants.append(text)
+    return variants[:max(1, max_variants)]
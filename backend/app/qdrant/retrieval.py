@@ -1,114 +1,383 @@
 # app/qdrant/retrieval.py
+import asyncio
+import logging
 import os
+import threading
 from pathlib import Path
-from typing import List, Tuple
-import uuid
+from typing import Dict, List, Optional, Tuple
 
-from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
-from langchain_qdrant import QdrantVectorStore
+import numpy as np
+from qdrant_client import AsyncQdrantClient, QdrantClient
 from langchain_openai import AzureOpenAIEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 
-from app.config.settings import QDRANT_URL, QDRANT_COLLECTION
+from app.config.settings import (
+    QDRANT_URL,
+    QDRANT_COLLECTION,
+    QDRANT_PROFILE,
+    VECTOR_BACKEND,
+    LOCAL_INDEX_DIR,
+    INGEST_MANIFEST_PATH,
+    AUTO_INGEST,
+    INGEST_QUEUE_DEPTH,
+    INGEST_READ_BLOCK_CHARS,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MEMORY_ITEMS,
+    EMBEDDING_DIMENSION,
+    RETRIEVAL_MODE,
+    HYBRID_CANDIDATES,
+    RRF_K,
+    RETRIEVAL_INFER_FILTERS,
+    DIVERSITY_MODE,
+    DIVERSITY_CANDIDATES,
+    MMR_LAMBDA,
+    MAX_CHUNKS_PER_SOURCE,
+    MULTI_QUERY_ENABLED,
+    MULTI_QUERY_MAX_VARIANTS,
+    CONTEXT_TOKEN_BUDGET,
+)
+from app import metrics
+from app.qdrant.backends import CollectionProfile, LocalBackend, QdrantBackend
+from app.qdrant.bm25 import BM25Index, reciprocal_rank_fusion
+from app.qdrant.context import pack_context
+from app.qdrant.diversity import cap_per_source, mmr
+from app.qdrant.embedding_cache import CachedEmbeddings
+from app.qdrant.embedding_executor import executor_from_settings
+from app.qdrant.ingest import CHUNK_OVERLAP, chunker_config_hash, ingest_directory, ingest_lock
+from app.qdrant.metadata import Filters, infer_filters, matches, normalize_filters
+from app.qdrant.query_variants import query_variants
+
+logger = logging.getLogger(__name__)
 
 # ---- Config ----
 DATA_DIR = os.getenv("DATA_DIR", str(Path(__file__).resolve().parents[2] / "data"))
-EXPECTED_SIZE = int(os.getenv("EMBEDDING_DIMENSION", "1536"))  # must match your embedding deployment
+EXPECTED_SIZE = EMBEDDING_DIMENSION  # requested from the deployment and checked against the collection
 
 # ---- Embeddings & Client ----
-embeddings = AzureOpenAIEmbeddings(
-    model=os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-    api_key=os.getenv("AZURE_OPENAI_EMBEDDING_KEY"),
-    openai_api_version=os.getenv("AZURE_OPENAI_EMBEDDING_API_VERSION"),
-)
-client = QdrantClient(url=QDRANT_URL)
-
-# ---- Collection lifecycle ----
-def ensure_collection(name: str, size: int = EXPECTED_SIZE) -> None:
-    """Create the collection if it doesn't exist."""
-    try:
-        client.get_collection(name)
-        # exists → nothing to do
-    except Exception:
-        print(f"ℹ Creating collection '{name}' (size={size}, distance=COSINE)...")
-        client.recreate_collection(
-            collection_name=name,
-            vectors_config=VectorParams(size=size, distance=Distance.COSINE),
-        )
-
-# ---- Data loading & chunking ----
-def _load_txt_documents(root: str) -> List[Document]:
+# Built lazily by init_retrieval() so importing this module does no network I/O.
+embeddings = None
+client = None
+# Async client for the request path; only created for a Qdrant server URL,
+# since an in-process (":memory:"/path) store cannot be shared across clients.
+async_client = None
+# Vector backend selected by VECTOR_BACKEND (see app/qdrant/backends.py)
+backend = None
+# In-process BM25 index over the collection, for sparse/hybrid retrieval
+sparse_index: Optional[BM25Index] = None
+_init_lock = threading.Lock()
+
+
+def request_dimensions(deployment: Optional[str], dimension: int = EXPECTED_SIZE) -> Optional[int]:
     """
-    Recursively load .txt files under root as LangChain Documents.
-    Stores relative file path in metadata['path'].
+    `dimensions` to send with embedding requests: text-embedding-3 models
+    shorten their output to it; ada-002 rejects the parameter.
     """
-    docs: List[Document] = []
-    root_path = Path(root)
-    for path in root_path.rglob("*.txt"):
-        try:
-            text = path.read_text(encoding="utf-8", errors="ignore")
-            rel = str(path.relative_to(root_path))
-            docs.append(Document(page_content=text, metadata={"path": rel}))
-        except Exception:
-            # skip unreadable files but continue
-            continue
-    return docs
-
-def _chunks_from_docs(docs: List[Document]) -> List[Document]:
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
-    chunks = splitter.split_documents(docs)
-    for c in chunks:
-        c.metadata.setdefault("path", "unknown")
-    return chunks
-
-def _make_ids(chunks: List[Document]) -> List[str]:
+    return None if "ada" in (deployment or "").lower() else dimension
+
+
+def _build_embeddings(max_retries: int = 2) -> CachedEmbeddings:
     """
-    Stable, deterministic IDs so re-ingestion upserts rather than duplicates.
-    Format: "<relative_path>#<chunk_index>"
-    """    
-    ids: List[str] = []
-    counters: dict[str, int] = {}
-    for c in chunks:
-        rel = c.metadata.get("path", "unknown")
-        idx = counters.get(rel, 0)
-        counters[rel] = idx + 1
-        ids.append(f"{rel}#{idx}")
-    return ids
-
-# ---- Ensure collection and build vectorstore ----
-ensure_collection(QDRANT_COLLECTION, size=EXPECTED_SIZE)
-
-vectorstore = QdrantVectorStore(
-    client=client,
-    collection_name=QDRANT_COLLECTION,
-    embedding=embeddings,
-)
+    Azure embeddings behind the memory + SQLite cache. Ingestion builds its
+    own with max_retries=0: its EmbeddingExecutor retries (honouring
+    Retry-After) itself, and client retries underneath would multiply them.
+    """
+    deployment = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
+    azure = AzureOpenAIEmbeddings(
+        model=deployment,
+        dimensions=request_dimensions(deployment),
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_key=os.getenv("AZURE_OPENAI_EMBEDDING_KEY"),
+        openai_api_version=os.getenv("AZURE_OPENAI_EMBEDDING_API_VERSION"),
+        max_retries=max_retries,
+    )
+    return CachedEmbeddings(
+        azure,
+        deployment=deployment,
+        dimension=EXPECTED_SIZE,
+        path=EMBEDDING_CACHE_PATH or None,
+        max_memory_items=EMBEDDING_CACHE_MEMORY_ITEMS,
+    )
+
+
+def _build_backend():
+    """Qdrant server collection, or the embedded NumPy index for VECTOR_BACKEND=local."""
+    global client, async_client
+    if VECTOR_BACKEND == "local":
+        return LocalBackend(os.path.join(LOCAL_INDEX_DIR, QDRANT_COLLECTION), QDRANT_COLLECTION)
+
+    client = client or QdrantClient(url=QDRANT_URL)
+    if async_client is None and QDRANT_URL.startswith("http"):
+        async_client = AsyncQdrantClient(url=QDRANT_URL)
+    return QdrantBackend(client, QDRANT_COLLECTION, async_client, CollectionProfile.parse(QDRANT_PROFILE))
+
+# ---- Startup ----
+def init_retrieval(ingest: bool = AUTO_INGEST):
+    """
+    Build the embedding client and vector backend, ensure the collection
+    exists and, if enabled, incrementally ingest .txt files under DATA_DIR.
+    Safe to call repeatedly and from several threads; the work runs once.
+    """
+    global embeddings, backend, sparse_index
+    if backend is not None:
+        return backend
+    with _init_lock:
+        if backend is not None:
+            return backend
+
+        injected = embeddings is not None
+        embeddings = embeddings or _build_embeddings()
+        # With several uvicorn workers, one ingests while the others wait and
+        # then load the finished index
+        with ingest_lock(f"{INGEST_MANIFEST_PATH}.lock"):
+            store = _build_backend()
+            store.ensure(EXPECTED_SIZE)
+
+            # Only new or changed chunks are embedded; see app/qdrant/ingest.py.
+            if ingest:
+                # Shares the SQLite tier with the query-time client
+                ingest_embeddings = embeddings if injected else _build_embeddings(max_retries=0)
+                ingest_directory(
+                    store,
+                    executor_from_settings(ingest_embeddings),
+                    DATA_DIR,
+                    manifest_path=INGEST_MANIFEST_PATH,
+                    config_hash=chunker_config_hash(os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT"), EXPECTED_SIZE),
+                    queue_depth=INGEST_QUEUE_DEPTH,
+                    read_block_chars=INGEST_READ_BLOCK_CHARS,
+                )
+                logger.info("Embedding cache: %s", ingest_embeddings.stats())
+
+        if RETRIEVAL_MODE != "dense":
+            sparse_index = BM25Index.from_documents(store.iter_documents())
+            logger.info("BM25 index built over %d chunks (mode=%s)", len(sparse_index), RETRIEVAL_MODE)
+
+        backend = store
+    return backend
+
+
+def is_ready() -> bool:
+    """True once the collection is available (and ingested, if AUTO_INGEST)."""
+    return backend is not None
+
+# ---- Hybrid fusion ----
+def _pool_size(top_k: int) -> int:
+    """Hits to choose top_k from: a larger pool when diversity re-ranking is on."""
+    return max(top_k, DIVERSITY_CANDIDATES) if DIVERSITY_MODE in ("mmr", "source_cap") else top_k
+
+
+def _dense_limit(top_k: int) -> int:
+    """How many dense hits to fetch: 0 in sparse mode, extra candidates in hybrid."""
+    if RETRIEVAL_MODE == "sparse" and sparse_index is not None:
+        return 0
+    if RETRIEVAL_MODE == "hybrid" and sparse_index is not None:
+        return max(top_k, HYBRID_CANDIDATES)
+    return top_k
+
+
+def _fuse(queries: List[str], dense_lists: List[List[Document]], top_k: int,
+          filters: Optional[Dict[str, List[str]]] = None) -> List[Document]:
+    """
+    Combine the dense hits of each query variant with its BM25 hits according
+    to RETRIEVAL_MODE; several ranked lists are merged with RRF.
+    """
+    if RETRIEVAL_MODE == "dense" or sparse_index is None:
+        lists = dense_lists
+    else:
+        where = (lambda doc: matches(doc.metadata, filters)) if filters else None
+        sparse_lists = [
+            [doc for doc, _ in sparse_index.search(query, max(top_k, HYBRID_CANDIDATES), where)]
+            for query in queries
+        ]
+        lists = sparse_lists if RETRIEVAL_MODE == "sparse" else dense_lists + sparse_lists
+    if len(lists) == 1:
+        return lists[0][:top_k]
+
+    # Earlier lists win for a chunk found by several (dense before sparse)
+    by_id = {_doc_id(d): d for docs in reversed(lists) for d in docs}
+    fused = reciprocal_rank_fusion([[_doc_id(d) for d in docs] for docs in lists], k=RRF_K)
+    return [by_id[i] for i in fused[:top_k]]
 
-# ---- Always ingest all .txt files under DATA_DIR ----
-docs = _load_txt_documents(DATA_DIR)
-print(f"Found {len(docs)} documents in {DATA_DIR}")
 
-if docs:
-    chunks = _chunks_from_docs(docs)
+# ---- Metadata filters ----
+def _resolve_filters(query: str, filters: Optional[Filters]) -> Tuple[Dict[str, List[str]], bool]:
+    """(normalized filters, whether they were inferred from the query)."""
+    if filters:
+        return normalize_filters(filters), False
+    if RETRIEVAL_INFER_FILTERS not in ("destination", "all"):
+        return {}, False
+    inferred = infer_filters(query)
+    if RETRIEVAL_INFER_FILTERS == "destination":
+        inferred = {k: v for k, v in inferred.items() if k == "destination"}
+    if inferred:
+        logger.debug("Inferred retrieval filters %s", inferred)
+    return normalize_filters(inferred), True
 
-    ids = [str(uuid.uuid4()) for _ in chunks]
-    print(f"Prepared {len(chunks)} chunks. Ingesting (upsert by stable IDs)...")
 
-    # Upsert chunks using deterministic IDs to avoid duplicates on repeated starts.
-    vectorstore.add_documents(documents=chunks, ids=ids)
+def _top_up(docs: List[Document], extra: List[Document], top_k: int) -> List[Document]:
+    """Fill a short filtered result with unfiltered hits it doesn't already hold."""
+    seen = {str(d.metadata.get("_id")) for d in docs}
+    fill = [d for d in extra if str(d.metadata.get("_id")) not in seen]
+    return docs + fill[:top_k - len(docs)]
+
+
+# ---- Diversity re-ranking ----
+def _doc_id(doc: Document) -> str:
+    return str(doc.metadata.get("_id"))
+
+
+def _missing_vectors(pool: List[Document], vectors: Dict[str, np.ndarray]) -> List[str]:
+    """Pool members without a stored vector yet (BM25-only hits); empty unless MMR is on."""
+    if DIVERSITY_MODE != "mmr":
+        return []
+    return [_doc_id(d) for d in pool if _doc_id(d) not in vectors]
+
+
+def _diversify(query_vector: List[float], pool: List[Document], vectors: Dict[str, np.ndarray],
+               top_k: int) -> List[Document]:
+    """Pick top_k from the ranked pool according to DIVERSITY_MODE."""
+    if DIVERSITY_MODE == "source_cap":
+        return cap_per_source(pool, top_k, MAX_CHUNKS_PER_SOURCE)
+    if DIVERSITY_MODE != "mmr" or len(pool) <= 1:
+        return pool[:top_k]
+    # A point deleted since the search has no vector; it simply drops out
+    pool = [d for d in pool if _doc_id(d) in vectors]
+    if not pool:
+        return []
+    matrix = np.stack([vectors[_doc_id(d)] for d in pool])
+    return [pool[i] for i in mmr(query_vector, matrix, top_k, MMR_LAMBDA)]
 
-    print(f"✅ Ingested {len(chunks)} chunks into '{QDRANT_COLLECTION}'.")
-else:
-    print("No .txt documents found. Nothing ingested.")
 
 # ---- Public API ----
-def retrieve_context(query: str, top_k: int = 3) -> str:
-    docs = vectorstore.similarity_search(query, k=top_k)
-    context_parts = []
-    for d in docs:
-        source = d.metadata.get("path", "unknown")
-        context_parts.append(f"[Source: {source}]\n{d.page_content}")
-    return "\n".join(context_parts)
+def _collect(results, with_vectors: bool) -> Tuple[List[List[Document]], Dict[str, np.ndarray]]:
+    """Per-variant hit lists plus the stored vectors of every hit, by point ID."""
+    lists, vectors = [], {}
+    for docs, matrix in results:
+        lists.append(docs)
+        if with_vectors:
+            vectors.update((_doc_id(d), row) for d, row in zip(docs, matrix))
+    return lists, vectors
+
+
+def _search(store, queries: List[str], query_vectors: List[List[float]], top_k: int,
+            hnsw_ef: Optional[int], exact: Optional[bool], filters: Dict[str, List[str]]) -> List[Document]:
+    """Search every query variant (one batched request for several), fuse and diversify."""
+    pool_size = _pool_size(top_k)
+    limit = _dense_limit(pool_size)
+    # With MMR the candidates' stored vectors come back with the hits: nothing is re-embedded
+    with_vectors = DIVERSITY_MODE == "mmr"
+    dense_lists, vectors = [[] for _ in queries], {}
+    if limit:
+        with metrics.timed(metrics.VECTOR_SEARCH_SECONDS):
+            if len(query_vectors) > 1:
+                results = store.search_batch(query_vectors, limit, hnsw_ef, exact, filters, with_vectors)
+            elif with_vectors:
+                results = [store.search_candidates(query_vectors[0], limit, hnsw_ef, exact, filters)]
+            else:
+                results = [(store.search(query_vectors[0], limit, hnsw_ef, exact, filters), None)]
+        dense_lists, vectors = _collect(results, with_vectors)
+    pool = _fuse(queries, dense_lists, pool_size, filters)
+    missing = _missing_vectors(pool, vectors)
+    if missing:
+        vectors.update(store.fetch_vectors(missing))
+    return _diversify(query_vectors[0], pool, vectors, top_k)
+
+
+async def _asearch(store, queries: List[str], query_vectors: List[List[float]], top_k: int,
+                   hnsw_ef: Optional[int], exact: Optional[bool], filters: Dict[str, List[str]]) -> List[Document]:
+    pool_size = _pool_size(top_k)
+    limit = _dense_limit(pool_size)
+    with_vectors = DIVERSITY_MODE == "mmr"
+    dense_lists, vectors = [[] for _ in queries], {}
+    if limit:
+        with metrics.timed(metrics.VECTOR_SEARCH_SECONDS):
+            if len(query_vectors) > 1:
+                results = await store.asearch_batch(query_vectors, limit, hnsw_ef, exact, filters, with_vectors)
+            elif with_vectors:
+                results = [await store.asearch_candidates(query_vectors[0], limit, hnsw_ef, exact, filters)]
+            else:
+                results = [(await store.asearch(query_vectors[0], limit, hnsw_ef, exact, filters), None)]
+        dense_lists, vectors = _collect(results, with_vectors)
+    pool = _fuse(queries, dense_lists, pool_size, filters)
+    missing = _missing_vectors(pool, vectors)
+    if missing:
+        vectors.update(await store.afetch_vectors(missing))
+    return _diversify(query_vectors[0], pool, vectors, top_k)
+
+
+def _variants(query: str, chat_history: str) -> List[str]:
+    if not MULTI_QUERY_ENABLED:
+        return [query]
+    return query_variants(query, chat_history, MULTI_QUERY_MAX_VARIANTS)
+
+
+def search_documents(query: str, top_k: int = 3, hnsw_ef: Optional[int] = None,
+                     exact: Optional[bool] = None, filters: Optional[Filters] = None,
+                     chat_history: str = "") -> Tuple[List[float], List[Document]]:
+    """
+    Embed the query (through the embedding cache) and return the vector
+    together with the top_k matching chunks, so callers can reuse the vector.
+    Dense and BM25 hits are fused according to RETRIEVAL_MODE. hnsw_ef and
+    exact override the collection profile's search defaults for this query.
+    filters restricts the search by metadata, e.g. {"destination": "rome"}
+    (see app/qdrant/metadata.py); without them RETRIEVAL_INFER_FILTERS applies.
+    With MULTI_QUERY_ENABLED the query is searched together with variants
+    built from it and chat_history (app/qdrant/query_variants.py): one
+    embedding call and one batched vector search, merged with RRF. The
+    returned vector is always the raw query's.
+    """
+    store = init_retrieval()
+    queries = _variants(query, chat_history)
+    with metrics.timed(metrics.QUERY_EMBEDDING_SECONDS):
+        if len(queries) > 1:
+            query_vectors = embeddings.embed_documents(queries)
+        else:
+            query_vectors = [embeddings.embed_query(query)]
+    filters, inferred = _resolve_filters(query, filters)
+    docs = _search(store, queries, query_vectors, top_k, hnsw_ef, exact, filters)
+    if inferred and filters and len(docs) < top_k:
+        docs = _top_up(docs, _search(store, queries, query_vectors, top_k, hnsw_ef, exact, {}), top_k)
+    return query_vectors[0], docs
+
+
+def pack_documents(docs: List[Document]) -> Tuple[str, Dict[str, int]]:
+    """
+    Context string for the prompt (overlapping chunks merged, near-duplicates
+    dropped, best first, within CONTEXT_TOKEN_BUDGET) plus packing stats.
+    """
+    return pack_context(docs, CONTEXT_TOKEN_BUDGET, max_overlap=2 * CHUNK_OVERLAP)
+
+
+def format_context(docs: List[Document]) -> str:
+    return pack_documents(docs)[0]
+
+
+def retrieve_context(query: str, top_k: int = 3, hnsw_ef: Optional[int] = None,
+                     exact: Optional[bool] = None, filters: Optional[Filters] = None,
+                     chat_history: str = "") -> str:
+    _, docs = search_documents(query, top_k, hnsw_ef, exact, filters, chat_history)
+    return format_context(docs)
+
+
+async def asearch_documents(query: str, top_k: int = 3, hnsw_ef: Optional[int] = None,
+                            exact: Optional[bool] = None, filters: Optional[Filters] = None,
+                            chat_history: str = "") -> Tuple[List[float], List[Document]]:
+    """Async search_documents: non-blocking embedding call and vector search."""
+    store = backend or await asyncio.to_thread(init_retrieval)
+    queries = _variants(query, chat_history)
+    with metrics.timed(metrics.QUERY_EMBEDDING_SECONDS):
+        if len(queries) > 1:
+            query_vectors = await embeddings.aembed_documents(queries)
+        else:
+            query_vectors = [await embeddings.aembed_query(query)]
+    filters, inferred = _resolve_filters(query, filters)
+    docs = await _asearch(store, queries, query_vectors, top_k, hnsw_ef, exact, filters)
+    if inferred and filters and len(docs) < top_k:
+        docs = _top_up(docs, await _asearch(store, queries, query_vectors, top_k, hnsw_ef, exact, {}), top_k)
+    return query_vectors[0], docs
+
+
+async def aretrieve_context(query: str, top_k: int = 3, hnsw_ef: Optional[int] = None,
+                            exact: Optional[bool] = None, filters: Optional[Filters] = None,
+                            chat_history: str = "") -> str:
+    _, docs = await asearch_documents(query, top_k, hnsw_ef, exact, filters, chat_history)
+    return format_context(docs)
@@ -0,0 +1,373 @@
+# app/sessions/backends.py
+"""
+Session stores shared by every uvicorn worker.
+
+- SQLiteSessionStore: one SQLite file in WAL mode, so readers never block the
+  writer and any number of local worker processes see the same histories.
+- RedisSessionStore: one Redis list (plus a summary hash) per session, for
+  workers spread over several hosts. Works with anything that speaks the Redis protocol
+  (Redis, Valkey, KeyDB, fakeredis in tests).
+
+Both implement the MemorySessionStore interface (history/extend/append/
+revision/summary/set_summary/delete/stats) with the same semantics: appends are
+atomic and enforce the message-count and byte caps, history(limit=N) reads
+only the last N messages, and reading a history counts as activity for the
+idle TTL.
+"""
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from app.sessions.store import Message
+
+# Seconds between sweeps for expired / over-cap sessions
+_SWEEP_INTERVAL = 60.0
+
+
+def _newest_within(messages: List[Message], max_bytes: int) -> List[Message]:
+    """Drop the oldest messages until the rest fit in max_bytes (the newest always stays)."""
+    if max_bytes <= 0:
+        return messages
+    total = 0
+    for i in range(len(messages) - 1, -1, -1):
+        total += messages[i].size
+        if total > max_bytes and i < len(messages) - 1:
+            return messages[i + 1:]
+    return messages
+
+
+# ---- SQLite (WAL) ----
+class SQLiteSessionStore:
+    """
+    Sessions in a SQLite file shared by all worker processes on one host.
+    Each extend() is a single IMMEDIATE transaction (insert, then trim to the
+    caps), and the messages index on (session_id, id) makes "last N" a short
+    range scan.
+    """
+
+    def __init__(self, path: str, max_sessions: int = 10_000, ttl_seconds: float = 3600,
+                 max_messages: int = 40, max_bytes: int = 64_000):
+        self.path = path
+        self.max_sessions = max(1, max_sessions)
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max(2, max_messages)
+        self.max_bytes = max_bytes
+        self._evicted = 0
+        self._last_sweep = 0.0
+        self._lock = threading.Lock()
+
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode; transactions are opened explicitly below
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                touched REAL NOT NULL,
+                bytes INTEGER NOT NULL DEFAULT 0,
+                summary TEXT NOT NULL DEFAULT '',
+                summary_mark TEXT NOT NULL DEFAULT ''
+            );
+            CREATE INDEX IF NOT EXISTS sessions_touched ON sessions (touched);
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL REFERENCES sessions (session_id) ON DELETE CASCADE,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                bytes INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id);
+            """
+        )
+        # Files created before rolling summaries lack these columns
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(sessions)")}
+        for column in ("summary", "summary_mark"):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE sessions ADD COLUMN {column} TEXT NOT NULL DEFAULT ''")
+
+    def _expired(self, touched: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - touched >= self.ttl_seconds
+
+    def _sweep(self, now: float) -> None:
+        """Drop idle sessions and the least recently used beyond max_sessions."""
+        if now - self._last_sweep < _SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        evicted = 0
+        if self.ttl_seconds > 0:
+            evicted += self._db.execute(
+                "DELETE FROM sessions WHERE touched < ?", (now - self.ttl_seconds,)
+            ).rowcount
+        evicted += self._db.execute(
+            "DELETE FROM sessions WHERE session_id IN "
+            "(SELECT session_id FROM sessions ORDER BY touched DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,),
+        ).rowcount
+        self._evicted += evicted
+
+    def history(self, session_id: str, limit: Optional[int] = None) -> List[Message]:
+        """Newest `limit` messages (all kept messages by default), oldest first."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT touched FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            now = time.time()
+            if row is None or self._expired(row[0], now):
+                return []
+            if limit is not None and limit <= 0:
+                return []
+            # Reading counts as activity, as in the memory store
+            self._db.execute("UPDATE sessions SET touched = ? WHERE session_id = ?", (now, session_id))
+            rows = self._db.execute(
+                "SELECT id, role, content FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, limit if limit is not None else -1),
+            ).fetchall()
+        # The AUTOINCREMENT row ID is never reused, so it serves as the seq
+        return [Message(role, content, message_id) for message_id, role, content in reversed(rows)]
+
+    def append(self, session_id: str, role: str, content: str) -> None:
+        self.extend(session_id, [Message(role, content)])
+
+    def extend(self, session_id: str, messages: List[Message]) -> None:
+        """Append messages and trim the session to its caps in one transaction."""
+        if not messages:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT touched FROM sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                if row is not None and self._expired(row[0], now):
+                    self._db.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                    self._evicted += 1
+                self._db.execute(
+                    "INSERT INTO sessions (session_id, touched) VALUES (?, ?) "
+                    "ON CONFLICT (session_id) DO UPDATE SET touched = excluded.touched",
+                    (session_id, now),
+                )
+                self._db.executemany(
+                    "INSERT INTO messages (session_id, role, content, bytes) VALUES (?, ?, ?, ?)",
+                    [(session_id, m.role, m.content, m.size) for m in messages],
+                )
+
+                # Keep the newest max_messages rows, then drop the oldest of
+                # those until the byte cap is met
+                kept = self._db.execute(
+                    "SELECT id, bytes FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                    (session_id, self.max_messages),
+                ).fetchall()
+                total = 0
+                cutoff = kept[-1][0]
+                for i, (message_id, size) in enumerate(kept):
+                    if i and self.max_bytes > 0 and total + size > self.max_bytes:
+                        cutoff = kept[i - 1][0]
+                        break
+                    total += size
+                self._db.execute(
+                    "DELETE FROM messages WHERE session_id = ? AND id < ?", (session_id, cutoff)
+                )
+                self._db.execute(
+                    "UPDATE sessions SET bytes = ? WHERE session_id = ?", (total, session_id)
+                )
+                self._sweep(now)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def revision(self, session_id: str) -> Tuple[int, str]:
+        """(seq of the newest message, summary mark), (0, "") if none. Counts as activity."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT touched, summary_mark FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            now = time.time()
+            if row is None or self._expired(row[0], now):
+                return 0, ""
+            self._db.execute("UPDATE sessions SET touched = ? WHERE session_id = ?", (now, session_id))
+            newest = self._db.execute(
+                "SELECT MAX(id) FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+        return newest or 0, row[1]
+
+    def summary(self, session_id: str) -> Tuple[str, str]:
+        """(summary text, mark of the last folded message); empty if none."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT summary, summary_mark, touched FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None or self._expired(row[2], time.time()):
+            return "", ""
+        return row[0], row[1]
+
+    def set_summary(self, session_id: str, text: str, mark: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE sessions SET summary = ?, summary_mark = ? WHERE session_id = ?",
+                (text, mark, session_id),
+            )
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._db.execute(
+                "DELETE FROM sessions WHERE session_id = ?", (session_id,)
+            ).rowcount > 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            # Message bytes plus the UTF-8 size of each summary, as in the memory store
+            sessions, total_bytes = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes + LENGTH(CAST(summary AS BLOB))), 0) FROM sessions"
+            ).fetchone()
+            messages = self._db.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+        return {
+            "sessions": sessions,
+            "messages": messages,
+            "bytes": total_bytes,
+            "evicted": self._evicted,
+            "max_sessions": self.max_sessions,
+        }
+
+
+# ---- Redis protocol ----
+class RedisSessionStore:
+    """
+    Per session a list "<prefix><session_id>:msgs" of JSON [role, content, seq]
+    items and a hash "<prefix><session_id>:summary"; seqs come from one
+    counter, "<prefix>seq", shared by all sessions. extend() WATCHes the
+    list, works out how many items fit the count and byte caps, and applies
+    RPUSH + LTRIM + PEXPIRE in one MULTI/EXEC (retried if another worker
+    wrote in between), so appends are atomic and idle sessions expire
+    server-side; history(limit=N) is an LRANGE over the last N items. The
+    session count is bounded by the server's maxmemory policy (e.g.
+    volatile-lru) rather than max_sessions.
+    """
+
+    def __init__(self, client, ttl_seconds: float = 3600, max_messages: int = 40,
+                 max_bytes: int = 64_000, prefix: str = "tourism:session:"):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max(2, max_messages)
+        self.max_bytes = max_bytes
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisSessionStore":
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("SESSION_BACKEND=redis requires the 'redis' package (pip install redis)") from e
+        return cls(redis.Redis.from_url(url, decode_responses=True), **kwargs)
+
+    # Both keys end in a type suffix, so no session ID can name another's key
+    def _key(self, session_id: str) -> str:
+        return f"{self.prefix}{session_id}:msgs"
+
+    def _summary_key(self, session_id: str) -> str:
+        return f"{self.prefix}{session_id}:summary"
+
+    @property
+    def _seq_key(self) -> str:
+        return f"{self.prefix}seq"
+
+    def _refresh(self, pipe, session_id: str) -> None:
+        """Queue the idle-TTL refresh of both keys of a session."""
+        if self.ttl_seconds > 0:
+            ttl = max(1, int(self.ttl_seconds * 1000))
+            pipe.pexpire(self._key(session_id), ttl)
+            pipe.pexpire(self._summary_key(session_id), ttl)
+
+    def history(self, session_id: str, limit: Optional[int] = None) -> List[Message]:
+        """Newest `limit` messages (all kept messages by default), oldest first."""
+        if limit is not None and limit <= 0:
+            return []
+        pipe = self.client.pipeline(transaction=False)
+        pipe.lrange(self._key(session_id), -limit if limit else 0, -1)
+        # Reading counts as activity, as in the memory store
+        self._refresh(pipe, session_id)
+        items = pipe.execute()[0]
+        return [Message(*json.loads(item)) for item in items]
+
+    def append(self, session_id: str, role: str, content: str) -> None:
+        self.extend(session_id, [Message(role, content)])
+
+    def extend(self, session_id: str, messages: List[Message]) -> None:
+        """Append messages and trim the list to the count and byte caps atomically."""
+        if not messages:
+            return
+        key = self._key(session_id)
+
+        def append_and_trim(pipe) -> None:
+            # Runs under WATCH key; redis-py retries it if the list changes.
+            # A retry draws new seqs; gaps are harmless, reuse would not be
+            current = [Message(*json.loads(item)) for item in pipe.lrange(key, -self.max_messages, -1)]
+            first = pipe.incrby(self._seq_key, len(messages)) - len(messages) + 1
+            items = [
+                json.dumps([m.role, m.content, first + i], ensure_ascii=False)
+                for i, m in enumerate(messages)
+            ]
+            kept = _newest_within((current + list(messages))[-self.max_messages:], self.max_bytes)
+            pipe.multi()
+            pipe.rpush(key, *items)
+            pipe.ltrim(key, -len(kept), -1)
+            self._refresh(pipe, session_id)
+
+        self.client.transaction(append_and_trim, key)
+
+    def revision(self, session_id: str) -> Tuple[int, str]:
+        """(seq of the newest message, summary mark), (0, "") if none. Counts as activity."""
+        pipe = self.client.pipeline(transaction=False)
+        pipe.lindex(self._key(session_id), -1)
+        pipe.hget(self._summary_key(session_id), "mark")
+        self._refresh(pipe, session_id)
+        newest, mark = pipe.execute()[:2]
+        if newest is None:
+            return 0, ""
+        return Message(*json.loads(newest)).seq, mark or ""
+
+    def summary(self, session_id: str) -> Tuple[str, str]:
+        """(summary text, mark of the last folded message); empty if none."""
+        text, mark = self.client.hmget(self._summary_key(session_id), "text", "mark")
+        return text or "", mark or ""
+
+    def set_summary(self, session_id: str, text: str, mark: str) -> None:
+        key = self._key(session_id)
+
+        def write(pipe) -> None:
+            # Under WATCH key: a session whose messages expired (or were
+            # deleted) meanwhile gets no orphaned summary key
+            if not pipe.exists(key):
+                return
+            pipe.multi()
+            pipe.hset(self._summary_key(session_id), mapping={"text": text, "mark": mark})
+            self._refresh(pipe, session_id)
+
+        self.client.transaction(write, key)
+
+    def delete(self, session_id: str) -> bool:
+        return self.client.delete(self._key(session_id), self._summary_key(session_id)) > 0
+
+    def stats(self) -> Dict[str, int]:
+        # SCAN walks the keyspace; fine for a monitoring endpoint, not a hot path
+        keys = list(self.client.scan_iter(match=f"{self.prefix}*:msgs", count=1000))
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.lrange(key, 0, -1)
+            pipe.hstrlen(key[:-len(":msgs")] + ":summary", "text")
+        replies = pipe.execute() if keys else []
+        # Stored sizes, counted like the other stores: message text plus summary
+        lists, summaries = replies[0::2], replies[1::2]
+        messages = [Message(*json.loads(item)) for items in lists for item in items]
+        return {
+            "sessions": len(keys),
+            "messages": len(messages),
+            "bytes": sum(m.size for m in messages) + sum(summaries),
+        }
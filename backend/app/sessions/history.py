@@ -0,0 +1,146 @@
+# app/sessions/history.py
+"""
+Token-budgeted chat history for the prompt.
+
+Only the newest turns are sent verbatim: at most keep_turns turns, and only
+as many as fit in token_budget together with the summary. Turns that fall out
+of that window are folded into a rolling summary by the LLM, incrementally
+and in the background after each answer, so prompt size and time-to-first-
+token stay flat however long the conversation gets. The summary lives in the
+session store next to the messages, so every worker sees the same one.
+
+The rendered string is cached per session under the store's revision (seq
+of the newest message and summary mark). An append or summary update from
+any worker changes the revision, so a cache hit costs one small read.
+"""
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+from app.admission import Admit
+from app.qdrant.embedding_executor import count_tokens
+from app.sessions.store import Message, render_history
+
+logger = logging.getLogger(__name__)
+
+# (previous summary, transcript of turns to fold) -> new summary, "" on failure
+Summarizer = Callable[[str, str], Awaitable[str]]
+
+
+@lru_cache(maxsize=8192)
+def _tokens(text: str) -> int:
+    # Each message is counted once, not once per request
+    return count_tokens(text)
+
+
+def _message_tokens(message: Message) -> int:
+    return _tokens(message.content) + 3  # role label and line break
+
+
+class HistoryManager:
+    """Renders a session's history for the prompt and maintains its summary."""
+
+    def __init__(self, store, summarize: Optional[Summarizer] = None,
+                 token_budget: int = 1500, keep_turns: int = 6, cache_size: int = 1024,
+                 admit: Optional[Admit] = None):
+        self.store = store
+        self.summarize = summarize
+        # LLM slot for each summary call (see app/admission.py)
+        self.admit = admit
+        self.token_budget = token_budget
+        self.keep_messages = max(1, keep_turns) * 2
+        self.cache_size = max(0, cache_size)
+        # session_id -> (store revision, rendered string)
+        self._cache: "OrderedDict[str, Tuple[Tuple[int, str], str]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._folding: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _window_start(self, messages: List[Message], summary: str) -> int:
+        """Index of the oldest message that still fits the verbatim window."""
+        used = _tokens(summary) if summary else 0
+        start = len(messages)
+        for i in range(len(messages) - 1, max(len(messages) - self.keep_messages, 0) - 1, -1):
+            used += _message_tokens(messages[i])
+            if used > self.token_budget:
+                break
+            start = i
+        return start
+
+    def render(self, session_id: str) -> str:
+        """
+        The chat_history string for the prompt: summary of older turns, then
+        the recent turns verbatim. Blocking; call it off the event loop.
+        """
+        # (0, "") is an empty session, or one stored before messages had seqs
+        revision = self.store.revision(session_id)
+        cacheable = self.cache_size > 0 and revision[0] > 0
+        with self._cache_lock:
+            cached = self._cache.get(session_id) if cacheable else None
+            if cached is not None and cached[0] == revision:
+                self._cache.move_to_end(session_id)
+                return cached[1]
+
+        # Only the newest keep_messages are read, and their token counts are
+        # memoized
+        summary, _ = self.store.summary(session_id)
+        messages = self.store.history(session_id, limit=self.keep_messages)
+        recent = render_history(messages[self._window_start(messages, summary):])
+        rendered = f"summary of earlier conversation: {summary}\n{recent}".rstrip("\n") if summary else recent
+
+        if cacheable:
+            with self._cache_lock:
+                # Written after a concurrent append this holds newer text under
+                # the older revision, which no later render() will match
+                self._cache[session_id] = (revision, rendered)
+                self._cache.move_to_end(session_id)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return rendered
+
+    async def fold(self, session_id: str) -> None:
+        """Summarize messages that have left the verbatim window and are not folded yet."""
+        if self.summarize is None or session_id in self._folding:
+            return
+        self._folding.add(session_id)
+        try:
+            summary, mark = await asyncio.to_thread(self.store.summary, session_id)
+            messages = await asyncio.to_thread(self.store.history, session_id)
+            tail = len(messages) - min(len(messages), self.keep_messages)
+            split = tail + self._window_start(messages[tail:], summary)
+
+            # Everything after the last folded message (by seq, so a repeated
+            # "thanks" cannot be mistaken for it) and before the window. A
+            # mark from before seqs counts everything before the window as folded
+            if mark.isdigit():
+                folded = int(mark)
+            else:
+                folded = messages[split - 1].seq if mark and split else 0
+            pending = [m for m in messages[:split] if m.seq > folded]
+            if not pending:
+                return
+
+            permit = await self.admit() if self.admit is not None else None
+            try:
+                updated = await self.summarize(summary, render_history(pending))
+            finally:
+                if permit is not None:
+                    permit.release()
+            if updated:
+                await asyncio.to_thread(self.store.set_summary, session_id, updated, str(pending[-1].seq))
+        except Exception as e:
+            logger.warning("History summary failed for session %s: %s", session_id, e)
+        finally:
+            self._folding.discard(session_id)
+
+    def fold_in_background(self, session_id: str) -> None:
+        """Schedule fold() on the running loop without delaying the response."""
+        if self.summarize is None:
+            return
+        task = asyncio.get_running_loop().create_task(self.fold(session_id))
+        # Keep a reference until done so the task is not garbage-collected
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
@@ -0,0 +1,208 @@
+# app/sessions/store.py
+"""
+Bounded chat-history storage.
+
+Sessions are kept in LRU order and evicted when idle for longer than the TTL
+or when the store holds more than max_sessions. Each session keeps only its
+most recent messages, within a message-count and byte cap, so a long-running
+process holds a bounded amount of history no matter how many session IDs
+clients invent.
+"""
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app.config.settings import (
+    SESSION_MAX_SESSIONS,
+    SESSION_TTL_SECONDS,
+    SESSION_MAX_MESSAGES,
+    SESSION_MAX_BYTES,
+    SESSION_BACKEND,
+    SESSION_SQLITE_PATH,
+    SESSION_REDIS_URL,
+)
+
+# Roles are interned so every message shares the same two string objects
+_ROLES = {role: sys.intern(role) for role in ("user", "assistant")}
+
+
+class Message:
+    """One chat turn; __slots__ keeps per-message overhead small."""
+
+    __slots__ = ("role", "content", "seq")
+
+    def __init__(self, role: str, content: str, seq: int = 0):
+        self.role = _ROLES.get(role) or sys.intern(role)
+        self.content = content
+        # Assigned by the store on append: increases with every message and
+        # is never reused, so it still identifies a message after trimming
+        self.seq = seq
+
+    @property
+    def size(self) -> int:
+        # UTF-8 payload size; what the caps and stats account for
+        return len(self.content.encode("utf-8"))
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"role": self.role, "content": self.content}
+
+
+def render_history(messages: List[Message]) -> str:
+    """Format messages the way the prompt expects ("role: content" per line)."""
+    return "\n".join(f"{m.role}: {m.content}" for m in messages)
+
+
+class _Session:
+    __slots__ = ("messages", "bytes", "touched", "summary", "summary_mark")
+
+    def __init__(self, now: float):
+        self.messages: Deque[Message] = deque()
+        self.bytes = 0
+        self.touched = now
+        # Rolling summary of older turns and the seq of the last message
+        # folded into it (see app/sessions/history.py)
+        self.summary = ""
+        self.summary_mark = ""
+
+
+class MemorySessionStore:
+    """
+    In-process session store with LRU + idle-TTL eviction and per-session caps.
+    Thread-safe; every operation is O(1) apart from trimming evicted messages.
+    """
+
+    def __init__(self, max_sessions: int = 10_000, ttl_seconds: float = 3600,
+                 max_messages: int = 40, max_bytes: int = 64_000):
+        self.max_sessions = max(1, max_sessions)
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max(2, max_messages)
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._bytes = 0
+        self._evicted = 0
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float) -> None:
+        # Oldest-touched sessions sit at the front of the OrderedDict
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            idle = now - session.touched
+            if len(self._sessions) <= self.max_sessions and (self.ttl_seconds <= 0 or idle < self.ttl_seconds):
+                return
+            self._drop(session_id)
+            self._evicted += 1
+
+    def _drop(self, session_id: str) -> None:
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._bytes -= session.bytes + len(session.summary.encode("utf-8"))
+
+    def history(self, session_id: str, limit: Optional[int] = None) -> List[Message]:
+        """Newest `limit` messages (all kept messages by default), oldest first."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                return []
+            session.touched = now
+            self._sessions.move_to_end(session_id)
+            if limit is not None:
+                return list(session.messages)[-limit:] if limit > 0 else []
+            return list(session.messages)
+
+    def append(self, session_id: str, role: str, content: str) -> None:
+        self.extend(session_id, [Message(role, content)])
+
+    def extend(self, session_id: str, messages: List[Message]) -> None:
+        """Append messages to a session in one step, then apply the caps."""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = _Session(now)
+            session.touched = now
+            self._sessions.move_to_end(session_id)
+
+            for message in messages:
+                size = message.size
+                self._seq += 1
+                session.messages.append(Message(message.role, message.content, self._seq))
+                session.bytes += size
+                self._bytes += size
+            # Keep the newest turns; the latest message always survives
+            while len(session.messages) > 1 and (
+                len(session.messages) > self.max_messages
+                or (self.max_bytes > 0 and session.bytes > self.max_bytes)
+            ):
+                size = session.messages.popleft().size
+                session.bytes -= size
+                self._bytes -= size
+            self._expire(now)
+
+    def revision(self, session_id: str) -> Tuple[int, str]:
+        """
+        (seq of the newest message, summary mark): changes with every append
+        and summary update, (0, "") for an unknown session. Counts as activity.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                return 0, ""
+            session.touched = now
+            self._sessions.move_to_end(session_id)
+            newest = session.messages[-1].seq if session.messages else 0
+            return newest, session.summary_mark
+
+    def summary(self, session_id: str) -> Tuple[str, str]:
+        """(summary text, mark of the last folded message); empty if none."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return (session.summary, session.summary_mark) if session else ("", "")
+
+    def set_summary(self, session_id: str, text: str, mark: str) -> None:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return
+            # Counted in the store total but not against the per-session message cap
+            self._bytes += len(text.encode("utf-8")) - len(session.summary.encode("utf-8"))
+            session.summary, session.summary_mark = text, mark
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            existed = session_id in self._sessions
+            self._drop(session_id)
+            return existed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                "sessions": len(self._sessions),
+                "messages": sum(len(s.messages) for s in self._sessions.values()),
+                "bytes": self._bytes,
+                "evicted": self._evicted,
+                "max_sessions": self.max_sessions,
+            }
+
+
+def store_from_settings():
+    """
+    Session store selected by SESSION_BACKEND and configured from SESSION_*.
+    Only "sqlite" and "redis" keep conversations consistent across workers.
+    """
+    caps = dict(ttl_seconds=SESSION_TTL_SECONDS, max_messages=SESSION_MAX_MESSAGES, max_bytes=SESSION_MAX_BYTES)
+    # Imported here: the shared backends build on Message from this module
+    if SESSION_BACKEND == "sqlite":
+        from app.sessions.backends import SQLiteSessionStore
+        return SQLiteSessionStore(SESSION_SQLITE_PATH, max_sessions=SESSION_MAX_SESSIONS, **caps)
+    if SESSION_BACKEND == "redis":
+        from app.sessions.backends import RedisSessionStore
+        return RedisSessionStore.from_url(SESSION_REDIS_URL, **caps)
+    return MemorySessionStore(max_sessions=SESSION_MAX_SESSIONS, **caps)
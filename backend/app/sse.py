@@ -0,0 +1,175 @@
+# app/sse.py
+"""
+Server-Sent Events framing for the streaming endpoints.
+
+An LLM emits one delta every few milliseconds, often a single character or
+word. Writing one SSE frame per delta means thousands of tiny writes per
+answer. coalesce_frames() sends the first delta immediately, so time-to-first-
+token is unchanged, then batches later deltas over a short time window or up
+to a byte threshold. It also emits keep-alive comments while the model is
+silent, so proxies don't drop a connection that is still waiting for its
+first token.
+
+until_disconnected() stops pulling frames as soon as the client goes away, so
+the model stream behind them is cancelled instead of running to completion
+for nobody.
+"""
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+import orjson
+
+KEEP_ALIVE = b": keep-alive\n\n"
+
+_END = object()
+
+
+class _Failed:
+    __slots__ = ("error",)
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class ClientDisconnected(Exception):
+    """The client went away while frames were still being produced."""
+
+
+def sse_event(event: str, data: Any) -> bytes:
+    """One `event:` frame with JSON-encoded data."""
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+def token_frame(text: str) -> bytes:
+    return sse_event("token", text)
+
+
+async def coalesce_frames(
+    tokens: AsyncIterator[str],
+    encode: Callable[[str], bytes] = token_frame,
+    window: float = 0.03,
+    max_bytes: int = 512,
+    keepalive: Optional[float] = 15.0,
+) -> AsyncIterator[bytes]:
+    """
+    Turn a stream of text deltas into encoded frames: the first delta is
+    flushed at once, later ones are joined until `window` seconds have passed
+    since the first buffered delta or `max_bytes` are buffered. An exception
+    raised by `tokens` is re-raised here after buffered text is flushed.
+    """
+    loop = asyncio.get_running_loop()
+    queue: "asyncio.Queue" = asyncio.Queue()
+
+    async def pump():
+        # Reads the producer independently so a flush timeout never has to
+        # cancel a pending __anext__ on it
+        outcome = _END
+        try:
+            async for token in tokens:
+                queue.put_nowait(token)
+        except asyncio.CancelledError as e:
+            # Only a cancel of the pump itself propagates; a CancelledError
+            # raised by the token source is reported like any other failure
+            if asyncio.current_task().cancelling():
+                raise
+            outcome = _Failed(e)
+        except Exception as e:
+            outcome = _Failed(e)
+        finally:
+            # Always wake the consumer, or it would wait on keep-alives forever
+            queue.put_nowait(outcome)
+
+    task = loop.create_task(pump())
+    buffer = []
+    size = 0
+    deadline = None
+    first = True
+    try:
+        while True:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = keepalive if deadline is None else max(0.0, deadline - loop.time())
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    if buffer:
+                        yield encode("".join(buffer))
+                        buffer, size, deadline = [], 0, None
+                    else:
+                        yield KEEP_ALIVE
+                    continue
+
+            if item is _END or isinstance(item, _Failed):
+                if buffer:
+                    yield encode("".join(buffer))
+                if item is not _END:
+                    raise item.error
+                return
+            if not item:
+                continue
+            if first:
+                first = False
+                yield encode(item)
+                continue
+
+            buffer.append(item)
+            size += len(item.encode("utf-8"))
+            if deadline is None:
+                deadline = loop.time() + window
+            if size >= max_bytes:
+                yield encode("".join(buffer))
+                buffer, size, deadline = [], 0, None
+    finally:
+        # Wait for the pump to unwind, so `tokens` is idle (and closed) by the
+        # time anyone else touches it
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+async def until_disconnected(
+    frames: AsyncIterator[bytes],
+    is_disconnected: Callable[[], Awaitable[bool]],
+    interval: float = 0.5,
+) -> AsyncIterator[bytes]:
+    """
+    Pass frames through while polling is_disconnected() every `interval`
+    seconds. On disconnect the pending read is cancelled, which cancels the
+    producer chain down to the model stream, and ClientDisconnected is raised.
+    `interval` <= 0 disables polling.
+    """
+    if interval <= 0:
+        async for frame in frames:
+            yield frame
+        return
+
+    loop = asyncio.get_running_loop()
+
+    async def watch():
+        while not await is_disconnected():
+            await asyncio.sleep(interval)
+
+    watcher = loop.create_task(watch())
+    step = None
+    try:
+        while True:
+            step = loop.create_task(frames.__anext__())
+            await asyncio.wait((step, watcher), return_when=asyncio.FIRST_COMPLETED)
+            if not step.done():
+                step.cancel()
+                await asyncio.gather(step, return_exceptions=True)
+                raise ClientDisconnected()
+            try:
+                frame = step.result()
+            except StopAsyncIteration:
+                return
+            yield frame
+    finally:
+        watcher.cancel()
+        if step is not None and not step.done():
+            # Interrupted mid-read: the generator unwinds inside that task,
+            # which must finish before the response is torn down
+            step.cancel()
+            await asyncio.gather(step, return_exceptions=True)
+        elif hasattr(frames, "aclose"):
+            await frames.aclose()
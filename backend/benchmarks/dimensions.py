@@ -0,0 +1,205 @@
+# benchmarks/dimensions.py
+"""
+Retrieval quality and cost of shortened embeddings on our corpus.
+
+text-embedding-3 vectors shortened with the `dimensions` parameter are the
+full vectors truncated and re-normalized, so the corpus and the questions are
+embedded once at --full-dimension (through the persistent embedding cache, so
+re-runs make no API calls) and every smaller size is derived locally.
+
+For each size the report gives recall@k against the full-size top-k, exact
+search latency over the chunk matrix and the storage per vector and for the
+whole corpus. With --url the same vectors are also loaded into scratch Qdrant
+collections and searched there.
+
+Queries are benchmarks.run.QUESTIONS, any --questions file (one per line) and
+--chunk-queries opening sentences of random chunks.
+
+  python -m benchmarks.dimensions --dimensions 256,512,1024,1536 -k 5
+  python -m benchmarks.dimensions --fake     # plumbing check without Azure (recall is meaningless)
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import orjson
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from benchmarks.run import QUESTIONS
+from benchmarks.stats import summarize
+
+
+def load_chunks(root: str) -> List[str]:
+    """Chunk the corpus exactly as ingestion does."""
+    from app.config.settings import INGEST_READ_BLOCK_CHARS
+    from app.qdrant.ingest import _iter_segments, _iter_txt_files, _splitter
+
+    splitter = _splitter()
+    chunks = []
+    for path, _ in _iter_txt_files(root):
+        for segment in _iter_segments(path, INGEST_READ_BLOCK_CHARS):
+            chunks.extend(splitter.split_text(segment))
+    return chunks
+
+
+def load_queries(chunks: List[str], path: Optional[str], chunk_queries: int, seed: int) -> List[str]:
+    queries = list(QUESTIONS)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            queries.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+    rng = random.Random(seed)
+    for chunk in rng.sample(chunks, min(chunk_queries, len(chunks))):
+        sentence = re.split(r"(?<=[.!?])\s", chunk.strip(), maxsplit=1)[0]
+        if len(sentence) > 20:
+            queries.append(sentence[:300])
+    return queries
+
+
+def build_embeddings(args):
+    from app.qdrant.embedding_cache import CachedEmbeddings
+
+    if args.fake:
+        from benchmarks.fakes import FakeEmbeddings
+
+        return CachedEmbeddings(FakeEmbeddings(args.full_dimension), "fake-embeddings", args.full_dimension)
+
+    from langchain_openai import AzureOpenAIEmbeddings
+
+    from app.config.settings import EMBEDDING_CACHE_PATH
+    from app.qdrant.retrieval import request_dimensions
+
+    deployment = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
+    azure = AzureOpenAIEmbeddings(
+        model=deployment,
+        dimensions=request_dimensions(deployment, args.full_dimension),
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_key=os.getenv("AZURE_OPENAI_EMBEDDING_KEY"),
+        openai_api_version=os.getenv("AZURE_OPENAI_EMBEDDING_API_VERSION"),
+        max_retries=0,  # the EmbeddingExecutor owns retries
+    )
+    return CachedEmbeddings(azure, deployment, args.full_dimension, path=EMBEDDING_CACHE_PATH or None)
+
+
+def shorten(matrix: np.ndarray, dimension: int) -> np.ndarray:
+    """What the API returns for `dimensions=dimension`: truncate, then re-normalize."""
+    short = np.ascontiguousarray(matrix[:, :dimension])
+    norms = np.linalg.norm(short, axis=1, keepdims=True)
+    return short / np.where(norms == 0, 1, norms)
+
+
+def top_k(docs: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ docs.T
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+def qdrant_latency(url: str, docs: np.ndarray, queries: np.ndarray, k: int) -> Dict:
+    """Load docs into a scratch collection and time k-NN queries against it."""
+    from qdrant_client import QdrantClient
+    from qdrant_client.models import PointStruct
+
+    from app.config.settings import QDRANT_PROFILE
+    from app.qdrant.backends import CollectionProfile, ensure_collection
+
+    client = QdrantClient(url=url, timeout=120)
+    name = f"bench_dimensions_{uuid.uuid4().hex[:8]}"
+    ensure_collection(client, name, docs.shape[1], CollectionProfile.parse(QDRANT_PROFILE))
+    try:
+        for i in range(0, len(docs), 256):
+            client.upsert(
+                collection_name=name,
+                points=[PointStruct(id=j, vector=docs[j].tolist()) for j in range(i, min(len(docs), i + 256))],
+                wait=True,
+            )
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            client.query_points(collection_name=name, query=query.tolist(), limit=k)
+            latencies.append(time.perf_counter() - start)
+        return summarize(latencies, 1000)
+    finally:
+        client.delete_collection(name)
+
+
+def main(argv=None) -> Dict:
+    from app.qdrant.embedding_executor import executor_from_settings
+
+    parser = argparse.ArgumentParser(description="Recall and latency of shortened embeddings")
+    parser.add_argument("--data-dir", default=str(BACKEND_DIR / "data"), help="corpus of .txt files")
+    parser.add_argument("--dimensions", default="256,512,1024,1536", help="sizes to compare")
+    parser.add_argument("--full-dimension", type=int, default=1536, help="size the corpus is embedded at")
+    parser.add_argument("-k", type=int, default=5, help="neighbours per query (recall@k)")
+    parser.add_argument("--questions", help="extra questions, one per line")
+    parser.add_argument("--chunk-queries", type=int, default=100, help="opening sentences of random chunks used as queries")
+    parser.add_argument("--repeat", type=int, default=20, help="timed passes over the queries (NumPy search)")
+    parser.add_argument("--url", help="also time searches on this Qdrant server")
+    parser.add_argument("--fake", action="store_true", help="use the hashed stand-in embeddings (no Azure)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report to this file as well as stdout")
+    args = parser.parse_args(argv)
+
+    dimensions = sorted({int(d) for d in args.dimensions.split(",") if d.strip()})
+    if dimensions[-1] > args.full_dimension:
+        parser.error("--dimensions cannot exceed --full-dimension")
+
+    chunks = load_chunks(args.data_dir)
+    queries = load_queries(chunks, args.questions, args.chunk_queries, args.seed)
+    embeddings = build_embeddings(args)
+    # Batched, concurrent and 429-aware, like ingestion (EMBED_* settings)
+    executor = executor_from_settings(embeddings)
+    start = time.perf_counter()
+    doc_matrix = np.asarray(executor.embed(chunks), dtype=np.float32)
+    query_matrix = np.asarray(executor.embed(queries), dtype=np.float32)
+    embed_seconds = time.perf_counter() - start
+
+    k = min(args.k, len(chunks))
+    reference = [set(row.tolist()) for row in top_k(shorten(doc_matrix, args.full_dimension),
+                                                      shorten(query_matrix, args.full_dimension), k)]
+    results = {}
+    for dimension in dimensions:
+        docs, qs = shorten(doc_matrix, dimension), shorten(query_matrix, dimension)
+        found = top_k(docs, qs, k)
+        recall = sum(len(ref & set(row.tolist())) for ref, row in zip(reference, found)) / (len(reference) * k)
+        latencies = []
+        for _ in range(args.repeat):
+            for query in qs:
+                start = time.perf_counter()
+                scores = docs @ query
+                np.argpartition(-scores, k - 1)[:k]
+                latencies.append(time.perf_counter() - start)
+        entry = {
+            f"recall_at_{k}": round(recall, 4),
+            "numpy_search_ms": summarize(latencies, 1000),
+            "bytes_per_vector": dimension * 4,
+            "corpus_mb": round(len(chunks) * dimension * 4 / 2**20, 3),
+            "size_vs_full": round(args.full_dimension / dimension, 2),
+        }
+        if args.url:
+            entry["qdrant_search_ms"] = qdrant_latency(args.url, docs, qs, k)
+        results[str(dimension)] = entry
+
+    report = {
+        "config": {
+            "chunks": len(chunks), "queries": len(queries), "k": k,
+            "full_dimension": args.full_dimension, "fake": args.fake,
+            "embed_seconds": round(embed_seconds, 3), "embedding_cache": embeddings.stats(),
+        },
+        "dimensions": results,
+    }
+    body = orjson.dumps(report, option=orjson.OPT_INDENT_2)
+    sys.stdout.write(body.decode() + "\n")
+    if args.output:
+        Path(args.output).write_bytes(body + b"\n")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# benchmarks/fakes.py
+"""
+Deterministic local stand-ins for the Azure models, so the pipeline can be
+benchmarked without network access or quota.
+
+FakeEmbeddings hashes words into a fixed-size vector (texts that share words
+get similar vectors, so retrieval still returns sensible chunks).
+FakeStreamingChatModel streams a fixed-length answer after a configurable
+first-token delay at a configurable token rate.
+"""
+import asyncio
+import hashlib
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from app.qdrant.bm25 import tokenize
+
+_ANSWER_WORDS = (
+    "Rome rewards slow travel: start early at the Colosseum, walk the Forum and "
+    "Palatine Hill, then cross to Trastevere for lunch. Book the Vatican Museums "
+    "ahead, keep an afternoon for Villa Borghese and end the day near the Pantheon."
+).split()
+
+
+def _word_slot(word: str, dimension: int):
+    digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+    value = int.from_bytes(digest, "little")
+    return value % dimension, 1.0 if (value >> 32) & 1 else -1.0
+
+
+class FakeEmbeddings(Embeddings):
+    """Feature-hashed bag of words; `latency` seconds are slept per call."""
+
+    def __init__(self, dimension: int = 1536, latency: float = 0.0):
+        self.dimension = dimension
+        self.latency = latency
+        self.calls = 0
+        self.texts = 0
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in tokenize(text):
+            slot, sign = _word_slot(word, self.dimension)
+            vector[slot] += sign
+        norm = float(np.linalg.norm(vector))
+        if norm == 0.0:
+            vector[0] = norm = 1.0
+        return (vector / norm).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts += len(texts)
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts += len(texts)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class FakeStreamingChatModel(BaseChatModel):
+    """Streams `answer_tokens` words, the first after `first_token_delay` seconds."""
+
+    tokens_per_second: float = 50.0
+    first_token_delay: float = 0.3
+    answer_tokens: int = 200
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-streaming-chat"
+
+    def _tokens(self) -> List[str]:
+        words = [_ANSWER_WORDS[i % len(_ANSWER_WORDS)] for i in range(self.answer_tokens)]
+        return [words[0]] + [" " + w for w in words[1:]] if words else []
+
+    def _interval(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        text = "".join(chunk.message.content for chunk in self._stream(messages, stop, run_manager))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_delay)
+        interval = self._interval()
+        for i, token in enumerate(self._tokens()):
+            if i and interval:
+                time.sleep(interval)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Any = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.first_token_delay)
+        interval = self._interval()
+        for i, token in enumerate(self._tokens()):
+            if i and interval:
+                await asyncio.sleep(interval)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
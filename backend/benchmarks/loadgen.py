@@ -0,0 +1,241 @@
+# benchmarks/loadgen.py
+"""
+Load generator and trace replay for POST /chat/stream.
+
+Opens --users concurrent virtual tourists. Each one holds multi-turn
+conversations (one session_id per conversation, so history and summaries are
+exercised) with a think time between turns, until --duration has passed or
+--conversations have been started. Questions come from a replay file:
+
+  *.txt    one question per line ("#" comments allowed); conversations draw
+           --turns random questions in a language picked from --languages
+  *.jsonl  {"message": ..., "language": ..., "session_id": ...} per line;
+           lines sharing a session_id are replayed in order as one
+           conversation, lines without one are single-turn questions
+
+While the load runs, GET /health/live is probed at a fixed interval: its
+latency rises when the event loop is blocked or the threadpool is saturated,
+before answer latency makes the problem obvious.
+
+The report (JSON on stdout) has TTFT, inter-token latency (the gap between
+SSE token frames, which the server coalesces) and full-response percentiles,
+overall and per language, plus error counts by kind.
+
+  python -m benchmarks.serve --port 8000 &                 # API with local model stand-ins
+  python -m benchmarks.loadgen --url http://127.0.0.1:8000 --users 50 --duration 60
+"""
+import argparse
+import asyncio
+import collections
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import orjson
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.run import QUESTIONS
+from benchmarks.sse_client import StreamResult, stream_chat
+from benchmarks.stats import summarize
+
+# (message, language or None)
+Turn = Tuple[str, Optional[str]]
+
+
+def load_replay(path: Optional[str]) -> Tuple[List[str], List[List[Turn]]]:
+    """Return (question pool, recorded conversations) from a replay file."""
+    if not path:
+        return list(QUESTIONS), []
+    questions: List[str] = []
+    sessions: Dict[str, List[Turn]] = collections.OrderedDict()
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if not path.endswith(".jsonl"):
+                questions.append(line)
+                continue
+            entry = orjson.loads(line)
+            turn = (entry["message"], entry.get("language"))
+            if entry.get("session_id"):
+                sessions.setdefault(str(entry["session_id"]), []).append(turn)
+            else:
+                questions.append(turn[0])
+                sessions.setdefault(f"single-{len(sessions)}", []).append(turn)
+    conversations = list(sessions.values())
+    pool = questions or [message for conversation in conversations for message, _ in conversation]
+    if not pool:
+        raise SystemExit(f"No questions found in {path}")
+    return pool, conversations
+
+
+def parse_languages(spec: str) -> Tuple[List[str], List[float]]:
+    """'en:3,ar:1' -> (['en', 'ar'], [3.0, 1.0]); a bare code has weight 1."""
+    codes, weights = [], []
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        code, _, weight = part.partition(":")
+        codes.append(code.strip())
+        weights.append(float(weight) if weight else 1.0)
+    return codes, weights
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.url = args.url.rstrip("/")
+        self.rng = random.Random(args.seed)
+        self.pool, self.recorded = load_replay(args.replay)
+        self.languages, self.weights = parse_languages(args.languages)
+        self.results: List[Tuple[str, int, StreamResult]] = []  # (language, turn, result)
+        self.probes: List[float] = []
+        self.probe_errors = 0
+        self.started = 0
+        self.active = 0
+        self.deadline = 0.0
+
+    def _next_conversation(self) -> Optional[List[Turn]]:
+        if self.args.conversations and self.started >= self.args.conversations:
+            return None
+        if time.monotonic() >= self.deadline:
+            return None
+        self.started += 1
+        if self.recorded:
+            return self.recorded[(self.started - 1) % len(self.recorded)]
+        language = self.rng.choices(self.languages, self.weights)[0]
+        return [(self.rng.choice(self.pool), language) for _ in range(self.args.turns)]
+
+    async def user(self, client, index: int) -> None:
+        # Stagger arrivals over the ramp-up period
+        await asyncio.sleep(self.args.ramp_up * index / max(1, self.args.users))
+        while True:
+            conversation = self._next_conversation()
+            if conversation is None:
+                return
+            session_id = f"loadgen-{uuid.uuid4().hex}"
+            self.active += 1
+            try:
+                for turn, (message, language) in enumerate(conversation):
+                    language = language or self.languages[0]
+                    payload = {"message": message, "session_id": session_id, "language": language}
+                    result = await stream_chat(client, f"{self.url}/chat/stream", payload)
+                    self.results.append((language, turn, result))
+                    if result.error or turn == len(conversation) - 1:
+                        break
+                    if self.args.think_time > 0:
+                        await asyncio.sleep(self.rng.expovariate(1.0 / self.args.think_time))
+            finally:
+                self.active -= 1
+
+    async def probe(self, client) -> None:
+        while True:
+            start = time.perf_counter()
+            try:
+                response = await client.get(f"{self.url}/health/live")
+                if response.status_code == 200:
+                    self.probes.append(time.perf_counter() - start)
+                else:
+                    self.probe_errors += 1
+            except Exception:
+                self.probe_errors += 1
+            await asyncio.sleep(self.args.probe_interval)
+
+    async def progress(self, start: float) -> None:
+        while True:
+            await asyncio.sleep(5)
+            errors = sum(1 for _, _, r in self.results if not r.ok)
+            sys.stderr.write(
+                f"t={time.perf_counter() - start:5.0f}s active={self.active} "
+                f"responses={len(self.results)} errors={errors}\n"
+            )
+
+    async def run(self) -> Dict:
+        import httpx
+
+        limits = httpx.Limits(max_connections=self.args.users + 2, max_keepalive_connections=self.args.users + 2)
+        timeout = httpx.Timeout(self.args.timeout)
+        async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+            start = time.perf_counter()
+            self.deadline = time.monotonic() + self.args.duration
+            background = [asyncio.create_task(self.progress(start))]
+            if self.args.probe_interval > 0:
+                background.append(asyncio.create_task(self.probe(client)))
+            try:
+                await asyncio.gather(*(self.user(client, i) for i in range(self.args.users)))
+            finally:
+                for task in background:
+                    task.cancel()
+                await asyncio.gather(*background, return_exceptions=True)
+            elapsed = time.perf_counter() - start
+        return self.report(elapsed)
+
+    @staticmethod
+    def _latencies(results: List[StreamResult]) -> Dict:
+        ok = [r for r in results if r.ok]
+        return {
+            "responses": len(results),
+            "errors": len(results) - len(ok),
+            "error_rate": round((len(results) - len(ok)) / len(results), 4) if results else 0.0,
+            "ttft_ms": summarize((r.ttft for r in ok), 1000),
+            "inter_token_ms": summarize((g for r in ok for g in r.gaps), 1000),
+            "response_ms": summarize((r.total for r in ok), 1000),
+        }
+
+    def report(self, elapsed: float) -> Dict:
+        all_results = [r for _, _, r in self.results]
+        by_language = collections.defaultdict(list)
+        for language, _, result in self.results:
+            by_language[language].append(result)
+        errors = collections.Counter(
+            (r.error or "no token received").split(":")[0] for r in all_results if not r.ok
+        )
+        overall = self._latencies(all_results)
+        overall.update({
+            "conversations": self.started,
+            "follow_up_turns": sum(1 for _, turn, _ in self.results if turn > 0),
+            "seconds": round(elapsed, 3),
+            "responses_per_second": round(len(all_results) / elapsed, 3) if elapsed else 0.0,
+            "error_kinds": dict(errors),
+            "liveness_probe_ms": summarize(self.probes, 1000),
+            "liveness_probe_errors": self.probe_errors,
+        })
+        return {
+            "config": {k: v for k, v in vars(self.args).items() if k != "output"},
+            "overall": overall,
+            "by_language": {lang: self._latencies(rs) for lang, rs in sorted(by_language.items())},
+        }
+
+
+def main(argv=None) -> Dict:
+    parser = argparse.ArgumentParser(description="Load generator for /chat/stream")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="API base URL")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users (open streams)")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds during which new conversations start")
+    parser.add_argument("--conversations", type=int, default=0, help="stop after this many conversations (0 = no limit)")
+    parser.add_argument("--turns", type=int, default=3, help="turns per synthetic conversation")
+    parser.add_argument("--think-time", type=float, default=2.0, help="mean seconds between turns (exponential)")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="seconds over which users start")
+    parser.add_argument("--languages", default="en:3,ar:1", help="language weights for synthetic conversations")
+    parser.add_argument("--replay", help="questions (.txt) or recorded conversations (.jsonl)")
+    parser.add_argument("--probe-interval", type=float, default=0.25, help="seconds between /health/live probes (0 disables)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for question and language choice")
+    parser.add_argument("--output", help="write the JSON report to this file as well as stdout")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(LoadTest(args).run())
+    body = orjson.dumps(report, option=orjson.OPT_INDENT_2)
+    sys.stdout.write(body.decode() + "\n")
+    if args.output:
+        Path(args.output).write_bytes(body + b"\n")
+    return report
+
+
+if __name__ == "__main__":
+    main()
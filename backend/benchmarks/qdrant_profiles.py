@@ -0,0 +1,196 @@
+# benchmarks/qdrant_profiles.py
+"""
+Recall, latency and memory of Qdrant collection profiles.
+
+Quantization and HNSW only exist on a Qdrant server (the in-process ":memory:"
+mode always searches exhaustively), so this benchmark needs one, e.g. the
+docker-compose service. For every profile a scratch collection is created
+with ensure_collection(), filled with the same vectors and, once indexed,
+queried at several hnsw_ef values. Recall@k is measured against exact
+NumPy search over the original float32 vectors.
+
+Vectors:
+  synthetic  clustered Gaussian unit vectors (--points, --dimension)
+  cache      real embeddings read from the embedding cache SQLite file
+             (EMBEDDING_CACHE_PATH), so no embedding calls are made
+
+RAM is an estimate per collection (full-precision vectors unless on disk,
+quantized vectors, HNSW links), not a measurement of the server process.
+
+  python -m benchmarks.qdrant_profiles --url http://localhost:6333 \\
+      --profile default --profile scalar --profile binary:oversampling=6 --points 50000
+"""
+import argparse
+import sqlite3
+import sys
+import time
+import uuid
+from array import array
+from dataclasses import asdict
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import orjson
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from benchmarks.stats import summarize
+
+
+def synthetic_vectors(points: int, dimension: int, seed: int) -> np.ndarray:
+    """Unit vectors around sqrt(points) random centres, like topical document clusters."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((max(8, int(points ** 0.5)), dimension)).astype(np.float32)
+    labels = rng.integers(0, len(centres), points)
+    vectors = centres[labels] + 0.6 * rng.standard_normal((points, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def cached_vectors(path: str, limit: int) -> np.ndarray:
+    """Embeddings stored by CachedEmbeddings (float32 blobs), most common dimension only."""
+    db = sqlite3.connect(path)
+    try:
+        rows = db.execute("SELECT vector FROM embeddings LIMIT ?", (limit or -1,)).fetchall()
+    finally:
+        db.close()
+    vectors: Dict[int, List[array]] = {}
+    for (blob,) in rows:
+        vector = array("f")
+        vector.frombytes(blob)
+        vectors.setdefault(len(vector), []).append(vector)
+    if not vectors:
+        raise SystemExit(f"No cached embeddings in {path}")
+    matrix = np.asarray(max(vectors.values(), key=len), dtype=np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+def make_queries(vectors: np.ndarray, count: int, seed: int) -> np.ndarray:
+    """Perturbed copies of random stored vectors: close to, but not exactly, a point."""
+    rng = np.random.default_rng(seed + 1)
+    picks = vectors[rng.integers(0, len(vectors), count)]
+    noise = rng.standard_normal(picks.shape).astype(np.float32) * (0.5 / np.sqrt(vectors.shape[1]))
+    queries = picks + noise
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def exact_neighbours(vectors: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    scores = queries @ vectors.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return [set(row.tolist()) for row in top]
+
+
+def _wait_until_indexed(client, name: str, timeout: float) -> float:
+    from qdrant_client.models import CollectionStatus
+
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if client.get_collection(name).status == CollectionStatus.GREEN:
+            break
+        time.sleep(0.5)
+    return time.perf_counter() - start
+
+
+def bench_profile(client, spec: str, vectors: np.ndarray, queries: np.ndarray,
+                  truth: List[set], args) -> Dict:
+    from qdrant_client.models import PointStruct
+
+    from app.qdrant.backends import CollectionProfile, ensure_collection
+
+    profile = CollectionProfile.parse(spec)
+    name = f"bench_profile_{uuid.uuid4().hex[:8]}"
+    points, dimension = vectors.shape
+    ensure_collection(client, name, dimension, profile)
+    try:
+        start = time.perf_counter()
+        for i in range(0, points, args.batch_size):
+            client.upsert(
+                collection_name=name,
+                points=[PointStruct(id=j, vector=vectors[j].tolist()) for j in range(i, min(points, i + args.batch_size))],
+                wait=i + args.batch_size >= points,  # the last batch waits for all earlier ones
+            )
+        upload = time.perf_counter() - start
+        indexing = _wait_until_indexed(client, name, args.index_timeout)
+        info = client.get_collection(name)
+
+        by_ef = {}
+        for ef in args.ef:
+            params = profile.search_params(hnsw_ef=ef or None)
+            latencies, hits = [], 0
+            for query, expected in zip(queries, truth):
+                start = time.perf_counter()
+                response = client.query_points(
+                    collection_name=name, query=query.tolist(), limit=args.k, search_params=params,
+                )
+                latencies.append(time.perf_counter() - start)
+                hits += len(expected & {p.id for p in response.points})
+            by_ef[str(ef or "default")] = {
+                f"recall_at_{args.k}": round(hits / (len(truth) * args.k), 4),
+                "latency_ms": summarize(latencies, 1000),
+            }
+        ram = profile.estimated_ram_bytes(points, dimension)
+        return {
+            "profile": asdict(profile),
+            "upload_seconds": round(upload, 3),
+            "indexing_seconds": round(indexing, 3),
+            "indexed_vectors": info.indexed_vectors_count,
+            "estimated_ram_mb": {key: round(value / 2**20, 2) for key, value in ram.items()},
+            "estimated_ram_total_mb": round(sum(ram.values()) / 2**20, 2),
+            "search": by_ef,
+        }
+    finally:
+        if not args.keep:
+            client.delete_collection(name)
+
+
+def main(argv=None) -> Dict:
+    from app.config.settings import EMBEDDING_CACHE_PATH, QDRANT_URL
+
+    parser = argparse.ArgumentParser(description="Compare Qdrant collection profiles")
+    parser.add_argument("--url", default=QDRANT_URL if QDRANT_URL.startswith("http") else "http://localhost:6333")
+    parser.add_argument("--profile", action="append", dest="profiles",
+                        help="profile spec as in QDRANT_PROFILE, repeatable (default: default, scalar, binary)")
+    parser.add_argument("--vectors", choices=("synthetic", "cache"), default="synthetic")
+    parser.add_argument("--cache-path", default=EMBEDDING_CACHE_PATH, help="embedding cache for --vectors cache")
+    parser.add_argument("--points", type=int, default=20000, help="vectors to index (synthetic, or a cap for cache)")
+    parser.add_argument("--dimension", type=int, default=1536, help="dimension of synthetic vectors")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10, help="neighbours per query (recall@k)")
+    parser.add_argument("--ef", type=lambda v: [int(x) for x in v.split(",")], default=[0, 32, 64, 128, 256],
+                        help="hnsw_ef values to sweep (0 = the profile's default)")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--index-timeout", type=float, default=600.0, help="seconds to wait for indexing")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch collections")
+    parser.add_argument("--output", help="write the JSON report to this file as well as stdout")
+    args = parser.parse_args(argv)
+
+    from qdrant_client import QdrantClient
+
+    if args.vectors == "cache":
+        vectors = cached_vectors(args.cache_path, args.points)
+    else:
+        vectors = synthetic_vectors(args.points, args.dimension, args.seed)
+    queries = make_queries(vectors, args.queries, args.seed)
+    truth = exact_neighbours(vectors, queries, args.k)
+
+    specs = args.profiles or ["default", "scalar", "binary"]
+    client = QdrantClient(url=args.url, timeout=120)
+    results = {spec: bench_profile(client, spec, vectors, queries, truth, args) for spec in specs}
+    report = {
+        "config": {
+            "vectors": args.vectors, "points": int(vectors.shape[0]), "dimension": int(vectors.shape[1]),
+            "queries": args.queries, "k": args.k,
+        },
+        "profiles": results,
+    }
+    body = orjson.dumps(report, option=orjson.OPT_INDENT_2)
+    sys.stdout.write(body.decode() + "\n")
+    if args.output:
+        Path(args.output).write_bytes(body + b"\n")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+# benchmarks/run.py
+"""
+Offline benchmarks for the RAG pipeline.
+
+Azure embeddings and chat are replaced by the deterministic stand-ins in
+benchmarks/fakes.py and Qdrant runs in-process (":memory:"), so results only
+reflect this code base and can be compared between commits.
+
+Suites:
+  ingest    ingest_directory() throughput on a fresh collection, plus a no-op re-run
+  retrieve  retrieve_context() latency with cold and warm query embeddings
+  diversity each DIVERSITY_MODE: distinct source files, redundancy and context
+            tokens of the top_k chunks, plus search latency
+  answer    ask_tourism_bot() time-to-first-token and throughput
+  chat      end-to-end POST /chat/stream against uvicorn under concurrency
+
+Usage (from backend/):
+  python -m benchmarks.run                               # all suites, JSON on stdout
+  python -m benchmarks.run --suites retrieve,chat --output bench.json
+  python -m benchmarks.run --baseline bench.json         # also print changes vs an earlier run
+"""
+import argparse
+import asyncio
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+import orjson
+
+# Make the backend "app" package importable when run from elsewhere
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+from benchmarks.stats import summarize
+
+SUITES = ("ingest", "retrieve", "diversity", "answer", "chat")
+
+QUESTIONS = [
+    "What should I see in Rome in 3 days?",
+    "How do I get around Italy by train?",
+    "Which festivals take place in Italy in summer?",
+    "Where is the best shopping in Milan?",
+    "What is the etiquette for tipping in Italian restaurants?",
+    "Plan a two week itinerary for a first visit to Italy",
+    "What are the most beautiful places to visit in Italy?",
+    "Is it rude to ask for a cappuccino after lunch?",
+]
+
+
+def _configure_environment(args, workdir: str) -> None:
+    """Settings are read at import time, so this runs before any app import."""
+    os.environ.update({
+        "VECTOR_BACKEND": "qdrant",
+        "QDRANT_URL": ":memory:",
+        "QDRANT_COLLECTION": "benchmark",
+        "EMBEDDING_DIMENSION": str(args.dimension),
+        "AZURE_OPENAI_EMBEDDING_DEPLOYMENT": "fake-embeddings",
+        "INGEST_MANIFEST_PATH": os.path.join(workdir, "manifest.json"),
+        "EMBEDDING_CACHE_PATH": "",
+        "AUTO_INGEST": "false",
+        "ANSWER_CACHE_ENABLED": "true" if args.answer_cache else "false",
+        "SINGLE_FLIGHT_ENABLED": "true" if args.single_flight else "false",
+        "SESSION_BACKEND": "memory",
+        "HISTORY_SUMMARY_ENABLED": "false",
+        "LOG_LEVEL": "INFO" if args.verbose else "WARNING",
+    })
+
+
+def _build_corpus(source: str, target: str, scale: int) -> int:
+    """Copy the .txt corpus `scale` times (distinct paths, so distinct chunk IDs)."""
+    files = sorted(Path(source).rglob("*.txt"))
+    for copy in range(scale):
+        for path in files:
+            dest = Path(target) / f"copy{copy:03d}" / path.relative_to(source)
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(path, dest)
+    return len(files) * scale
+
+
+def _install_fakes(args, corpus: str):
+    """Point the app's lazily built clients at the local stand-ins."""
+    from qdrant_client import QdrantClient
+
+    from app.langchain import chain as llm_chain
+    from app.langchain.prompts import prompt
+    from app.qdrant import retrieval
+    from app.qdrant.embedding_cache import CachedEmbeddings
+    from benchmarks.fakes import FakeEmbeddings, FakeStreamingChatModel
+
+    fake = FakeEmbeddings(args.dimension, latency=args.embed_latency)
+    retrieval.embeddings = CachedEmbeddings(fake, "fake-embeddings", args.dimension)
+    retrieval.client = QdrantClient(":memory:")
+    retrieval.DATA_DIR = corpus
+    llm_chain._chain = prompt | FakeStreamingChatModel(
+        tokens_per_second=args.tokens_per_second,
+        first_token_delay=args.first_token_delay,
+        answer_tokens=args.answer_tokens,
+    )
+    retrieval.init_retrieval(ingest=True)
+    return fake
+
+
+# ---- Suites ----
+def bench_ingest(args, corpus: str, workdir: str) -> Dict:
+    from qdrant_client import QdrantClient
+
+    from app.qdrant.backends import QdrantBackend
+    from app.qdrant.embedding_cache import CachedEmbeddings
+    from app.qdrant.embedding_executor import executor_from_settings
+    from app.qdrant.ingest import chunker_config_hash, ingest_directory
+    from benchmarks.fakes import FakeEmbeddings
+
+    fake = FakeEmbeddings(args.dimension, latency=args.embed_latency)
+    store = QdrantBackend(QdrantClient(":memory:"), "ingest_benchmark")
+    store.ensure(args.dimension)
+    run = dict(
+        executor=executor_from_settings(CachedEmbeddings(fake, "fake-embeddings", args.dimension)),
+        root=corpus,
+        manifest_path=os.path.join(workdir, "ingest_manifest.json"),
+        config_hash=chunker_config_hash("fake-embeddings", args.dimension),
+    )
+    chars = sum(p.stat().st_size for p in Path(corpus).rglob("*.txt"))
+
+    start = time.perf_counter()
+    stats = ingest_directory(store, **run)
+    elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ingest_directory(store, **run)
+    noop = time.perf_counter() - start
+
+    return {
+        "files": stats["files"],
+        "chunks": stats["added"],
+        "bytes": chars,
+        "seconds": round(elapsed, 4),
+        "chunks_per_second": round(stats["added"] / elapsed, 2) if elapsed else 0.0,
+        "mb_per_second": round(chars / 1e6 / elapsed, 3) if elapsed else 0.0,
+        "embedding_calls": fake.calls,
+        "noop_rerun_seconds": round(noop, 4),
+    }
+
+
+def bench_retrieve(args) -> Dict:
+    from app.qdrant import retrieval
+
+    questions = [f"{q} ({uuid.uuid4().hex[:6]})" for q in QUESTIONS]
+    cold, warm = [], []
+    for q in questions:
+        start = time.perf_counter()
+        retrieval.retrieve_context(q)
+        cold.append(time.perf_counter() - start)
+    for _ in range(args.iterations):
+        for q in questions:
+            start = time.perf_counter()
+            retrieval.retrieve_context(q)
+            warm.append(time.perf_counter() - start)
+    return {
+        "mode": retrieval.RETRIEVAL_MODE,
+        "multi_query": retrieval.MULTI_QUERY_ENABLED,
+        "chunks": retrieval.backend.count(),
+        "cold_ms": summarize(cold, 1000),
+        "warm_ms": summarize(warm, 1000),
+    }
+
+
+def bench_diversity(args) -> Dict:
+    import numpy as np
+
+    from app.qdrant import retrieval
+    from app.qdrant.diversity import DIVERSITY_MODES, source_of
+
+    def corpus_file(doc) -> str:
+        # Corpus copies hold the same files under copyNNN/; count each file once
+        return source_of(doc).split("/", 1)[-1]
+
+    store = retrieval.backend
+    configured = retrieval.DIVERSITY_MODE
+    results = {}
+    try:
+        for mode in DIVERSITY_MODES:
+            retrieval.DIVERSITY_MODE = mode
+            latencies, files, redundancy, tokens = [], [], [], []
+            for _ in range(max(1, args.iterations // 4)):
+                for q in QUESTIONS:
+                    start = time.perf_counter()
+                    query_vector, docs = retrieval.search_documents(q, args.top_k)
+                    latencies.append(time.perf_counter() - start)
+                    files.append(len({corpus_file(d) for d in docs}))
+                    tokens.append(retrieval.pack_documents(docs)[1]["tokens"])
+                    vectors = store.fetch_vectors([str(d.metadata.get("_id")) for d in docs])
+                    if len(vectors) > 1:
+                        rows = np.stack(list(vectors.values()))
+                        rows /= np.linalg.norm(rows, axis=1, keepdims=True)
+                        sims = rows @ rows.T
+                        redundancy.append(float(sims[np.triu_indices(len(rows), 1)].mean()))
+            results[mode] = {
+                "distinct_files": round(sum(files) / len(files), 3),
+                "mean_pairwise_similarity": round(sum(redundancy) / max(1, len(redundancy)), 4),
+                "context_tokens": round(sum(tokens) / len(tokens), 1),
+                "files_per_1k_tokens": round(1000 * sum(files) / max(1, sum(tokens)), 3),
+                "search_ms": summarize(latencies, 1000),
+            }
+    finally:
+        retrieval.DIVERSITY_MODE = configured
+    return {
+        "top_k": args.top_k,
+        "candidates": retrieval.DIVERSITY_CANDIDATES,
+        "mmr_lambda": retrieval.MMR_LAMBDA,
+        "modes": results,
+    }
+
+
+def bench_answer(args) -> Dict:
+    from app.langchain.rag import ask_tourism_bot
+    from app.qdrant.embedding_executor import count_tokens
+
+    ttft, throughput, totals = [], [], []
+    for q in QUESTIONS[: max(1, args.answer_questions)]:
+        start = time.perf_counter()
+        first = None
+        parts: List[str] = []
+        for token in ask_tourism_bot(q):
+            if token and first is None:
+                first = time.perf_counter()
+            parts.append(token)
+        end = time.perf_counter()
+        if first is None:
+            continue
+        tokens = count_tokens("".join(parts))
+        ttft.append(first - start)
+        totals.append(end - start)
+        if end > first and tokens > 1:
+            throughput.append((tokens - 1) / (end - first))
+    return {
+        "ttft_ms": summarize(ttft, 1000),
+        # Time to first token beyond the stand-in model's own delay
+        "ttft_overhead_ms": summarize((t - args.first_token_delay for t in ttft), 1000),
+        "tokens_per_second": summarize(throughput),
+        "total_ms": summarize(totals, 1000),
+    }
+
+
+class _Server:
+    """uvicorn serving app.main:app on an ephemeral local port, in a thread."""
+
+    def __init__(self):
+        import uvicorn
+        from app.main import app
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(("127.0.0.1", 0))
+        self.port = self.socket.getsockname()[1]
+        self.server = uvicorn.Server(uvicorn.Config(app, log_level="warning", lifespan="on"))
+        self.thread = threading.Thread(target=self.server.run, kwargs={"sockets": [self.socket]}, daemon=True)
+
+    def __enter__(self) -> str:
+        self.thread.start()
+        while not self.server.started:
+            if not self.thread.is_alive():
+                raise RuntimeError("uvicorn failed to start")
+            time.sleep(0.01)
+        return f"http://127.0.0.1:{self.port}"
+
+    def __exit__(self, *exc) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+        self.socket.close()
+
+
+async def _chat_load(base_url: str, concurrency: int, requests: int) -> Dict:
+    import httpx
+
+    from benchmarks.sse_client import stream_chat
+
+    results = []
+    pending = iter(range(requests))
+
+    async def worker(client):
+        for i in pending:
+            payload = {
+                "message": QUESTIONS[i % len(QUESTIONS)],
+                "session_id": f"bench-{uuid.uuid4().hex}",
+                "language": "en",
+            }
+            results.append(await stream_chat(client, f"{base_url}/chat/stream", payload))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(120.0), limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    ok = [r for r in results if r.ok]
+    return {
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "seconds": round(elapsed, 4),
+        "requests_per_second": round(len(results) / elapsed, 2) if elapsed else 0.0,
+        "ttft_ms": summarize((r.ttft for r in ok), 1000),
+        "inter_frame_ms": summarize((g for r in ok for g in r.gaps), 1000),
+        "total_ms": summarize((r.total for r in ok), 1000),
+        "frames_per_response": summarize(r.frames for r in ok),
+    }
+
+
+def bench_chat(args) -> Dict:
+    with _Server() as base_url:
+        return asyncio.run(_chat_load(base_url, args.concurrency, args.requests))
+
+
+# ---- Reporting ----
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                             capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or "unknown"
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+def _flatten(tree: Dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in tree.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{path}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare(baseline: Dict, current: Dict) -> List[str]:
+    """One line per metric present in both runs: old -> new (relative change)."""
+    old, new = _flatten(baseline.get("results", {})), _flatten(current.get("results", {}))
+    lines = []
+    for path in sorted(old.keys() & new.keys()):
+        before, after = old[path], new[path]
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+        lines.append(f"{path}: {before} -> {after} ({change})")
+    return lines
+
+
+def main(argv=None) -> Dict:
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the RAG pipeline")
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"comma-separated subset of {', '.join(SUITES)}")
+    parser.add_argument("--output", help="write the JSON report to this file as well as stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against (printed to stderr)")
+    parser.add_argument("--data-dir", default=str(BACKEND_DIR / "data"), help="corpus of .txt files")
+    parser.add_argument("--corpus-scale", type=int, default=4, help="copies of the corpus to ingest")
+    parser.add_argument("--dimension", type=int, default=1536, help="embedding dimension")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="seconds slept per embedding call")
+    parser.add_argument("--first-token-delay", type=float, default=0.3, help="stand-in model delay before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="stand-in model token rate (0 = unthrottled)")
+    parser.add_argument("--answer-tokens", type=int, default=200, help="tokens per stand-in answer")
+    parser.add_argument("--answer-questions", type=int, default=len(QUESTIONS), help="questions in the answer suite")
+    parser.add_argument("--answer-cache", action="store_true", help="keep the semantic answer cache enabled")
+    parser.add_argument("--single-flight", action="store_true", help="keep coalescing of identical concurrent questions enabled")
+    parser.add_argument("--iterations", type=int, default=20, help="warm passes over the questions (retrieve)")
+    parser.add_argument("--top-k", type=int, default=3, help="chunks per question (diversity)")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent streams (chat)")
+    parser.add_argument("--requests", type=int, default=64, help="total requests (chat)")
+    parser.add_argument("--verbose", action="store_true", help="show the app's INFO logs")
+    args = parser.parse_args(argv)
+
+    suites = [s.strip() for s in args.suites.split(",") if s.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suite(s): {', '.join(sorted(unknown))}")
+
+    workdir = tempfile.mkdtemp(prefix="tourism-bench-")
+    try:
+        _configure_environment(args, workdir)
+        corpus = os.path.join(workdir, "corpus")
+        files = _build_corpus(args.data_dir, corpus, max(1, args.corpus_scale))
+
+        results = {}
+        if "ingest" in suites:
+            results["ingest"] = bench_ingest(args, corpus, workdir)
+        if set(suites) - {"ingest"}:
+            # The query-path suites share one ingested in-memory collection
+            _install_fakes(args, corpus)
+            runners = {"retrieve": bench_retrieve, "diversity": bench_diversity, "answer": bench_answer,
+                       "chat": bench_chat}
+            for name in suites:
+                if name in runners:
+                    results[name] = runners[name](args)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    config = {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "verbose")}
+    config["corpus_files"] = files
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "config": config,
+        "results": results,
+    }
+    body = orjson.dumps(report, option=orjson.OPT_INDENT_2)
+    sys.stdout.write(body.decode() + "\n")
+    if args.output:
+        Path(args.output).write_bytes(body + b"\n")
+    if args.baseline:
+        baseline = orjson.loads(Path(args.baseline).read_bytes())
+        sys.stderr.write("\n".join(compare(baseline, report)) + "\n")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# benchmarks/serve.py
+"""
+Serve the API with the local stand-ins from benchmarks/fakes.py (in-process
+Qdrant, fake embeddings, fake streaming chat model) as a load-test target:
+
+  python -m benchmarks.serve --port 8000 --tokens-per-second 40 --first-token-delay 0.5
+
+Only the models are replaced; sessions, history, retrieval, context packing
+and SSE framing are the production code. A single process is started because
+the stand-ins are installed in-process.
+"""
+import argparse
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks.run import BACKEND_DIR, _build_corpus, _configure_environment, _install_fakes
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Serve the API with local model stand-ins")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--data-dir", default=str(BACKEND_DIR / "data"), help="corpus of .txt files")
+    parser.add_argument("--corpus-scale", type=int, default=1, help="copies of the corpus to ingest")
+    parser.add_argument("--dimension", type=int, default=1536, help="embedding dimension")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="seconds slept per embedding call")
+    parser.add_argument("--first-token-delay", type=float, default=0.3, help="stand-in model delay before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0, help="stand-in model token rate (0 = unthrottled)")
+    parser.add_argument("--answer-tokens", type=int, default=200, help="tokens per stand-in answer")
+    parser.add_argument("--answer-cache", action="store_true", help="keep the semantic answer cache enabled")
+    parser.add_argument("--single-flight", action="store_true", help="keep coalescing of identical concurrent questions enabled")
+    parser.add_argument("--verbose", action="store_true", help="show the app's INFO logs")
+    args = parser.parse_args(argv)
+
+    import uvicorn
+
+    workdir = tempfile.mkdtemp(prefix="tourism-serve-")
+    _configure_environment(args, workdir)
+    corpus = str(Path(workdir) / "corpus")
+    _build_corpus(args.data_dir, corpus, max(1, args.corpus_scale))
+    _install_fakes(args, corpus)
+
+    from app.main import app
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="info" if args.verbose else "warning")
+
+
+if __name__ == "__main__":
+    main()
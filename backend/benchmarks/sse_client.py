@@ -0,0 +1,79 @@
+# benchmarks/sse_client.py
+"""
+Minimal client for the /chat/stream SSE protocol that records per-frame
+timings: time to the first token frame, gaps between token frames and the
+time to the closing `meta` (or `error`) event.
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import httpx
+import orjson
+
+
+@dataclass
+class StreamResult:
+    status: int = 0
+    ttft: Optional[float] = None        # seconds to the first token frame
+    total: float = 0.0                  # seconds to the end of the stream
+    gaps: List[float] = field(default_factory=list)  # seconds between token frames
+    frames: int = 0
+    keepalives: int = 0
+    text: str = ""
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 200 and self.error is None and self.ttft is not None
+
+
+def _parse_event(block: str):
+    event, data = "message", []
+    for line in block.split("\n"):
+        if line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].lstrip(" "))
+    return event, "\n".join(data)
+
+
+async def stream_chat(client: httpx.AsyncClient, url: str, payload: Dict) -> StreamResult:
+    """POST payload to a /chat/stream URL and consume the whole event stream."""
+    result = StreamResult()
+    start = time.perf_counter()
+    last = None
+    tokens: List[str] = []
+    try:
+        async with client.stream("POST", url, json=payload) as response:
+            result.status = response.status_code
+            if response.status_code != 200:
+                await response.aread()
+                result.error = f"HTTP {response.status_code}"
+                return result
+            buffer = ""
+            async for chunk in response.aiter_text():
+                buffer += chunk
+                while "\n\n" in buffer:
+                    block, buffer = buffer.split("\n\n", 1)
+                    if block.startswith(":"):
+                        result.keepalives += 1
+                        continue
+                    event, data = _parse_event(block)
+                    now = time.perf_counter()
+                    if event == "token":
+                        result.frames += 1
+                        if last is None:
+                            result.ttft = now - start
+                        else:
+                            result.gaps.append(now - last)
+                        last = now
+                        tokens.append(orjson.loads(data) if data else "")
+                    elif event == "error":
+                        result.error = data or "error event"
+    except httpx.HTTPError as e:
+        result.error = f"{type(e).__name__}: {e}"
+    finally:
+        result.total = time.perf_counter() - start
+        result.text = "".join(tokens)
+    return result
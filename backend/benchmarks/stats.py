@@ -0,0 +1,26 @@
+# benchmarks/stats.py
+"""Summary statistics shared by the benchmark suites."""
+import math
+from typing import Dict, Iterable, Sequence
+
+
+def percentile(sorted_samples: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile (q in 0..100) of already sorted samples."""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, math.ceil(q / 100.0 * len(sorted_samples)))
+    return sorted_samples[min(rank, len(sorted_samples)) - 1]
+
+
+def summarize(samples: Iterable[float], scale: float = 1.0, digits: int = 4) -> Dict[str, float]:
+    """count, mean, p50/p90/p95/p99 and max, each multiplied by scale (e.g. 1000 for ms)."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {"count": 0}
+    summary = {"mean": sum(ordered) / len(ordered)}
+    for q in (50, 90, 95, 99):
+        summary[f"p{q}"] = percentile(ordered, q)
+    summary["max"] = ordered[-1]
+    result = {"count": len(ordered)}
+    result.update((k, round(v * scale, digits)) for k, v in summary.items())
+    return result
@@ -6,6 +6,7 @@ Run this script to populate the Qdrant database with tourism training documents.
 
 import os
 import sys
+import uuid
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -18,16 +19,22 @@ load_dotenv()
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
-from langchain_qdrant import QdrantVectorStore
 from langchain_openai import AzureOpenAIEmbeddings
 
+from app.qdrant.embedding_executor import executor_from_settings
+from app.config.settings import CHUNK_OVERLAP, CHUNK_SIZE, EMBEDDING_DIMENSION, QDRANT_PROFILE
+from app.qdrant.backends import CollectionProfile, QdrantBackend, ensure_collection
+from app.qdrant.ingest import upsert_chunks
+from app.qdrant.metadata import chunk_metadata, file_topic
+from app.qdrant.retrieval import request_dimensions
+from app.logging_config import configure_logging
+
+configure_logging()
+
 # Configuration
 DATA_DIR = Path(__file__).parent / "data"
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "tourism_docs")
-CHUNK_SIZE = 1000
-CHUNK_OVERLAP = 200
 
 def load_documents_from_files() -> list[Document]:
     """Load all .txt files from the data directory as Documents."""
@@ -71,6 +78,10 @@ def chunk_documents(documents: list[Document]) -> list[Document]:
     )
     
     chunks = splitter.split_documents(documents)
+    # Filterable destination / topic / language fields (see app/qdrant/metadata.py)
+    for chunk in chunks:
+        source = chunk.metadata["source"]
+        chunk.metadata.update(chunk_metadata(source, chunk.page_content, file_topic(source)))
     print(f"✅ Created {len(chunks)} chunks from {len(documents)} documents")
     return chunks
 
@@ -80,9 +91,12 @@ def initialize_embeddings():
     
     embeddings = AzureOpenAIEmbeddings(
         model=os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT"),
+        dimensions=request_dimensions(os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT"), EMBEDDING_DIMENSION),
         azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
         api_key=os.getenv("AZURE_OPENAI_EMBEDDING_KEY"),
-        openai_api_version=os.getenv("AZURE_OPENAI_EMBEDDING_API_VERSION")
+        openai_api_version=os.getenv("AZURE_OPENAI_EMBEDDING_API_VERSION"),
+        # The EmbeddingExecutor in ingest_to_qdrant owns retries
+        max_retries=0,
     )
     
     # Test embedding
@@ -110,12 +124,11 @@ def initialize_qdrant():
     except:
         pass
     
-    # Create collection with proper vector dimensions (1536 for text-embedding-3-small)
-    client.create_collection(
-        collection_name=QDRANT_COLLECTION,
-        vectors_config=VectorParams(size=1536, distance=Distance.COSINE),
-    )
-    print(f"✅ Collection '{QDRANT_COLLECTION}' ready")
+    # Create collection with the configured vector dimension (EMBEDDING_DIMENSION)
+    # and the storage settings of QDRANT_PROFILE
+    profile = CollectionProfile.parse(QDRANT_PROFILE)
+    ensure_collection(client, QDRANT_COLLECTION, EMBEDDING_DIMENSION, profile)
+    print(f"✅ Collection '{QDRANT_COLLECTION}' ready ({profile.quantization} quantization)")
     return client
 
 def ingest_to_qdrant(chunks: list[Document], embeddings, client):
@@ -123,15 +136,11 @@ def ingest_to_qdrant(chunks: list[Document], embeddings, client):
     print(f"\n⬆️  Ingesting {len(chunks)} chunks into Qdrant...")
     
     try:
-        # Use LangChain's QdrantVectorStore for clean integration
-        vector_store = QdrantVectorStore.from_documents(
-            documents=chunks,
-            embedding=embeddings,
-            url=QDRANT_URL,
-            collection_name=QDRANT_COLLECTION,
-        )
-        print(f"✅ Successfully ingested {len(chunks)} chunks into Qdrant")
-        return vector_store
+        # Batched, concurrent and 429-aware embedding (EMBED_* settings);
+        # payloads use the same layout as LangChain's QdrantVectorStore
+        executor = executor_from_settings(embeddings)
+        upsert_chunks(QdrantBackend(client, QDRANT_COLLECTION), chunks, [str(uuid.uuid4()) for _ in chunks], executor)
+        print(f"✅ Successfully ingested {len(chunks)} chunks into Qdrant ({executor.progress_line()})")
     except Exception as e:
         print(f"❌ Failed to ingest into Qdrant: {e}")
         raise
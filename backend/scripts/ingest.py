@@ -1,15 +1,24 @@
 from pathlib import Path
-import uuid, argparse, os
+import uuid, argparse, os, sys
 from dotenv import load_dotenv
 
+# Make the backend "app" package importable when run as scripts/ingest.py
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, Distance
-from langchain_community.vectorstores import Qdrant
 from langchain_openai import AzureOpenAIEmbeddings
 
+from app.qdrant.embedding_executor import executor_from_settings
+from app.config.settings import EMBEDDING_DIMENSION, QDRANT_PROFILE
+from app.qdrant.backends import CollectionProfile, QdrantBackend, ensure_collection
+from app.qdrant.ingest import upsert_chunks
+from app.qdrant.retrieval import request_dimensions
+from app.logging_config import configure_logging
+
 load_dotenv()
+configure_logging()
 
 QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 QDRANT_COLLECTION = os.getenv("QDRANT_COLLECTION", "tourism_uk")
@@ -40,18 +49,20 @@ def main(path: str):
         api_key=AZURE_OPENAI_API_KEY,
         api_version=AZURE_OPENAI_API_VERSION,
         azure_deployment=AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
+        dimensions=request_dimensions(AZURE_OPENAI_EMBEDDING_DEPLOYMENT, EMBEDDING_DIMENSION),
+        # The EmbeddingExecutor below owns retries
+        max_retries=0,
     )
 
     client = QdrantClient(url=QDRANT_URL)
     vec = embeddings.embed_query("test")
 
-    client.recreate_collection(
-        collection_name=QDRANT_COLLECTION,
-        vectors_config=VectorParams(size=len(vec), distance=Distance.COSINE),
-    )
+    profile = CollectionProfile.parse(QDRANT_PROFILE)
+    ensure_collection(client, QDRANT_COLLECTION, len(vec), profile, recreate=True)
 
-    vs = Qdrant(client, QDRANT_COLLECTION, embeddings)
-    vs.add_documents(chunks, ids=[str(uuid.uuid4()) for _ in chunks])
+    # Batched, concurrent and 429-aware embedding (EMBED_* settings)
+    executor = executor_from_settings(embeddings)
+    upsert_chunks(QdrantBackend(client, QDRANT_COLLECTION, profile=profile), chunks, [str(uuid.uuid4()) for _ in chunks], executor)
     print(f"Ingested {len(chunks)} chunks into {QDRANT_COLLECTION}")
 
 if __name__ == "__main__":
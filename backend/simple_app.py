@@ -2,8 +2,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from fastapi.responses import StreamingResponse
-import json
-import asyncio
+from starlette.concurrency import iterate_in_threadpool
 import os
 from datetime import date
 from dotenv import load_dotenv
@@ -11,6 +10,8 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+from app.sse import coalesce_frames, sse_event
+
 app = FastAPI(title="Tourism Chatbot API")
 
 # Add CORS middleware
@@ -30,7 +31,7 @@ conversations = {}
 try:
     from langchain_openai import AzureChatOpenAI
     from app.langchain.prompts import prompt
-    from app.qdrant.retrieval import retrieve_context
+    from app.qdrant.retrieval import aretrieve_context
     llm_available = True
 except Exception as e:
     print(f"⚠️  LangChain/Azure OpenAI not available: {e}")
@@ -108,38 +109,41 @@ async def chat_stream(request: ChatRequest):
     history = sessions.get(session_id, [])
     chat_history = "\n".join([f"{m['role']}: {m['content']}" for m in history])
     
+    response_parts = []
+
+    async def answer():
+        if llm_available and llm:
+            # Try to retrieve context from Qdrant
+            try:
+                context = await aretrieve_context(question, chat_history=chat_history)
+            except Exception as e:
+                print(f"⚠️  Could not retrieve context from Qdrant: {e}")
+                context = ""
+
+            # Get response from LLM; the blocking stream runs in the threadpool
+            tokens = iterate_in_threadpool(stream_answer_with_llm(
+                question=question,
+                context=context,
+                chat_history=chat_history,
+                current_date=str(date.today()),
+                language=language
+            ))
+            async for token in tokens:
+                response_parts.append(token)
+                yield token
+        else:
+            # Fallback: Use simple keyword-based responses
+            response_parts.append(get_fallback_response(question))
+            yield response_parts[-1]
+
     async def event_stream():
         """Stream response in SSE format"""
         try:
-            if llm_available and llm:
-                # Try to retrieve context from Qdrant
-                try:
-                    context = retrieve_context(question)
-                except Exception as e:
-                    print(f"⚠️  Could not retrieve context from Qdrant: {e}")
-                    context = ""
-                
-                # Get response from LLM
-                response_text = ""
-                for token in stream_answer_with_llm(
-                    question=question,
-                    context=context,
-                    chat_history=chat_history,
-                    current_date=str(date.today()),
-                    language=language
-                ):
-                    response_text += token
-                    # Stream each character
-                    for char in token:
-                        yield f"event: token\ndata: {char}\n\n"
-                        await asyncio.sleep(0.01)
-            else:
-                # Fallback: Use simple keyword-based responses
-                response_text = get_fallback_response(question)
-                for char in response_text:
-                    yield f"event: token\ndata: {char}\n\n"
-                    await asyncio.sleep(0.01)
-            
+            # Tokens are coalesced into JSON-encoded frames, first one at once
+            async for frame in coalesce_frames(answer()):
+                yield frame
+            response_text = "".join(response_parts)
+
             # Update history
             history.append({"role": "user", "content": question})
             history.append({"role": "assistant", "content": response_text})
@@ -152,11 +156,11 @@ async def chat_stream(request: ChatRequest):
                     {"title": "Tourism", "source": "Italian Tourism Board"}
                 ]
             }
-            yield f"event: meta\ndata: {json.dumps(sources_data)}\n\n"
+            yield sse_event("meta", sources_data)
             
         except Exception as e:
             print(f"❌ Error in chat_stream: {e}")
-            yield f"event: token\ndata: Error: {str(e)}\n\n"
+            yield sse_event("token", f"Error: {str(e)}")
     
     return StreamingResponse(event_stream(), media_type="text/event-stream")
 
@@ -193,70 +197,3 @@ async def delete_conversation(conversation_id: str):
     except Exception as e:
         return {"success": False, "message": str(e)}
 
-
-
-
-@app.post("/chat/stream")
-async def chat_stream(request: ChatRequest):
-    """Main chat endpoint with streaming using RAG + LLM"""
-    
-    session_id = request.session_id
-    question = request.message
-    language = request.language or "en"
-    
-    # Get history
-    history = sessions.get(session_id, [])
-    chat_history = "\n".join([f"{m['role']}: {m['content']}" for m in history])
-    
-    async def event_stream():
-        """Stream response in SSE format"""
-        try:
-            if llm_available and llm:
-                # Try to retrieve context from Qdrant
-                try:
-                    context = retrieve_context(question)
-                except Exception as e:
-                    print(f"⚠️  Could not retrieve context from Qdrant: {e}")
-                    context = ""
-                
-                # Get response from LLM
-                response_text = ""
-                for token in stream_answer_with_llm(
-                    question=question,
-                    context=context,
-                    chat_history=chat_history,
-                    current_date=str(date.today()),
-                    language=language
-                ):
-                    response_text += token
-                    # Stream each character
-                    for char in token:
-                        yield f"event: token\ndata: {char}\n\n"
-                        await asyncio.sleep(0.01)
-            else:
-                # Fallback: Use simple keyword-based responses
-                response_text = get_fallback_response(question)
-                for char in response_text:
-                    yield f"event: token\ndata: {char}\n\n"
-                    await asyncio.sleep(0.01)
-            
-            # Update history
-            history.append({"role": "user", "content": question})
-            history.append({"role": "assistant", "content": response_text})
-            sessions[session_id] = history
-            
-            # Send metadata with sources
-            sources_data = {
-                "sources": [
-                    {"title": "Travel Guide", "source": "Italy Information"},
-                    {"title": "Tourism", "source": "Italian Tourism Board"}
-                ]
-            }
-            yield f"event: meta\ndata: {json.dumps(sources_data)}\n\n"
-            
-        except Exception as e:
-            print(f"❌ Error in chat_stream: {e}")
-            yield f"event: token\ndata: Error: {str(e)}\n\n"
-    
-    return StreamingResponse(event_stream(), media_type="text/event-stream")
-
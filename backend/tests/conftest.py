@@ -0,0 +1,6 @@
+# tests/conftest.py
+import sys
+from pathlib import Path
+
+# Make the backend "app" package importable when pytest runs from elsewhere
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
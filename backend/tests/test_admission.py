@@ -0,0 +1,108 @@
+# tests/test_admission.py
+import asyncio
+
+import pytest
+
+from app.admission import AdmissionController, Overloaded
+
+
+def _run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, 5.0))
+
+
+def test_full_queue_is_shed_with_a_retry_after_hint():
+    async def run():
+        controller = AdmissionController(1, 1, 10.0)
+        held = await controller.acquire()
+        queued = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as shed:
+            await controller.acquire()
+        held.release()
+        (await queued).release()
+        return controller, shed.value
+
+    controller, error = _run(run())
+    assert error.reason == "queue_full"
+    assert error.retry_after >= 1
+    assert controller.rejected["queue_full"] == 1
+    assert controller.active == 0 and controller.waiting == 0
+
+
+def test_wait_beyond_the_queue_timeout_is_shed():
+    async def run():
+        controller = AdmissionController(1, 4, 0.05)
+        held = await controller.acquire()
+        with pytest.raises(Overloaded) as shed:
+            await controller.acquire()
+        held.release()
+        # The timed-out waiter left no trace: the slot is usable straight away
+        (await asyncio.wait_for(controller.acquire(), 0.1)).release()
+        return controller, shed.value
+
+    controller, error = _run(run())
+    assert error.reason == "queue_timeout"
+    assert controller.rejected["queue_timeout"] == 1
+    assert controller.waiting == 0 and controller.active == 0
+
+
+def test_cancelled_waiters_and_holders_give_their_slot_back():
+    async def run():
+        controller = AdmissionController(1, 4, 10.0)
+        held = await controller.acquire()
+
+        # Cancelled while queued
+        waiter = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+        # Granted the slot and cancelled in the same loop iteration
+        granted = asyncio.ensure_future(controller.acquire())
+        await asyncio.sleep(0)
+        held.release()
+        granted.cancel()
+        await asyncio.gather(granted, return_exceptions=True)
+
+        # Cancelled while holding a permit, released on the way out
+        async def generate():
+            permit = await controller.acquire()
+            try:
+                await asyncio.sleep(10)
+            finally:
+                permit.release()
+
+        holder = asyncio.ensure_future(generate())
+        await asyncio.sleep(0.01)
+        holder.cancel()
+        await asyncio.gather(holder, return_exceptions=True)
+
+        (await asyncio.wait_for(controller.acquire(), 0.1)).release()
+        return controller
+
+    controller = _run(run())
+    assert controller.active == 0 and controller.waiting == 0
+    assert controller._free == 1
+
+
+def test_background_calls_wait_behind_queued_requests():
+    async def run():
+        controller = AdmissionController(1, 4, 10.0)
+        held = await controller.acquire()
+        order = []
+
+        async def take(name, background=False):
+            permit = await controller.acquire(background=background)
+            order.append(name)
+            permit.release()
+
+        summary = asyncio.ensure_future(take("summary", background=True))
+        await asyncio.sleep(0)
+        answer = asyncio.ensure_future(take("answer"))
+        await asyncio.sleep(0)
+        assert controller.waiting == 1  # background calls are not queue depth
+        held.release()
+        await asyncio.gather(summary, answer)
+        return order
+
+    assert _run(run()) == ["answer", "summary"]
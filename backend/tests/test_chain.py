@@ -0,0 +1,60 @@
+# tests/test_chain.py
+import asyncio
+
+from app.langchain import chain
+
+
+class _Chunk:
+    def __init__(self, content):
+        self.content = content
+
+
+class _BrokenChain:
+    """Streams a few chunks, then fails like a dropped model connection."""
+
+    def stream(self, _input):
+        yield _Chunk("Rome is")
+        raise ConnectionError("model went away")
+
+    async def astream(self, _input):
+        yield _Chunk("Rome is")
+        raise ConnectionError("model went away")
+
+
+class _Chain(_BrokenChain):
+    def stream(self, _input):
+        yield _Chunk("Rome is lovely")
+
+    async def astream(self, _input):
+        yield _Chunk("Rome is lovely")
+
+
+ARGS = dict(question="q", context="", chat_history="", current_date="2026-01-01")
+
+
+def _astream(status):
+    async def run():
+        return [t async for t in chain.astream_answer(**ARGS, status=status)]
+    return asyncio.run(run())
+
+
+def test_failed_stream_is_not_marked_completed(monkeypatch):
+    monkeypatch.setattr(chain, "_chain", _BrokenChain())
+    status = chain.StreamStatus()
+    assert "".join(chain.stream_answer(**ARGS, status=status)) == "Rome is"
+    assert not status.completed
+
+    status = chain.StreamStatus()
+    assert "".join(_astream(status)) == "Rome is"
+    assert not status.completed
+
+
+def test_clean_stream_is_marked_completed(monkeypatch):
+    monkeypatch.setattr(chain, "_chain", _Chain())
+    status = chain.StreamStatus()
+    assert "".join(chain.stream_answer(**ARGS, status=status)) == "Rome is lovely"
+    assert status.completed
+
+    status = chain.StreamStatus()
+    assert "".join(_astream(status)) == "Rome is lovely"
+    assert status.completed
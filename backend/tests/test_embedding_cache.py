@@ -0,0 +1,57 @@
+# tests/test_embedding_cache.py
+import asyncio
+import threading
+
+from langchain_core.embeddings import Embeddings
+
+from app.qdrant.embedding_cache import CachedEmbeddings
+
+
+class _Counting(Embeddings):
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts):
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text):
+        return self.embed_query(text)
+
+
+def test_async_lookups_use_the_disk_tier_off_the_event_loop(tmp_path, monkeypatch):
+    path = str(tmp_path / "embeddings.db")
+    inner = _Counting()
+    first = CachedEmbeddings(inner, "d", 2, path=path)
+    assert asyncio.run(first.aembed_documents(["Rome", "Milan", "Rome"])) == [
+        [4.0, 1.0], [5.0, 1.0], [4.0, 1.0],
+    ]
+    assert inner.calls == [["Rome", "Milan"]]
+
+    # A fresh instance has an empty memory tier, so these come from SQLite
+    second = CachedEmbeddings(inner, "d", 2, path=path)
+    loop_thread = []
+    disk_threads = []
+    from_disk = second._from_disk
+
+    def spy(keys):
+        disk_threads.append(threading.get_ident())
+        return from_disk(keys)
+
+    monkeypatch.setattr(second, "_from_disk", spy)
+
+    async def run():
+        loop_thread.append(threading.get_ident())
+        return await second.aembed_query("Milan"), await second.aembed_query("Milan")
+
+    assert asyncio.run(run()) == ([5.0, 1.0], [5.0, 1.0])
+    assert inner.calls == [["Rome", "Milan"]]
+    assert disk_threads and loop_thread[0] not in disk_threads
+    assert second.stats()["hits_disk"] == 1
+    assert second.stats()["hits_memory"] == 1
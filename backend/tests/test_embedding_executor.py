@@ -0,0 +1,68 @@
+# tests/test_embedding_executor.py
+from langchain_core.embeddings import Embeddings
+
+from app.qdrant.embedding_cache import CachedEmbeddings
+from app.qdrant.embedding_executor import EmbeddingExecutor, count_tokens
+
+
+class _Counting(Embeddings):
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class _Bucket:
+    def __init__(self):
+        self.charged = 0
+
+    def acquire(self, tokens):
+        self.charged += tokens
+
+
+def test_only_cache_misses_are_embedded_and_charged(tmp_path):
+    inner = _Counting()
+    cache = CachedEmbeddings(inner, "d", 2, path=str(tmp_path / "embeddings.db"))
+    cache.embed_documents(["Rome", "Milan"])
+    inner.calls.clear()
+
+    executor = EmbeddingExecutor(cache, batch_size=2, max_in_flight=2)
+    executor.bucket = _Bucket()
+    texts = ["Rome", "Venice", "Milan", "Venice", "Florence"]
+    assert executor.embed(texts) == [[float(len(t)), 1.0] for t in texts]
+
+    assert sorted(t for call in inner.calls for t in call) == ["Florence", "Venice"]
+    assert executor.bucket.charged == count_tokens("Venice") + count_tokens("Florence")
+    assert executor.progress_line().startswith("5/5 chunks")
+
+    # The misses were cached, so a second pass charges nothing
+    inner.calls.clear()
+    executor.embed(texts)
+    assert inner.calls == []
+    assert executor.bucket.charged == count_tokens("Venice") + count_tokens("Florence")
+
+
+class _RateLimited(Exception):
+    status_code = 429
+
+
+def test_a_retried_batch_is_charged_once():
+    inner = _Counting()
+    failures = [_RateLimited(), _RateLimited()]
+    embed_documents = inner.embed_documents
+
+    def flaky(texts):
+        if failures:
+            raise failures.pop()
+        return embed_documents(texts)
+
+    inner.embed_documents = flaky
+    executor = EmbeddingExecutor(inner, batch_size=8, base_delay=0.001, max_retries=3)
+    executor.bucket = _Bucket()
+    assert executor.embed(["Rome", "Milan"]) == [[4.0, 1.0], [5.0, 1.0]]
+    assert executor.bucket.charged == count_tokens("Rome") + count_tokens("Milan")
@@ -0,0 +1,115 @@
+# tests/test_history.py
+import asyncio
+
+from app.sessions.history import HistoryManager, _message_tokens, _tokens
+from app.sessions.store import MemorySessionStore, Message
+
+
+def _turns(store, session_id, *pairs):
+    for question, answer in pairs:
+        store.extend(session_id, [Message("user", question), Message("assistant", answer)])
+
+
+class _Recorder:
+    """Summarizer stand-in: appends each folded transcript to the summary."""
+
+    def __init__(self):
+        self.transcripts = []
+
+    async def __call__(self, summary, transcript):
+        self.transcripts.append(transcript)
+        return f"{summary} | {transcript}".strip(" |")
+
+
+def test_render_keeps_the_newest_turns_within_the_token_budget():
+    store = MemorySessionStore()
+    _turns(store, "s", *[(f"question {i} " + "word " * 20, f"answer {i} " + "word " * 20) for i in range(6)])
+    per_message = _message_tokens(store.history("s")[-1])
+    manager = HistoryManager(store, token_budget=per_message * 3, keep_turns=6)
+
+    rendered = manager.render("s")
+    lines = rendered.splitlines()
+    assert len(lines) == 3
+    assert lines[0].startswith("assistant: answer 4")
+    assert lines[-1].startswith("assistant: answer 5")
+    assert "question 0" not in rendered
+
+
+def test_render_counts_the_summary_against_the_budget():
+    store = MemorySessionStore()
+    _turns(store, "s", ("Rome?", "The Colosseum."), ("Trains?", "Frecciarossa."))
+    summary = "asked about Rome " * 5
+    budget = _tokens(summary) + _message_tokens(Message("user", "Trains?")) + _message_tokens(
+        Message("assistant", "Frecciarossa."))
+    store.set_summary("s", summary, "2")
+    manager = HistoryManager(store, token_budget=budget, keep_turns=6)
+
+    assert manager.render("s") == (
+        f"summary of earlier conversation: {summary}\nuser: Trains?\nassistant: Frecciarossa."
+    )
+
+
+def test_render_keeps_at_most_keep_turns():
+    store = MemorySessionStore()
+    _turns(store, "s", *[(f"q{i}", f"a{i}") for i in range(5)])
+    manager = HistoryManager(store, token_budget=10_000, keep_turns=2)
+    assert manager.render("s") == "user: q3\nassistant: a3\nuser: q4\nassistant: a4"
+    assert manager.render("unknown") == ""
+
+
+def test_render_cache_follows_writes_made_through_the_store():
+    store = MemorySessionStore()
+    manager = HistoryManager(store, token_budget=10_000, keep_turns=6)
+    _turns(store, "s", ("Rome?", "The Colosseum."))
+    assert manager.render("s").endswith("The Colosseum.")
+
+    reads = []
+    history = store.history
+    store.history = lambda *args, **kwargs: reads.append(args) or history(*args, **kwargs)
+    assert manager.render("s").endswith("The Colosseum.")
+    assert reads == []
+
+    # As another worker would: straight to the store, bypassing the manager
+    _turns(store, "s", ("Trains?", "Frecciarossa."))
+    assert manager.render("s").endswith("Frecciarossa.")
+    store.set_summary("s", "asked about Rome", "2")
+    assert manager.render("s").startswith("summary of earlier conversation: asked about Rome")
+    store.delete("s")
+    assert manager.render("s") == ""
+
+
+def test_fold_summarizes_each_message_once_despite_repeats():
+    store = MemorySessionStore()
+    summarize = _Recorder()
+    manager = HistoryManager(store, summarize=summarize, token_budget=10_000, keep_turns=1)
+
+    async def converse():
+        for question, answer in [("Rome?", "thanks"), ("Milan?", "thanks"), ("Venice?", "thanks"),
+                                 ("Rome?", "thanks"), ("Naples?", "thanks")]:
+            _turns(store, "s", (question, answer))
+            await manager.fold("s")
+
+    asyncio.run(converse())
+    folded = "\n".join(summarize.transcripts)
+    # Everything but the last turn was folded, each message exactly once
+    assert folded.split("\n") == [
+        "user: Rome?", "assistant: thanks", "user: Milan?", "assistant: thanks",
+        "user: Venice?", "assistant: thanks", "user: Rome?", "assistant: thanks",
+    ]
+    assert manager.render("s").endswith("user: Naples?\nassistant: thanks")
+
+
+def test_fold_continues_after_the_marked_message_is_trimmed():
+    store = MemorySessionStore(max_messages=4)
+    summarize = _Recorder()
+    manager = HistoryManager(store, summarize=summarize, token_budget=10_000, keep_turns=1)
+
+    async def converse():
+        for i in range(4):
+            _turns(store, "s", (f"q{i}", "yes"))
+            await manager.fold("s")
+
+    asyncio.run(converse())
+    assert "\n".join(summarize.transcripts).split("\n") == [
+        "user: q0", "assistant: yes", "user: q1", "assistant: yes", "user: q2", "assistant: yes",
+    ]
@@ -0,0 +1,151 @@
+# tests/test_session_stores.py
+import time
+
+import pytest
+
+from app.sessions.store import MemorySessionStore, Message
+
+
+def _sqlite(tmp_path, **caps):
+    from app.sessions.backends import SQLiteSessionStore
+    return SQLiteSessionStore(str(tmp_path / "sessions.db"), **caps)
+
+
+def _redis(tmp_path, **caps):
+    fakeredis = pytest.importorskip("fakeredis")
+    from app.sessions.backends import RedisSessionStore
+    return RedisSessionStore(fakeredis.FakeRedis(decode_responses=True), **caps)
+
+
+def _memory(tmp_path, **caps):
+    return MemorySessionStore(**caps)
+
+
+@pytest.fixture(params=[_memory, _sqlite, _redis], ids=["memory", "sqlite", "redis"])
+def make_store(request, tmp_path):
+    return lambda **caps: request.param(tmp_path, **caps)
+
+
+def _contents(messages):
+    return [m.content for m in messages]
+
+
+def test_append_and_history(make_store):
+    store = make_store()
+    store.append("s", "user", "Rome?")
+    store.extend("s", [Message("assistant", "Colosseum."), Message("user", "Trains?")])
+
+    assert [(m.role, m.content) for m in store.history("s")] == [
+        ("user", "Rome?"), ("assistant", "Colosseum."), ("user", "Trains?"),
+    ]
+    assert _contents(store.history("s", limit=2)) == ["Colosseum.", "Trains?"]
+    assert store.history("s", limit=0) == []
+    assert store.history("unknown") == []
+
+
+def test_message_count_cap(make_store):
+    store = make_store(max_messages=4)
+    for i in range(7):
+        store.append("s", "user", f"m{i}")
+    assert _contents(store.history("s")) == ["m3", "m4", "m5", "m6"]
+
+
+def test_byte_cap_is_enforced_on_write(make_store):
+    store = make_store(max_bytes=10)
+    for i in range(5):
+        store.append("s", "user", f"abcd{i}")  # 5 bytes each
+    assert _contents(store.history("s")) == ["abcd3", "abcd4"]
+    # A message larger than the cap is still kept on its own
+    store.append("s", "assistant", "x" * 50)
+    assert _contents(store.history("s")) == ["x" * 50]
+
+
+def test_redis_list_does_not_grow_past_the_byte_cap(tmp_path):
+    store = _redis(tmp_path, max_bytes=10)
+    for i in range(20):
+        store.append("s", "user", f"abcd{i % 10}")
+    assert store.client.llen(store._key("s")) == 2
+
+
+def test_idle_sessions_expire(make_store):
+    store = make_store(ttl_seconds=0.2)
+    store.append("s", "user", "Rome?")
+    store.set_summary("s", "asked about Rome", "mark")
+    time.sleep(0.3)
+    assert store.history("s") == []
+    assert store.summary("s") == ("", "")
+
+
+def test_reading_history_keeps_a_session_alive(make_store):
+    store = make_store(ttl_seconds=0.4)
+    store.append("s", "user", "Rome?")
+    for _ in range(3):
+        time.sleep(0.2)
+        assert _contents(store.history("s")) == ["Rome?"]
+
+
+def test_summary_round_trip_and_delete(make_store):
+    store = make_store()
+    assert store.summary("s") == ("", "")
+    store.append("s", "user", "Rome?")
+    store.set_summary("s", "asked about Rome", "abc123")
+    assert store.summary("s") == ("asked about Rome", "abc123")
+
+    assert store.delete("s")
+    assert store.history("s") == []
+    assert store.summary("s") == ("", "")
+
+
+def test_redis_summary_key_does_not_collide_with_a_session(tmp_path):
+    store = _redis(tmp_path)
+    store.append("a", "user", "Rome?")
+    store.set_summary("a", "asked about Rome", "mark")
+    store.append("a:summary", "user", "Milan?")
+
+    assert _contents(store.history("a")) == ["Rome?"]
+    assert _contents(store.history("a:summary")) == ["Milan?"]
+    assert store.summary("a") == ("asked about Rome", "mark")
+    assert store.stats()["sessions"] == 2
+
+
+def test_seqs_increase_and_survive_trimming(make_store):
+    store = make_store(max_messages=3)
+    for i in range(5):
+        store.append("s", "user", f"m{i}")
+    seqs = [m.seq for m in store.history("s")]
+    assert len(seqs) == 3 and seqs == sorted(seqs) and seqs[0] > 0
+    assert store.revision("s") == (seqs[-1], "")
+
+    store.set_summary("s", "earlier", str(seqs[0]))
+    assert store.revision("s") == (seqs[-1], str(seqs[0]))
+    assert store.revision("unknown") == (0, "")
+
+
+def test_seqs_are_not_reused_after_delete(make_store):
+    store = make_store()
+    store.append("s", "user", "Rome?")
+    before = store.revision("s")
+    store.delete("s")
+    assert store.revision("s") == (0, "")
+    store.append("s", "user", "Rome?")
+    assert store.revision("s")[0] > before[0]
+
+
+def test_stats_count_message_and_summary_bytes(make_store):
+    store = make_store()
+    store.append("a", "user", "abcd")
+    store.append("b", "user", "héllo")  # 6 bytes in UTF-8
+    store.set_summary("a", "xy", "1")
+    stats = store.stats()
+    assert stats["sessions"] == 2
+    assert stats["messages"] == 2
+    assert stats["bytes"] == 4 + 6 + 2
+
+
+def test_redis_summary_is_not_written_for_an_expired_session(tmp_path):
+    store = _redis(tmp_path, ttl_seconds=0.1)
+    store.append("s", "user", "Rome?")
+    time.sleep(0.2)
+    store.set_summary("s", "asked about Rome", "1")
+    assert not store.client.exists(store._summary_key("s"))
+    assert store.summary("s") == ("", "")
@@ -0,0 +1,65 @@
+# tests/test_single_flight.py
+import asyncio
+
+from app.langchain.single_flight import SingleFlight
+
+
+def _collect(stream):
+    async def run():
+        return [token async for token in stream]
+    return run()
+
+
+def test_concurrent_callers_share_one_generation():
+    async def scenario():
+        flights = SingleFlight()
+        calls = []
+
+        async def produce():
+            calls.append(1)
+            for token in ("Rome ", "is ", "lovely"):
+                await asyncio.sleep(0.01)
+                yield token
+
+        first, second = await asyncio.gather(
+            _collect(flights.stream("q", produce)), _collect(flights.stream("q", produce)),
+        )
+        assert first == second == ["Rome ", "is ", "lovely"]
+        assert len(calls) == 1
+        assert flights.in_flight() == 0
+
+    asyncio.run(scenario())
+
+
+def test_join_during_teardown_starts_a_fresh_flight():
+    async def scenario():
+        flights = SingleFlight()
+        started = []
+
+        async def produce():
+            started.append(1)
+            yield "Rome "
+            await asyncio.sleep(0.01)
+            yield "is lovely"
+
+        async def hang_first():
+            async def slow():
+                started.append(1)
+                try:
+                    yield "Rome "
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    # A slow unwind keeps the cancelled task alive for a while
+                    await asyncio.sleep(0.05)
+                    raise
+            stream = flights.stream("q", slow)
+            assert await stream.__anext__() == "Rome "
+            await stream.aclose()  # last subscriber leaves: the generation is cancelled
+
+        await hang_first()
+        # The cancelled task is still unwinding; a new caller must not join it
+        tokens = await asyncio.wait_for(_collect(flights.stream("q", produce)), 1.0)
+        assert tokens == ["Rome ", "is lovely"]
+        assert len(started) == 2
+
+    asyncio.run(scenario())
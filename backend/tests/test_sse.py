@@ -0,0 +1,77 @@
+# tests/test_sse.py
+import asyncio
+
+import pytest
+
+from app.sse import KEEP_ALIVE, ClientDisconnected, coalesce_frames, token_frame, until_disconnected
+
+
+def _frames(tokens, **kwargs):
+    async def run():
+        return [frame async for frame in coalesce_frames(tokens, **kwargs)]
+    return asyncio.run(run())
+
+
+async def _tokens(*items, error=None):
+    for item in items:
+        yield item
+        await asyncio.sleep(0)
+    if error is not None:
+        raise error
+
+
+def test_first_token_is_flushed_and_the_rest_coalesced():
+    frames = _frames(_tokens("Rome", " is", " lovely"), window=1.0)
+    assert frames == [token_frame("Rome"), token_frame(" is lovely")]
+
+
+def test_source_error_is_reraised_after_buffered_text():
+    with pytest.raises(ValueError):
+        _frames(_tokens("Rome", " is", error=ValueError("boom")), window=1.0)
+
+
+def test_cancelled_source_ends_the_stream_instead_of_hanging():
+    async def run():
+        frames = []
+        with pytest.raises(asyncio.CancelledError):
+            async for frame in coalesce_frames(
+                _tokens("Rome", error=asyncio.CancelledError()), keepalive=0.01,
+            ):
+                frames.append(frame)
+                assert len(frames) < 5, "only keep-alives after the source was cancelled"
+        return frames
+
+    frames = asyncio.run(asyncio.wait_for(run(), 2.0))
+    assert frames[0] == token_frame("Rome")
+    assert KEEP_ALIVE not in frames
+
+
+def test_disconnect_unwinds_the_source_before_raising():
+    closed = []
+
+    async def endless():
+        try:
+            while True:
+                yield "word"
+                await asyncio.sleep(0.01)
+        finally:
+            closed.append(True)
+
+    async def run():
+        polls = 0
+
+        async def is_disconnected():
+            nonlocal polls
+            polls += 1
+            return polls > 3
+
+        frames = []
+        with pytest.raises(ClientDisconnected):
+            async for frame in until_disconnected(coalesce_frames(endless(), window=0.001), is_disconnected, 0.01):
+                frames.append(frame)
+        # Nothing may still be running inside the source once the caller sees the disconnect
+        assert closed == [True]
+        return frames
+
+    frames = asyncio.run(asyncio.wait_for(run(), 2.0))
+    assert frames[0] == token_frame("word")
@@ -0,0 +1,138 @@
+# tests/test_streaming.py
+"""The streaming endpoints, driven over ASGI with a stand-in answer."""
+import asyncio
+
+import orjson
+import pytest
+from prometheus_client import REGISTRY
+
+from app import main
+from app.admission import AdmissionController
+
+
+async def _answer(question, chat_history, language, admit=None):
+    permit = await admit()
+    try:
+        for i in range(200):
+            yield f" word{i}"
+            await asyncio.sleep(0.005)
+    finally:
+        permit.release()
+
+
+async def _disconnect_after(path, body, frames, method="POST", spec_version="2.3"):
+    """
+    Call the app like uvicorn does and report http.disconnect once `frames`
+    token frames have been sent. Returns the body chunks received. Below ASGI
+    spec 2.4 Starlette listens for the disconnect itself and cancels the
+    response; from 2.4 on only the endpoint's is_disconnected() polling sees it.
+    """
+    received = []
+    enough = asyncio.Event()
+    sent_body = False
+
+    async def receive():
+        nonlocal sent_body
+        if not sent_body:
+            sent_body = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await enough.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message.get("body"):
+            received.append(message["body"])
+            if sum(chunk.count(b"word") for chunk in received) >= frames:
+                enough.set()
+
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": spec_version}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": query.encode(),
+        "headers": [(b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 1234), "server": ("testserver", 80),
+    }
+    await asyncio.wait_for(main.app(scope, receive, send), 5.0)
+    return received
+
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    monkeypatch.setattr(main, "aask_tourism_bot", _answer)
+    monkeypatch.setattr(main, "SSE_OPTIONS", dict(window=0.001, max_bytes=1, keepalive=None))
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/chat/stream", orjson.dumps({"message": "Rome?", "session_id": "disconnect"})),
+    ("/chat?question=Rome%3F", b""),
+])
+def test_client_disconnect_mid_stream_raises_nothing(stand_in, path, body):
+    method = "POST" if path == "/chat/stream" else "GET"
+
+    async def run():
+        received = await _disconnect_after(path, body, frames=3, method=method)
+        # Let the saves and unwinding of the aborted answer finish
+        await asyncio.sleep(0.05)
+        return received
+
+    received = asyncio.run(run())
+    assert b"word0" in b"".join(received)
+    assert main.admission.active == 0
+
+
+def _aborted(endpoint):
+    value = REGISTRY.get_sample_value(
+        "tourism_aborted_generations_total", {"endpoint": endpoint, "language": "en"},
+    )
+    return value or 0.0
+
+
+def test_polled_disconnect_saves_the_partial_answer(stand_in, monkeypatch):
+    monkeypatch.setattr(main, "SSE_DISCONNECT_POLL_SECONDS", 0.01)
+    before = _aborted("/chat/stream")
+    body = orjson.dumps({"message": "Rome?", "session_id": "partial"})
+
+    async def run():
+        await _disconnect_after("/chat/stream", body, frames=3, spec_version="2.4")
+        await asyncio.gather(*main._pending_saves)
+
+    asyncio.run(run())
+    assert _aborted("/chat/stream") == before + 1
+    saved = main.sessions.history("partial")
+    assert [m.role for m in saved] == ["user", "assistant"]
+    assert saved[0].content == "Rome?"
+    assert saved[1].content.startswith(" word0 word1 word2")
+    assert "word199" not in saved[1].content
+    assert main.admission.active == 0
+
+
+def test_full_queue_gets_429_with_retry_after(stand_in, monkeypatch):
+    monkeypatch.setattr(main, "admission", AdmissionController(1, 0, 1.0))
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": orjson.dumps({"message": "Rome?", "session_id": "shed"})}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": "/chat/stream", "raw_path": b"/chat/stream",
+        "root_path": "", "query_string": b"", "headers": [(b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 1234), "server": ("testserver", 80),
+    }
+
+    async def run():
+        held = await main.admission.acquire()
+        try:
+            await main.app(scope, receive, send)
+        finally:
+            held.release()
+
+    asyncio.run(run())
+    start = messages[0]
+    assert start["status"] == 429
+    assert int(dict(start["headers"])[b"retry-after"]) >= 1
+    assert main.admission.rejected["queue_full"] == 1
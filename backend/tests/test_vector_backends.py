@@ -0,0 +1,137 @@
+# tests/test_vector_backends.py
+"""LocalBackend must return what QdrantBackend returns for the same points."""
+import uuid
+import warnings
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("qdrant_client")
+
+from langchain_core.documents import Document
+from qdrant_client import QdrantClient
+
+from app.qdrant.backends import LocalBackend, QdrantBackend
+from app.qdrant.metadata import normalize_filters
+
+SIZE = 8
+DESTINATIONS = ("rome", "milan", "venice")
+TOPICS = ("food", "transport")
+
+
+def _ids(docs):
+    return [str(d.metadata["_id"]) for d in docs]
+
+
+def _unit(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    return matrix / np.linalg.norm(matrix, axis=-1, keepdims=True)
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    rng = np.random.default_rng(0)
+    docs, ids = [], []
+    for i in range(40):
+        destination = DESTINATIONS[i % 3]
+        docs.append(Document(
+            page_content=f"chunk {i} about {destination}",
+            metadata={
+                "destination": destination,
+                "topic": TOPICS[i % 2],
+                "language": "en",
+                "path": f"{destination}/{i % 5}.txt",
+            },
+        ))
+        ids.append(str(uuid.uuid5(uuid.NAMESPACE_URL, f"chunk-{i}")))
+    vectors = rng.normal(size=(40, SIZE)).tolist()
+    queries = rng.normal(size=(5, SIZE)).tolist()
+    return docs, ids, vectors, queries
+
+
+@pytest.fixture
+def backends(corpus, tmp_path):
+    docs, ids, vectors, _ = corpus
+    local = LocalBackend(str(tmp_path), "c")
+    local.ensure(SIZE)
+    local.upsert(docs, ids, vectors)
+    local.flush()
+
+    qdrant = QdrantBackend(QdrantClient(":memory:"), "c")
+    with warnings.catch_warnings():
+        # Payload indexes have no effect in Qdrant's local mode, which says so
+        warnings.simplefilter("ignore")
+        qdrant.ensure(SIZE)
+    qdrant.upsert(docs, ids, vectors)
+    # Reopened from disk, so the memory-mapped index is what gets compared
+    return LocalBackend(str(tmp_path), "c"), qdrant
+
+
+def test_reopened_index_keeps_every_point(backends, corpus):
+    local, qdrant = backends
+    docs, ids, _, _ = corpus
+    assert local.count() == qdrant.count() == len(docs)
+    stored = dict(local.iter_documents())
+    assert sorted(stored) == sorted(ids)
+    assert stored[ids[3]].page_content == docs[3].page_content
+    assert stored[ids[3]].metadata["destination"] == "rome"
+
+
+def test_search_matches_qdrant(backends, corpus):
+    local, qdrant = backends
+    for query in corpus[3]:
+        expected = qdrant.search(query, 10)
+        found = local.search(query, 10)
+        assert _ids(found) == _ids(expected)
+        assert [d.page_content for d in found] == [d.page_content for d in expected]
+        assert [d.metadata["path"] for d in found] == [d.metadata["path"] for d in expected]
+
+
+def test_search_candidates_match_qdrant(backends, corpus):
+    local, qdrant = backends
+    for query in corpus[3]:
+        expected_docs, expected_matrix = qdrant.search_candidates(query, 7)
+        docs, matrix = local.search_candidates(query, 7)
+        assert _ids(docs) == _ids(expected_docs)
+        assert matrix.shape == expected_matrix.shape == (7, SIZE)
+        assert np.allclose(_unit(matrix), _unit(expected_matrix), atol=1e-5)
+
+
+@pytest.mark.parametrize("filters", [
+    {"destination": "rome"},
+    {"destination": ["milan", "venice"], "topic": "food"},
+    {"path": "venice/2.txt"},
+    {"destination": "florence"},
+])
+def test_filtered_search_matches_qdrant(backends, corpus, filters):
+    local, qdrant = backends
+    filters = normalize_filters(filters)
+    for query in corpus[3]:
+        expected = qdrant.search(query, 5, filters=filters)
+        found = local.search(query, 5, filters=filters)
+        assert _ids(found) == _ids(expected)
+        for doc in found:
+            assert all(doc.metadata[field] in values for field, values in filters.items())
+
+
+def test_search_batch_matches_qdrant(backends, corpus):
+    local, qdrant = backends
+    filters = normalize_filters({"topic": "transport"})
+    expected = qdrant.search_batch(corpus[3], 4, filters=filters, with_vectors=True)
+    found = local.search_batch(corpus[3], 4, filters=filters, with_vectors=True)
+    assert len(found) == len(expected) == len(corpus[3])
+    for (docs, matrix), (expected_docs, expected_matrix) in zip(found, expected):
+        assert _ids(docs) == _ids(expected_docs)
+        assert np.allclose(_unit(matrix), _unit(expected_matrix), atol=1e-5)
+
+
+def test_fetch_vectors_matches_qdrant(backends, corpus):
+    local, qdrant = backends
+    _, ids, vectors, _ = corpus
+    wanted = [ids[0], ids[17], ids[39], str(uuid.uuid4())]
+    expected = qdrant.fetch_vectors(wanted)
+    found = local.fetch_vectors(wanted)
+    assert sorted(found) == sorted(expected) == sorted(wanted[:3])
+    for point_id in found:
+        assert np.allclose(found[point_id], _unit(expected[point_id]), atol=1e-5)
+        assert np.allclose(found[point_id], _unit(vectors[ids.index(point_id)]), atol=1e-5)